@@ -1 +1,12 @@
 from .api import Api, UserRole
+from .async_api import AsyncApi
+from .cache import ResponseCache, ReportCache, SingleFlight
+from .ratelimit import RateLimiter
+from .tables import SalesReportTable, SalesReportParser, parse_sales_report
+from .warehouse import ReportWarehouse
+from .bulk import BulkResult
+from .mirror import Mirror
+from .metrics import Metrics
+from .tracing import Tracer, RecordingTracer, OpenTelemetryTracer
+from .transport import HTTP2Transport
+from .codec import JSONCodec, OrjsonCodec
@@ -1,6 +1,9 @@
 import requests
 import jwt
-import gzip
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+import os
+import tempfile
 import platform
 import hashlib
 from collections import defaultdict
@@ -8,14 +11,44 @@ from pathlib import Path
 from datetime import datetime, timedelta
 import time
 import json
+import asyncio
+import queue
+import threading
+import weakref
 from typing import List
+from urllib.parse import quote, urlsplit
 from enum import Enum, auto
 
 from .resources import *
+from . import reports
+from . import bulk
+from . import stats
+from . import tables
+from .backfill import Backfill, sales_and_trends_jobs, finance_jobs
+from .cache import SingleFlight
+from .metrics import Metrics, PoolTimeout, TimedHTTPAdapter, pop_connect_time
+from . import tracing
+from .transport import HTTP2Transport
+from .codec import default_codec
+from .ratelimit import RateLimiter, RETRY_STATUS_CODES
 from .__version__ import __version__ as version
 
 ALGORITHM = 'ES256'
 BASE_API = "https://api.appstoreconnect.apple.com"
+POOL_TIMEOUT_MESSAGE = "No free connection after %s seconds, pool_maxsize connections are in use, e.g. by streamed reports not read to the end"
+JSON_CONTENT_TYPES = ("application/json", "application/vnd.api+json")
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+POOL_TIMEOUT = 60  # seconds waited for a free connection when there is no read timeout
+MAX_LIMIT = 200
+TOKEN_LIFETIME = timedelta(minutes=20)
+TOKEN_REFRESH_AFTER = timedelta(minutes=15)
+TOKEN_BACKGROUND_REFRESH_MARGIN = timedelta(minutes=1)
+
+try:
+	import fcntl
+except ImportError:  # Windows
+	fcntl = None
 
 
 class UserRole(Enum):
@@ -49,18 +82,68 @@ class APIError(Exception):
 
 
 class Api:
-
-	def __init__(self, key_id, key_file, issuer_id, submit_stats=True, timeout=None, proxy=None):
+	asynchronous = False  # whether API calls are coroutines
+	# what __del__ and close() see when __init__ raised part way, e.g. on an unknown hook
+	submit_stats = False
+	_session = None
+	_token_timer = None
+
+	def __init__(self, key_id, key_file, issuer_id, submit_stats=True, timeout=None, proxy=None,
+	             pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, cache=None, report_cache=None, rate_limiter=None,
+	             background_token_refresh=False, token_cache_file=None, compact_resources=False, keep_raw=False,
+	             warehouse=None, singleflight=True, metrics=True, hooks=None, tracer=None, base_url=BASE_API,
+	             transport=None, json_codec=None):
+		"""
+		:param compact_resources: build resources with __slots__ holding their attributes instead of the raw JSON data,
+		to save memory on large listings
+		:param keep_raw: also keep the raw JSON data of compact resources, available as resource.raw
+		:param warehouse: a ReportWarehouse where reports downloaded with table=True are stored
+		:param singleflight: share a single request between identical concurrent GET calls, True to use a new
+		SingleFlight, which can also be shared by several instances
+		:param metrics: record latency, bytes, status codes and retries per endpoint, True to use a new Metrics, which can
+		also be shared by several instances
+		:param hooks: a dict mapping before_request, after_response and on_error to a callback or a list of callbacks,
+		see add_hook()
+		:param tracer: a Tracer receiving spans around API calls, listings, report downloads and token signing, e.g. a
+		RecordingTracer or an OpenTelemetryTracer
+		:param base_url: the root of the API, e.g. a local server for tests and benchmarks
+		:param transport: 'http2' to multiplex concurrent requests over HTTP/2 connections (HTTP2Transport), or an object
+		with the request() and close() methods of a requests.Session, a pooled requests session by default
+		:param json_codec: a JSONCodec decoding responses and encoding requests, an OrjsonCodec when orjson is installed
+		and the json module otherwise by default
+		"""
 		self._token = None
 		self.token_gen_date = None
 		self.exp = None
+		self._key = None
+		self._token_lock = threading.Lock()
+		self._token_timer = None
+		self.background_token_refresh = background_token_refresh
+		self.token_cache_file = token_cache_file
 		self.key_id = key_id
 		self.key_file = key_file
 		self.issuer_id = issuer_id
-		self.submit_stats = submit_stats
+		self.base_url = base_url.rstrip('/')
 		self.timeout = timeout
 		self.proxy = proxy
+		self.transport = transport
+		self.json_codec = json_codec if json_codec is not None else default_codec()
+		self.cache = cache
+		self.report_cache = report_cache
+		self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+		self.compact_resources = compact_resources
+		self.keep_raw = keep_raw
+		self.warehouse = warehouse
+		self.singleflight = SingleFlight() if singleflight is True else singleflight or None
+		self.metrics = Metrics() if metrics is True else metrics or None
+		self.tracer = tracer
+		self.hooks = {event: [] for event in tracing.HOOK_EVENTS}
+		for event, callbacks in (hooks or {}).items():
+			for callback in (callbacks if type(callbacks) in (list, tuple) else [callbacks]):
+				self.add_hook(event, callback)
+		self._session = self._create_session(pool_connections, pool_maxsize)
 		self._call_stats = defaultdict(int)
+		self.submit_stats = submit_stats
 		if self.submit_stats:
 			self._submit_stats("session_start")
 
@@ -71,28 +154,159 @@ class Api:
 		if self.submit_stats:
 			self._submit_stats("session_end")
 
-	def _generate_token(self):
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def _create_session(self, pool_connections, pool_maxsize):
+		"""
+		create a keep-alive session reused by every API call
+		:param pool_connections: number of per-host connection pools to keep
+		:param pool_maxsize: maximum number of connections open to a single host, further concurrent requests wait for
+		one to be free instead of opening more, at most the read timeout (POOL_TIMEOUT seconds without one). A streamed
+		report holds its connection until it is read to the end, so at most pool_maxsize of them can be open at once
+		"""
+		if self.transport == 'http2':
+			return HTTP2Transport(self.proxy, pool_maxsize, pool_timeout=self._pool_timeout)
+		if self.transport is not None:
+			return self.transport
+		session = requests.Session()
+		adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True,
+		                           pool_timeout=self._pool_timeout)
+		session.mount('https://', adapter)
+		session.mount('http://', adapter)
+		if self.proxy:
+			session.proxies = {'https': self.proxy}
+		return session
+
+	def add_hook(self, event, callback):
+		"""
+		:param event: one of
+		before_request, called as callback(method, url, headers) before each attempt, headers can be modified
+		after_response, called as callback(method, url, response) for each response, including the retried ones
+		on_error, called as callback(method, url, exception) when an API call fails
+		"""
+		if event not in self.hooks:
+			raise ValueError("Unknown hook %s, expected one of %s" % (event, ', '.join(tracing.HOOK_EVENTS)))
+		self.hooks[event].append(callback)
+
+	def _dispatch(self, event, *args):
+		for callback in self.hooks[event]:
+			callback(*args)
+
+	def _span(self, name, parent=None, **attributes):
+		"""
+		:return: a span started by the tracer, a span doing nothing when there is no tracer
+		"""
+		if self.tracer is None:
+			return tracing.NULL_SPAN
+		return self.tracer.start_span('appstoreconnect.%s' % name, attributes, parent)
+
+	def close(self):
+		"""
+		close all pooled connections, the instance must not be used afterwards
+		"""
+		if self._token_timer is not None:
+			self._token_timer.cancel()
+		if self._session is not None:
+			self._session.close()
+
+	def _load_key(self):
 		try:
 			key = open(self.key_file, 'r').read()
 		except IOError as e:
 			key = self.key_file
+		return load_pem_private_key(key.encode(), password=None, backend=default_backend())
+
+	def _generate_token(self):
+		if self._key is None:  # parse the key only once
+			self._key = self._load_key()
+		start = time.perf_counter()
 		self.token_gen_date = datetime.now()
-		exp = int(time.mktime((self.token_gen_date + timedelta(minutes=20)).timetuple()))
-		return jwt.encode({'iss': self.issuer_id, 'exp': exp, 'aud': 'appstoreconnect-v1'}, key,
+		exp = int(time.mktime((self.token_gen_date + TOKEN_LIFETIME).timetuple()))
+		token = jwt.encode({'iss': self.issuer_id, 'exp': exp, 'aud': 'appstoreconnect-v1'}, self._key,
 		                   headers={'kid': self.key_id, 'typ': 'JWT'}, algorithm=ALGORITHM).decode('ascii')
-
-	def _get_resource(self, Resource, resource_id):
-		url = "%s%s/%s" % (BASE_API, Resource.endpoint, resource_id)
+		if self.metrics is not None:
+			self.metrics.observe_token_signing(time.perf_counter() - start)
+		return token
+
+	def _set_token(self):
+		# must be called holding _token_lock
+		with self._span('token', shared=bool(self.token_cache_file)):
+			if self.token_cache_file:
+				self._token = self._get_shared_token()
+			else:
+				self._token = self._generate_token()
+		if self.metrics is not None:
+			self.metrics.count_token_refresh()
+		if self.background_token_refresh:
+			self._schedule_token_refresh()
+
+	def _get_shared_token(self):
+		"""
+		read the token from token_cache_file, only signing a new one when it is missing or too old so that several
+		processes using the same key share a single token
+		"""
+		# a background refresh must not take a token it would have to refresh again right away
+		max_age = TOKEN_REFRESH_AFTER - TOKEN_BACKGROUND_REFRESH_MARGIN if self.background_token_refresh else TOKEN_REFRESH_AFTER
+		with open('%s.lock' % self.token_cache_file, 'w') as lock:
+			if fcntl is not None:
+				fcntl.flock(lock, fcntl.LOCK_EX)
+			try:
+				with open(self.token_cache_file, 'r') as file:
+					cached = json.load(file)
+				token_gen_date = datetime.fromtimestamp(cached['generated_at'])
+				if (cached['key_id'], cached['issuer_id']) == (self.key_id, self.issuer_id) \
+						and token_gen_date + max_age > datetime.now():
+					self.token_gen_date = token_gen_date
+					return cached['token']
+			except (IOError, ValueError, KeyError, TypeError):
+				pass
+
+			token = self._generate_token()
+			cached = {'token': token, 'generated_at': self.token_gen_date.timestamp(), 'key_id': self.key_id, 'issuer_id': self.issuer_id}
+			fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.token_cache_file)))
+			with os.fdopen(fd, 'w') as file:
+				json.dump(cached, file)
+			os.replace(path, self.token_cache_file)
+			return token
+
+	def _schedule_token_refresh(self):
+		if self._token_timer is not None:
+			self._token_timer.cancel()
+		delay = self.token_gen_date + TOKEN_REFRESH_AFTER - TOKEN_BACKGROUND_REFRESH_MARGIN - datetime.now()
+		self._token_timer = threading.Timer(max(delay.total_seconds(), 0), _refresh_token, args=(weakref.ref(self),))
+		self._token_timer.daemon = True
+		self._token_timer.start()
+
+	def _get_resource(self, Resource, resource_id, include=None):
+		url = "%s%s/%s" % (self.base_url, Resource.endpoint, resource_id)
+		url = self._build_query_parameters(url, None, include=include)
 		payload = self._api_call(url)
-		return Resource(payload.get('data', {}), self)
+		return self._resource_class(Resource)(payload.get('data', {}), self, self._index_included(payload))
 
-	def _get_resource_from_payload_data(self, payload):
+	def _get_resource_from_payload_data(self, payload, included=None):
 		try:
 			resource_type = resources[payload.get('type')]
 		except KeyError:
 			raise APIError("Unsupported resource type %s" % payload.get('type'))
 
-		return resource_type(payload, self)
+		return self._resource_class(resource_type)(payload, self, included)
+
+	def _resource_class(self, Resource):
+		return compact(Resource, self.keep_raw) if self.compact_resources else Resource
+
+	@staticmethod
+	def _index_included(payload):
+		"""
+		:return: the included resources of a payload indexed by (type, id)
+		"""
+		return {(data.get('type'), data.get('id')): data for data in payload.get('included', [])}
+
+	def _related_from_included(self, related, multiple):
+		return related
 
 	def get_related_resource(self, full_url):
 		payload = self._api_call(full_url)
@@ -100,15 +314,25 @@ class Api:
 		if data is None:
 			return None
 		elif type(data) == dict:
-			return self._get_resource_from_payload_data(data)
+			return self._get_resource_from_payload_data(data, self._index_included(payload))
 
 	def get_related_resources(self, full_url):
 		payload = self._api_call(full_url)
 		data = payload.get('data', [])
+		included = self._index_included(payload)
 		for resource in data:
-			yield self._get_resource_from_payload_data(resource)
+			yield self._get_resource_from_payload_data(resource, included)
 
 	def _create_resource(self, Resource, args):
+		post_data = self._create_payload(Resource, args)
+		url = "%s%s" % (self.base_url, Resource.endpoint)
+		if self._debug:
+			print(post_data)
+		payload = self._api_call(url, HttpMethod.POST, post_data)
+
+		return self._resource_class(Resource)(payload.get('data', {}), self)
+
+	def _create_payload(self, Resource, args):
 		attributes = {}
 		for attribute in Resource.attributes:
 			if attribute in args and args[attribute] is not None:
@@ -134,21 +358,24 @@ class Api:
 							'type': args[relation].type
 						}
 
-		post_data = {
+		return {
 			'data': {
 				'attributes': attributes,
 				'relationships': relationships_dict,
 				'type': Resource.type
 			}
 		}
-		url = "%s%s" % (BASE_API, Resource.endpoint)
+
+	def _modify_resource(self, resource, args):
+		post_data = self._modify_payload(resource, args)
+		url = "%s%s/%s" % (self.base_url, resource.endpoint, resource.id)
 		if self._debug:
 			print(post_data)
-		payload = self._api_call(url, HttpMethod.POST, post_data)
+		payload = self._api_call(url, HttpMethod.PATCH, post_data)
 
-		return Resource(payload.get('data', {}), self)
+		return type(resource)(payload.get('data', {}), self)
 
-	def _modify_resource(self, resource, args):
+	def _modify_payload(self, resource, args):
 		attributes = {}
 
 		for attribute in resource.attributes:
@@ -185,138 +412,326 @@ class Api:
 		if len(relationships):
 			post_data['data']['relationships'] = relationships
 
-		url = "%s%s/%s" % (BASE_API, resource.endpoint, resource.id)
-		if self._debug:
-			print(post_data)
-		payload = self._api_call(url, HttpMethod.PATCH, post_data)
-
-		return type(resource)(payload.get('data', {}), self)
+		return post_data
 
 	def _delete_resource(self, resource: Resource):
-		url = "%s%s/%s" % (BASE_API, resource.endpoint, resource.id)
+		url = "%s%s/%s" % (self.base_url, resource.endpoint, resource.id)
 		self._api_call(url, HttpMethod.DELETE)
 
-	def _get_resources(self, Resource, filters=None, sort=None, full_url=None):
-		class IterResource:
-			def __init__(self, api, url):
-				self.api = api
-				self.url = url
-				self.index = 0
-				self.total_length = None
-				self.payload = None
-
-			def __getitem__(self, item):
-				items = list(self)
-				return items[item]
-
-			def __iter__(self):
-				return self
-
-			def __repr__(self):
-				return "Iterator over %s resource" % Resource.__name__
-
-			def __len__(self):
-				if not self.payload:
-					self.fetch_page()
-				return self.total_length
-
-			def __next__(self):
-				if not self.payload:
-					self.fetch_page()
-				if self.index < len(self.payload.get('data', [])):
-					data = self.payload.get('data', [])[self.index]
-					self.index += 1
-					return Resource(data, self.api)
-				else:
-					self.url = self.payload.get('links', {}).get('next', None)
-					self.index = 0
-					if self.url:
-						self.fetch_page()
-						if self.index < len(self.payload.get('data', [])):
-							data = self.payload.get('data', [])[self.index]
-							self.index += 1
-							return Resource(data, self.api)
-					raise StopIteration()
-
-			def fetch_page(self):
-				self.payload = self.api._api_call(self.url)
-				self.total_length = self.payload.get('meta', {}).get('paging', {}).get('total', 0)
-
-		url = full_url if full_url else "%s%s" % (BASE_API, Resource.endpoint)
-		url = self._build_query_parameters(url, filters, sort)
-		return IterResource(self, url)
-
-	def _build_query_parameters(self, url, filters, sort = None):
-		separator = '?'
+	def _run_bulk(self, function, items, max_workers):
+		return bulk.run(function, items, max_workers)
+
+	def _bulk_create_resources(self, Resource, items, max_workers):
+		return self._run_bulk(lambda args: self._create_resource(Resource, args), items, max_workers)
+
+	def _bulk_modify_resources(self, changes, max_workers):
+		return self._run_bulk(lambda change: self._modify_resource(*change), changes, max_workers)
+
+	def _bulk_delete_resources(self, resources, max_workers):
+		return self._run_bulk(self._delete_resource, resources, max_workers)
+
+	def _link_resources(self, url, method, resource_type, resource_ids):
+		self._api_call(url, method, {'data': [{'id': resource_id, 'type': resource_type} for resource_id in resource_ids]})
+
+	def _bulk_link_resources(self, url, method, resource_type, resource_ids, max_workers):
+		"""
+		add or remove resources of a to-many relationship, RELATIONSHIP_BATCH_SIZE at a time
+		:return: a list of BulkResult, one per request, whose item is the list of resource ids it sent
+		"""
+		return self._run_bulk(lambda batch: self._link_resources(url, method, resource_type, batch), bulk.batches(resource_ids), max_workers)
+
+	def _get_resources(self, Resource, filters=None, sort=None, full_url=None, limit=None, fields=None, include=None, prefetch=0):
+		url = full_url if full_url else "%s%s" % (self.base_url, Resource.endpoint)
+		url = self._build_query_parameters(url, filters, sort, limit, fields, include)
+		return IterResource(self, Resource, url, prefetch)
+
+	def _build_query_parameters(self, url, filters, sort=None, limit=None, fields=None, include=None):
+		"""
+		:param filters: a dict of filter values, a list value is sent as a comma separated list
+		:param sort: the attribute to sort on, prefixed with "-" for a descending order
+		:param limit: the number of resources per page, up to MAX_LIMIT
+		:param fields: a dict mapping a resource type to the list of fields to return
+		:param include: a list of relationships to include in the response
+		"""
+		parameters = []
 		if type(filters) is dict:
-			for index, (filter_name, filter_value) in enumerate(filters.items()):
-				filter_name = "filter[%s]" % filter_name
-				url = "%s%s%s=%s" % (url, separator, filter_name, filter_value)
-				separator = '&'
+			for filter_name, filter_value in filters.items():
+				parameters.append(("filter[%s]" % filter_name, filter_value))
+		if type(fields) is dict:
+			for resource_type, field_names in fields.items():
+				parameters.append(("fields[%s]" % resource_type, field_names))
+		if include:
+			parameters.append(("include", include))
 		if type(sort) is str:
-			url = "%s%ssort=%s" % (url, separator, sort)
+			parameters.append(("sort", sort))
+		if limit is not None:
+			if not 1 <= limit <= MAX_LIMIT:
+				raise ValueError("limit must be between 1 and %d" % MAX_LIMIT)
+			parameters.append(("limit", limit))
+
+		separator = '&' if '?' in url else '?'
+		for name, value in parameters:
+			if type(value) in (list, tuple, set):
+				value = ','.join(map(str, value))
+			url = "%s%s%s=%s" % (url, separator, quote(name, safe='[]'), quote(str(value), safe=','))
+			separator = '&'
 		return url
 
-	def _api_call(self, url, method=HttpMethod.GET, post_data=None):
-		headers = {"Authorization": "Bearer %s" % self.token}
-		if self._debug:
-			print("%s %s" % (method.value, url))
+	def _api_call(self, url, method=HttpMethod.GET, post_data=None, stream=False):
+		try:
+			with self._span('api_call', method=method.name, endpoint=self._endpoint(url)):
+				return self._call(url, method, post_data, stream)
+		except Exception as e:
+			self._dispatch('on_error', method, url, e)
+			raise
+
+	def _call(self, url, method, post_data, stream):
+		cache_key = self._cache_key(url, method, stream)
+		payload, conditional_headers = self.cache.lookup(cache_key) if cache_key else (None, {})
+		if payload is not None:
+			return payload
 
-		if self._submit_stats:
-			endpoint = url.replace(BASE_API, '')
-			if method in (HttpMethod.PATCH, HttpMethod.DELETE):  # remove last bit of endpoint which is a resource id
-				endpoint = "/".join(endpoint.split('/')[:-1])
-			request = "%s %s" % (method.name, endpoint)
-			self._call_stats[request] += 1
+		flight_key = self._flight_key(url, method, stream)
+		if flight_key:
+			return self.singleflight.do(flight_key, lambda: self._request(url, method, post_data, stream, cache_key, conditional_headers))
+		return self._request(url, method, post_data, stream, cache_key, conditional_headers)
 
-		try:
-			if method == HttpMethod.GET:
-				proxies = {'https': self.proxy} if self.proxy else None
-				r = requests.get(url, headers=headers, timeout=self.timeout, proxies=proxies)
-			elif method == HttpMethod.POST:
-				headers["Content-Type"] = "application/json"
-				r = requests.post(url=url, headers=headers, data=json.dumps(post_data), timeout=self.timeout)
-			elif method == HttpMethod.PATCH:
-				headers["Content-Type"] = "application/json"
-				r = requests.patch(url=url, headers=headers, data=json.dumps(post_data), timeout=self.timeout)
-			elif method == HttpMethod.DELETE:
-				r = requests.delete(url=url, headers=headers, timeout=self.timeout)
-			else:
-				raise APIError("Unknown HTTP method")
-		except requests.exceptions.Timeout:
-			raise APIError(f"Read timeout after {self.timeout} seconds")
+	def _request(self, url, method, post_data, stream, cache_key, conditional_headers):
+		headers, data = self._prepare_request(url, method, post_data)
+		headers.update(conditional_headers)
+		r = self._send(url, method, headers, data, stream)
 
 		if self._debug:
 			print(r.status_code)
 
+		if method != HttpMethod.GET:
+			self._invalidate_cache(url, post_data)
+		elif cache_key and r.status_code == 304:
+			payload = self.cache.revalidated(cache_key, r.headers)
+			# the entry may have been evicted in the meantime
+			return payload if payload is not None else self._request(url, method, post_data, stream, cache_key, {})
+
 		content_type = r.headers.get('content-type')
 
-		if content_type in ["application/json", "application/vnd.api+json"]:
-			payload = r.json()
-			if 'errors' in payload:
-				raise APIError(
-					payload.get('errors', [])[0].get('detail', 'Unknown error'),
-				 	payload.get('errors', [])[0].get('status', None)
-				)
+		if content_type in JSON_CONTENT_TYPES:
+			with self._span('decode', bytes=len(r.content)):
+				payload = self._check_payload(self.json_codec.loads(r.content))
+			if cache_key:
+				self.cache.store(cache_key, payload, r.headers, self._url_types(url))
 			return payload
 		elif content_type == 'application/a-gzip':
-			# TODO implement stream decompress
-			data_gz = b""
-			for chunk in r.iter_content(1024 * 1024):
-				if chunk:
-					data_gz = data_gz + chunk
-
-			data = gzip.decompress(data_gz)
-			return data.decode("utf-8")
+			if stream:
+				return self._iter_content(r)
+			return b''.join(reports.decompress(r.iter_content(reports.CHUNK_SIZE))).decode("utf-8")
 		else:
-			if not 200 <= r.status_code <= 299:
-				raise APIError("HTTP error [%d][%s]" % (r.status_code, r.content))
+			self._check_status(r.status_code, r.content)
 			return r
 
+	def _send(self, url, method, headers, data, stream):
+		"""
+		send a request paced by the rate limiter, retrying on 429, 5xx and connection errors
+		"""
+		endpoint = self._endpoint(url)
+		attempt = 0
+		while True:
+			time.sleep(self.rate_limiter.acquire())
+			headers["Authorization"] = "Bearer %s" % self.token
+			with self._span('http', method=method.name, endpoint=endpoint, attempt=attempt) as span:
+				if self.tracer is not None:
+					self.tracer.inject(headers, span)
+				self._dispatch('before_request', method, url, headers)
+				pop_connect_time()
+				start = time.perf_counter()
+				try:
+					r = self._session.request(method.name, url, headers=headers, data=data, timeout=self.timeout, stream=stream)
+				except requests.exceptions.ConnectionError as e:
+					if self._should_retry(method, attempt, connected=not isinstance(e, requests.exceptions.ConnectTimeout)):
+						span.record_exception(e)
+						self._count_retry(method, endpoint, 'connection')
+						time.sleep(self.rate_limiter.backoff(attempt))
+						attempt += 1
+						continue
+					if isinstance(e, requests.exceptions.ConnectTimeout):
+						raise APIError(f"Connect timeout after {self._connect_timeout} seconds")
+					raise
+				except PoolTimeout:
+					raise APIError(POOL_TIMEOUT_MESSAGE % self._pool_timeout)
+				except requests.exceptions.Timeout:
+					raise APIError(f"Read timeout after {self._read_timeout} seconds")
+
+				span.set_attribute('status_code', r.status_code)
+				if self.metrics is not None:
+					self.metrics.observe_response(method.name, endpoint, r.status_code, r.elapsed.total_seconds(),
+					                              time.perf_counter() - start, pop_connect_time())
+					if not stream:
+						self.metrics.count_bytes(method.name, endpoint, len(r.content))
+				self._dispatch('after_response', method, url, r)
+			self.rate_limiter.update(r.headers)
+			if self._should_retry(method, attempt, r.status_code):
+				self._count_retry(method, endpoint, r.status_code)
+				r.close()
+				time.sleep(self.rate_limiter.backoff(attempt, r.headers.get('retry-after')))
+				attempt += 1
+				continue
+			return r
+
+	def _count_retry(self, method, endpoint, reason):
+		if self.metrics is not None:
+			self.metrics.count_retry(method.name, endpoint, reason)
+
+	@staticmethod
+	def _endpoint(url):
+		"""
+		:return: the path of an API url with the resource id replaced, e.g. /v1/apps/{id}/builds
+		"""
+		segments = urlsplit(url).path.split('/')
+		if len(segments) > 3:  # '', 'v1', type, id
+			segments[3] = '{id}'
+		return '/'.join(segments)
+
+	def _should_retry(self, method, attempt, status_code=None, connected=True):
+		if attempt >= self.rate_limiter.max_retries:
+			return False
+		if status_code is None:  # connection error, a POST request is only safe to send again if it never left
+			return method != HttpMethod.POST or not connected
+		if status_code not in RETRY_STATUS_CODES:
+			return False
+		# a POST request may have been processed unless it was rejected by the rate limit
+		return method != HttpMethod.POST or status_code == 429
+
+	@property
+	def rate_limit(self):
+		"""
+		:return: the state of the rate limiter: hourly limit and remaining quota, current wait and retries count
+		"""
+		return self.rate_limiter.state
+
+	def _cache_key(self, url, method, stream):
+		if self.cache is None or method != HttpMethod.GET or stream:
+			return None
+		return self.issuer_id, self.key_id, url
+
+	def _flight_key(self, url, method, stream):
+		if self.singleflight is None or method != HttpMethod.GET or stream:
+			return None
+		return self.issuer_id, self.key_id, url
+
+	def _url_types(self, url):
+		"""
+		:return: the resource types found in the path of an API url
+		"""
+		path = url.replace(self.base_url, '').split('?')[0]
+		return {segment for segment in path.split('/') if segment in resources}
+
+	def _invalidate_cache(self, url, post_data):
+		if self.cache is None:
+			return
+		types = self._url_types(url)
+		data = (post_data or {}).get('data')
+		for resource in (data if type(data) is list else [data]):
+			if type(resource) is dict and resource.get('type'):
+				types.add(resource.get('type'))
+		self.cache.invalidate(types)
+
+	def _prepare_request(self, url, method, post_data):
+		headers = {}
+		if self._debug:
+			print("%s %s" % (method.value, url))
+
+		if self._submit_stats:
+			endpoint = url.replace(self.base_url, '')
+			if method in (HttpMethod.PATCH, HttpMethod.DELETE):  # remove last bit of endpoint which is a resource id
+				endpoint = "/".join(endpoint.split('/')[:-1])
+			request = "%s %s" % (method.name, endpoint)
+			self._call_stats[request] += 1
+
+		data = None
+		if method in (HttpMethod.POST, HttpMethod.PATCH) or (method == HttpMethod.DELETE and post_data is not None):
+			headers["Content-Type"] = "application/json"
+			data = self.json_codec.dumps(post_data)
+		elif method not in (HttpMethod.GET, HttpMethod.DELETE):
+			raise APIError("Unknown HTTP method")
+
+		return headers, data
+
+	@staticmethod
+	def _check_payload(payload):
+		if 'errors' in payload:
+			raise APIError(
+				payload.get('errors', [])[0].get('detail', 'Unknown error'),
+				payload.get('errors', [])[0].get('status', None)
+			)
+		return payload
+
+	@staticmethod
+	def _check_status(status_code, content):
+		if not 200 <= status_code <= 299:
+			raise APIError("HTTP error [%d][%s]" % (status_code, content))
+
+	def _iter_content(self, response):
+		size = 0
+		try:
+			for chunk in response.iter_content(reports.CHUNK_SIZE):
+				if chunk:
+					size += len(chunk)
+					yield chunk
+		finally:
+			response.close()
+			if self.metrics is not None:
+				self.metrics.count_bytes(response.request.method, self._endpoint(response.url), size)
+
+	def _report_chunks(self, url):
+		"""
+		:return: an iterator over the gzip compressed report, served from the report cache when possible
+		"""
+		span = self._span('report', endpoint=self._endpoint(url))
+		try:
+			with span.activate():
+				key = self.report_cache.key(url) if self.report_cache is not None else None
+				path = self.report_cache.get(key) if key else None
+				span.set_attribute('cached', bool(path))
+				if path:
+					chunks = reports.iter_file_chunks(path)
+				else:
+					chunks = self._api_call(url, stream=True)
+					chunks = self.report_cache.tee(key, chunks) if key else chunks
+		except Exception as e:
+			span.record_exception(e)
+			span.end()
+			raise
+		return chunks if span is tracing.NULL_SPAN else tracing.iterate(span, chunks)
+
+	def _stream_report(self, url, save_to=None):
+		chunks = reports.decompress(self._report_chunks(url))
+		if save_to:
+			reports.write_chunks(chunks, save_to)
+			return reports.iter_file_rows(save_to)
+		return reports.iter_rows(reports.iter_lines(chunks))
+
+	def _parse_report(self, rows, filters):
+		with self._span('parse_report', report_type=filters['reportType']) as span:
+			table = tables.parse_sales_report(rows, filters['reportType'], filters.get('version'))
+			span.set_attribute('rows', len(table))
+		return self._store_report(table, filters)
+
+	def _store_report(self, table, filters):
+		# the latest report, downloaded without reportDate, is only stored when its date can be read from its rows
+		if self.warehouse is not None and self.warehouse.report_date(table, filters) is not None:
+			self.warehouse.add(table, filters)
+		return table
+
+	def _stream_finance_sections(self, url, save_to=None):
+		sections = reports.split_finance_report(reports.decompress(self._report_chunks(url)))
+		if save_to:
+			reports.write_sections(sections, save_to)
+			return tuple(reports.iter_file_rows(path) for path in save_to)
+		return reports.demultiplex(reports.iter_section_rows(sections))
+
 	def _submit_stats(self, event_type):
 		"""
 		this submits anonymous usage statistics to help us better understand how this library is used
 		you can opt-out by initializing the client with submit_stats=False
+		events are sent from a background thread and never block the caller
 		"""
 		payload = {
 			'project': 'appstoreconnectapi',
@@ -329,17 +744,38 @@ class Api:
 			}
 		}
 		if event_type == 'session_end':
-			payload['parameters']['endpoints'] = self._call_stats
-		requests.post('https://stats.ponytech.net/new-event', json.dumps(payload))
+			payload['parameters']['endpoints'] = dict(self._call_stats)
+		stats.sender.submit(payload)
+
+	@property
+	def _connect_timeout(self):
+		return self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout
+
+	@property
+	def _read_timeout(self):
+		return self.timeout[1] if isinstance(self.timeout, tuple) else self.timeout
+
+	@property
+	def _pool_timeout(self):
+		return self._read_timeout if self._read_timeout is not None else POOL_TIMEOUT
 
 	@property
 	def token(self):
 		# generate a new token every 15 minutes
-		if (self._token is None) or (self.token_gen_date + timedelta(minutes=15) < datetime.now()):
-			self._token = self._generate_token()
+		if self._token_expired():
+			self._renew_token()
 
 		return self._token
 
+	def _renew_token(self):
+		# only once when several threads notice the token expired at the same time
+		with self._token_lock:
+			if self._token_expired():
+				self._set_token()
+
+	def _token_expired(self):
+		return (self._token is None) or (self.token_gen_date + TOKEN_REFRESH_AFTER < datetime.now())
+
 	# Users and Roles
 	def modify_user_account(
 			self,
@@ -355,19 +791,19 @@ class Api:
 		"""
 		return self._modify_resource(user, locals())
 
-	def list_users(self, filters=None, sort=None):
+	def list_users(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_users
 		:return: an iterator over User resources
 		"""
-		return self._get_resources(User, filters, sort)
+		return self._get_resources(User, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_invited_users(self, filters=None, sort=None):
+	def list_invited_users(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_invited_users
 		:return: an iterator over UserInvitation resources
 		"""
-		return self._get_resources(UserInvitation, filters, sort)
+		return self._get_resources(UserInvitation, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
 	# TODO: implement POST requests using Resource
 	def invite_user(self, all_apps_visible, email, first_name, last_name, provisioning_allowed, roles, visible_apps=None):
@@ -380,15 +816,15 @@ class Api:
 			visible_apps_relationship = list(map(lambda a: {'id': a, 'type': 'apps'}, visible_apps))
 			visible_apps_data = {'visibleApps': {'data': visible_apps_relationship}}
 			post_data['data']['relationships'] = visible_apps_data
-		payload = self._api_call(BASE_API + "/v1/userInvitations", HttpMethod.POST, post_data)
+		payload = self._api_call(self.base_url + "/v1/userInvitations", HttpMethod.POST, post_data)
 		return UserInvitation(payload.get('data'), {})
 
-	def read_user_invitation_information(self, user_invitation_id: str):
+	def read_user_invitation_information(self, user_invitation_id: str, include=None):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/read_user_invitation_information
 		:return: a UserInvitation resource
 		"""
-		return self._get_resource(UserInvitation, user_invitation_id)
+		return self._get_resource(UserInvitation, user_invitation_id, include)
 
 	# Beta Testers and Groups
 	def create_beta_tester(self, email: str, firstName: str = None, lastName: str = None, betaGroups: BetaGroup = None, builds: Build = None) -> BetaTester:
@@ -405,19 +841,33 @@ class Api:
 		"""
 		return self._delete_resource(betaTester)
 
-	def list_beta_testers(self, filters=None, sort=None):
+	def create_beta_testers(self, beta_testers, max_workers=bulk.MAX_WORKERS):
+		"""
+		create many beta testers concurrently, a failure does not stop the others
+		:param beta_testers: a list of dicts of create_beta_tester() arguments
+		:return: a list of BulkResult whose resource is the created BetaTester, in the order of beta_testers
+		"""
+		return self._bulk_create_resources(BetaTester, beta_testers, max_workers)
+
+	def delete_beta_testers(self, beta_testers, max_workers=bulk.MAX_WORKERS):
+		"""
+		:return: a list of BulkResult, in the order of beta_testers
+		"""
+		return self._bulk_delete_resources(beta_testers, max_workers)
+
+	def list_beta_testers(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_testers
 		:return: an iterator over BetaTester resources
 		"""
-		return self._get_resources(BetaTester, filters, sort)
+		return self._get_resources(BetaTester, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def read_beta_tester_information(self, beta_tester_id: str):
+	def read_beta_tester_information(self, beta_tester_id: str, include=None):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/read_beta_tester_information
 		:return: a BetaTester resource
 		"""
-		return self._get_resource(BetaTester, beta_tester_id)
+		return self._get_resource(BetaTester, beta_tester_id, include)
 
 	def create_beta_group(self, app: App, name: str, publicLinkEnabled: bool = None, publicLinkLimit: int = None, publicLinkLimitEnabled: bool = None) -> BetaGroup:
 		"""
@@ -436,61 +886,93 @@ class Api:
 	def delete_beta_group(self, betaGroup: BetaGroup):
 		return self._delete_resource(betaGroup)
 
-	def list_beta_groups(self, filters=None, sort=None):
+	def list_beta_groups(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_groups
 		:return: an iterator over BetaGroup resources
 		"""
-		return self._get_resources(BetaGroup, filters, sort)
+		return self._get_resources(BetaGroup, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def read_beta_group_information(self, beta_group_ip):
+	def read_beta_group_information(self, beta_group_ip, include=None):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/read_beta_group_information
 		:return: an BetaGroup resource
 		"""
-		return self._get_resource(BetaGroup, beta_group_ip)
+		return self._get_resource(BetaGroup, beta_group_ip, include)
 
 	def add_build_to_beta_group(self, beta_group_id, build_id):
 		post_data = {'data': [{ 'id': build_id, 'type': 'builds'}]}
-		payload = self._api_call(BASE_API + "/v1/betaGroups/" + beta_group_id + "/relationships/builds", HttpMethod.POST, post_data)
+		payload = self._api_call(self.base_url + "/v1/betaGroups/" + beta_group_id + "/relationships/builds", HttpMethod.POST, post_data)
 		return BetaGroup(payload.get('data'), {})
 
+	def add_builds_to_beta_group(self, beta_group_id, build_ids, max_workers=bulk.MAX_WORKERS):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/add_builds_to_a_beta_group
+		:return: a list of BulkResult, one per request, whose item is the list of build ids it sent
+		"""
+		url = self.base_url + "/v1/betaGroups/" + beta_group_id + "/relationships/builds"
+		return self._bulk_link_resources(url, HttpMethod.POST, 'builds', build_ids, max_workers)
+
+	def remove_builds_from_beta_group(self, beta_group_id, build_ids, max_workers=bulk.MAX_WORKERS):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/remove_builds_from_a_beta_group
+		:return: a list of BulkResult, one per request, whose item is the list of build ids it sent
+		"""
+		url = self.base_url + "/v1/betaGroups/" + beta_group_id + "/relationships/builds"
+		return self._bulk_link_resources(url, HttpMethod.DELETE, 'builds', build_ids, max_workers)
+
+	def add_beta_testers_to_beta_group(self, beta_group_id, beta_tester_ids, max_workers=bulk.MAX_WORKERS):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/add_beta_testers_to_a_beta_group
+		:return: a list of BulkResult, one per request, whose item is the list of beta tester ids it sent
+		"""
+		url = self.base_url + "/v1/betaGroups/" + beta_group_id + "/relationships/betaTesters"
+		return self._bulk_link_resources(url, HttpMethod.POST, 'betaTesters', beta_tester_ids, max_workers)
+
+	def remove_beta_testers_from_beta_group(self, beta_group_id, beta_tester_ids, max_workers=bulk.MAX_WORKERS):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/remove_beta_testers_from_a_beta_group
+		:return: a list of BulkResult, one per request, whose item is the list of beta tester ids it sent
+		"""
+		url = self.base_url + "/v1/betaGroups/" + beta_group_id + "/relationships/betaTesters"
+		return self._bulk_link_resources(url, HttpMethod.DELETE, 'betaTesters', beta_tester_ids, max_workers)
+
 	# App Resources
-	def read_app_information(self, app_ip):
+	def read_app_information(self, app_ip, include=None):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/read_app_information
 		:param app_ip:
 		:return: an App resource
 		"""
-		return self._get_resource(App, app_ip)
+		return self._get_resource(App, app_ip, include)
 
-	def list_apps(self, filters=None, sort=None):
+	def list_apps(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_apps
 		:return: an iterator over App resources
 		"""
-		return self._get_resources(App, filters, sort)
+		return self._get_resources(App, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_prerelease_versions(self, filters=None, sort=None):
+	def list_prerelease_versions(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_prerelease_versions
 		:return: an iterator over PreReleaseVersion resources
 		"""
-		return self._get_resources(PreReleaseVersion, filters, sort)
+		return self._get_resources(PreReleaseVersion, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_beta_app_localizations(self, filters=None):
+	def list_beta_app_localizations(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_app_localizations
 		:return: an iterator over BetaAppLocalization resources
 		"""
-		return self._get_resources(BetaAppLocalization, filters)
+		return self._get_resources(BetaAppLocalization, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def read_beta_app_localization_information(self, beta_app_id: str):
+	def read_beta_app_localization_information(self, beta_app_id: str, include=None):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/read_beta_app_localization_information
 		:return: an BetaAppLocalization resource
 		"""
-		return self._get_resource(BetaAppLocalization, beta_app_id)
+		return self._get_resource(BetaAppLocalization, beta_app_id, include)
 
 	def create_beta_app_localization(self, app: App, locale: str, description: str = None, feedbackEmail: str = None, marketingUrl: str = None, privacyPolicyUrl: str = None, tvOsPrivacyPolicy: str = None):
 		"""
@@ -499,44 +981,44 @@ class Api:
 		"""
 		return self._create_resource(BetaAppLocalization, locals())
 
-	def list_app_encryption_declarations(self, filters=None):
+	def list_app_encryption_declarations(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_app_encryption_declarations
 		:return: an iterator over AppEncryptionDeclaration resources
 		"""
-		return self._get_resources(AppEncryptionDeclaration, filters)
+		return self._get_resources(AppEncryptionDeclaration, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_beta_license_agreements(self, filters=None):
+	def list_beta_license_agreements(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_license_agreements
 		:return: an iterator over BetaLicenseAgreement resources
 		"""
-		return self._get_resources(BetaLicenseAgreement, filters)
+		return self._get_resources(BetaLicenseAgreement, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
 	# Build Resources
-	def list_builds(self, filters=None, sort=None):
+	def list_builds(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_builds
 		:return: an iterator over Build resources
 		"""
-		return self._get_resources(Build, filters, sort)
+		return self._get_resources(Build, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	# TODO: handle fields on get_resources()
 	def build_processing_state(self, app_id, version):
-		return self._api_call(BASE_API + "/v1/builds?filter[app]=" + app_id + "&filter[version]=" + version + "&fields[builds]=processingState")
+		url = self._build_query_parameters(self.base_url + Build.endpoint, {'app': app_id, 'version': version}, fields={'builds': ['processingState']})
+		return self._api_call(url)
 
 	# TODO: implement POST requests using Resource
 	def set_uses_non_encryption_exemption_setting(self, build_id, uses_non_encryption_exemption_setting):
 		post_data = {'data': {'attributes': {'usesNonExemptEncryption': uses_non_encryption_exemption_setting}, 'id': build_id, 'type': 'builds'}}
-		payload = self._api_call(BASE_API + "/v1/builds/" + build_id, HttpMethod.PATCH, post_data)
+		payload = self._api_call(self.base_url + "/v1/builds/" + build_id, HttpMethod.PATCH, post_data)
 		return Build(payload.get('data'), {})
 
-	def list_build_beta_details(self, filters=None):
+	def list_build_beta_details(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_build_beta_details
 		:return: an iterator over BuildBetaDetail resources
 		"""
-		return self._get_resources(BuildBetaDetail, filters)
+		return self._get_resources(BuildBetaDetail, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
 	def create_beta_build_localization(self, build: Build, locale: str, whatsNew: str = None):
 		"""
@@ -552,19 +1034,19 @@ class Api:
 		"""
 		return self._modify_resource(beta_build_localization, locals())
 
-	def list_beta_build_localizations(self, filters=None):
+	def list_beta_build_localizations(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_build_localizations
 		:return: an iterator over BetaBuildLocalization resources
 		"""
-		return self._get_resources(BetaBuildLocalization, filters)
+		return self._get_resources(BetaBuildLocalization, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_beta_app_review_details(self, filters=None):
+	def list_beta_app_review_details(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_app_review_details
 		:return: an iterator over BetaAppReviewDetail resources
 		"""
-		return self._get_resources(BetaAppReviewDetail, filters)
+		return self._get_resources(BetaAppReviewDetail, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
 	def submit_app_for_beta_review(self, build: Build) -> BetaAppReviewSubmission:
 		"""
@@ -574,41 +1056,41 @@ class Api:
 
 		return self._create_resource(BetaAppReviewSubmission, locals())
 
-	def list_beta_app_review_submissions(self, filters=None):
+	def list_beta_app_review_submissions(self, filters=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_beta_app_review_submissions
 		:return: an iterator over BetaAppReviewSubmission resources
 		"""
-		return self._get_resources(BetaAppReviewSubmission, filters)
+		return self._get_resources(BetaAppReviewSubmission, filters, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def read_beta_app_review_submission_information(self, beta_app_id: str):
+	def read_beta_app_review_submission_information(self, beta_app_id: str, include=None):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/read_beta_app_review_submission_information
 		:return: an BetaAppReviewSubmission resource
 		"""
-		return self._get_resource(BetaAppReviewSubmission, beta_app_id)
+		return self._get_resource(BetaAppReviewSubmission, beta_app_id, include)
 
 	# Provisioning
-	def list_bundle_ids(self, filters=None, sort=None):
+	def list_bundle_ids(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_bundle_ids
 		:return: an iterator over BundleId resources
 		"""
-		return self._get_resources(BundleId, filters, sort)
+		return self._get_resources(BundleId, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_certificates(self, filters=None, sort=None):
+	def list_certificates(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_and_download_certificates
 		:return: an iterator over Certificate resources
 		"""
-		return self._get_resources(Certificate, filters, sort)
+		return self._get_resources(Certificate, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
-	def list_devices(self, filters=None, sort=None):
+	def list_devices(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_devices
 		:return: an iterator over Device resources
 		"""
-		return self._get_resources(Device, filters, sort)
+		return self._get_resources(Device, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
 	def register_new_device(self, name: str, platform: str, udid: str) -> Device:
 		"""
@@ -617,6 +1099,14 @@ class Api:
 		"""
 		return self._create_resource(Device, locals())
 
+	def register_new_devices(self, devices, max_workers=bulk.MAX_WORKERS):
+		"""
+		register many devices concurrently, a failure does not stop the others
+		:param devices: a list of dicts of register_new_device() arguments
+		:return: a list of BulkResult whose resource is the registered Device, in the order of devices
+		"""
+		return self._bulk_create_resources(Device, devices, max_workers)
+
 	def modify_registered_device(self, device: Device, name: str = None, status: str = None) -> Device:
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/modify_a_registered_device
@@ -624,15 +1114,90 @@ class Api:
 		"""
 		return self._modify_resource(device, locals())
 
-	def list_profiles(self, filters=None, sort=None):
+	def modify_registered_devices(self, changes, max_workers=bulk.MAX_WORKERS):
+		"""
+		:param changes: a list of (device, dict of modify_registered_device() arguments) tuples
+		:return: a list of BulkResult whose resource is the modified Device, in the order of changes
+		"""
+		return self._bulk_modify_resources(changes, max_workers)
+
+	def list_profiles(self, filters=None, sort=None, limit=None, fields=None, include=None, prefetch=0):
 		"""
 		:reference: https://developer.apple.com/documentation/appstoreconnectapi/list_and_download_profiles
 		:return: an iterator over Profile resources
 		"""
-		return self._get_resources(Profile, filters, sort)
+		return self._get_resources(Profile, filters, sort, limit=limit, fields=fields, include=include, prefetch=prefetch)
 
 	# Reporting
-	def download_finance_reports(self, filters=None, split_response=False, save_to=None):
+	def download_finance_reports(self, filters=None, split_response=False, save_to=None, stream=False, table=False):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/download_finance_reports
+		:param split_response: separate the detail rows from the summary following the Total_Rows line, save_to then
+		takes two paths
+		:param stream: decompress the report while it is downloaded and return an iterator over its rows instead of a string
+		:param table: parse the detail rows while the report is downloaded into a SalesReportTable of typed columns,
+		requires numpy
+		:return: the report content, or an iterator over rows (lists of strings, header first) when streaming. With
+		split_response, a tuple of two of them
+		"""
+		if table and split_response:
+			raise ValueError("split_response cannot be combined with table")
+
+		url = self._finance_report_url(filters)
+		if table:
+			return self._parse_report(reports.iter_detail_rows(self._stream_report(url, save_to)), filters)
+		if stream:
+			return self._stream_finance_sections(url, save_to) if split_response else self._stream_report(url, save_to)
+		chunks = reports.decompress(self._report_chunks(url))
+		if split_response:
+			return self._save_finance_sections(reports.split_finance_report(chunks), save_to)
+		response = b''.join(chunks).decode("utf-8")
+
+		return self._save_finance_report(response, save_to)
+
+	def download_sales_and_trends_reports(self, filters=None, save_to=None, stream=False, table=False):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/download_sales_and_trends_reports
+		:param stream: decompress the report while it is downloaded and return an iterator over its rows instead of a string
+		:param table: parse the report while it is downloaded into a SalesReportTable of typed columns, requires numpy
+		:return: the report content, or an iterator over rows (lists of strings, header first) when streaming
+		"""
+		url = self._sales_report_url(filters)
+		if table:
+			return self._parse_report(self._stream_report(url, save_to), filters)
+		if stream:
+			return self._stream_report(url, save_to)
+		response = b''.join(reports.decompress(self._report_chunks(url))).decode("utf-8")
+
+		if save_to:
+			file = Path(save_to)
+			file.write_text(response, 'utf-8')
+
+		return response
+
+	def backfill_sales_and_trends_reports(self, vendor_numbers, start_date, end_date, directory, frequencies=('DAILY',), report_types=('SALES',), max_workers=4, retry_missing=False):
+		"""
+		download every sales report between two dates to directory, resuming a previous run if any
+		:param start_date: a datetime.date, included
+		:param end_date: a datetime.date, included
+		:param retry_missing: download again reports which were not available during a previous run
+		:return: a dict mapping each report to its status: done, missing or failed
+		"""
+		jobs = sales_and_trends_jobs(self, vendor_numbers, start_date, end_date, frequencies, report_types)
+		return Backfill(directory, max_workers, retry_missing).run(jobs)
+
+	def backfill_finance_reports(self, vendor_numbers, start_date, end_date, directory, region_codes=('ZZ',), report_types=('FINANCIAL',), max_workers=4, retry_missing=False):
+		"""
+		download every monthly finance report between two dates to directory, resuming a previous run if any
+		:param start_date: a datetime.date, included
+		:param end_date: a datetime.date, included
+		:param retry_missing: download again reports which were not available during a previous run
+		:return: a dict mapping each report to its status: done, missing or failed
+		"""
+		jobs = finance_jobs(self, vendor_numbers, start_date, end_date, region_codes, report_types)
+		return Backfill(directory, max_workers, retry_missing).run(jobs)
+
+	def _finance_report_url(self, filters):
 		# setup required filters if not provided
 		for required_key, default_value in (
 				('regionCode', 'ZZ'),
@@ -643,62 +1208,306 @@ class Api:
 			if required_key not in filters:
 				filters[required_key] = default_value
 
-		url = "%s%s" % (BASE_API, FinanceReport.endpoint)
-		url = self._build_query_parameters(url, filters)
-		response = self._api_call(url)
+		url = "%s%s" % (self.base_url, FinanceReport.endpoint)
+		return self._build_query_parameters(url, filters)
 
-		if split_response:
-			res1 = response.split('Total_Rows')[0]
-			res2 = '\n'.join(response.split('Total_Rows')[1].split('\n')[1:])
-
-			if save_to:
-				file1 = Path(save_to[0])
-				file1.write_text(res1, 'utf-8')
-				file2 = Path(save_to[1])
-				file2.write_text(res2, 'utf-8')
+	@staticmethod
+	def _save_finance_sections(sections, save_to):
+		if save_to:
+			reports.write_sections(sections, save_to)
+			return tuple(Path(path).read_text('utf-8') for path in save_to)
 
-			return res1, res2
+		data = ([], [])
+		for section, chunk in sections:
+			data[section].append(chunk)
+		return tuple(b''.join(chunks).decode("utf-8") for chunks in data)
 
+	@staticmethod
+	def _save_finance_report(response, save_to):
 		if save_to:
 			file = Path(save_to)
 			file.write_text(response, 'utf-8')
 
 		return response
 
-	def download_sales_and_trends_reports(self, filters=None, save_to=None):
+	def _sales_report_url(self, filters):
 		# setup required filters if not provided
-		default_versions = {
-			'SALES': '1_0',
-			'SUBSCRIPTION': '1_2',
-			'SUBSCRIPTION_EVENT': '1_2',
-			'SUBSCRIBER': '1_2',
-			'NEWSSTAND': '1_0',
-			'PRE_ORDER': '1_0',
-		}
-		default_subtypes = {
-			'SALES': 'SUMMARY',
-			'SUBSCRIPTION': 'SUMMARY',
-			'SUBSCRIPTION_EVENT': 'SUMMARY',
-			'SUBSCRIBER': 'DETAILED',
-			'NEWSSTAND': 'DETAILED',
-			'PRE_ORDER': 'SUMMARY',
-		}
 		for required_key, default_value in (
 				('frequency', 'DAILY'),
 				('reportType', 'SALES'),
-				('reportSubType',  default_subtypes.get(filters.get('reportType', 'SALES'), 'SUMMARY')),
-				('version', default_versions.get(filters.get('reportType', 'SALES'), '1_0')),
+				('reportSubType', reports.SALES_REPORT_SUBTYPES.get(filters.get('reportType', 'SALES'), 'SUMMARY')),
+				('version', reports.SALES_REPORT_VERSIONS.get(filters.get('reportType', 'SALES'), '1_0')),
 				# vendorNumber is required but we cannot provide a default value
 		):
 			if required_key not in filters:
 				filters[required_key] = default_value
 
-		url = "%s%s" % (BASE_API, SalesReport.endpoint)
-		url = self._build_query_parameters(url, filters)
-		response = self._api_call(url)
+		url = "%s%s" % (self.base_url, SalesReport.endpoint)
+		return self._build_query_parameters(url, filters)
+
+
+class IterResource:
+	"""
+	a lazy sequence over a paginated listing, use "for" with Api and "async for" with AsyncApi
+
+	pages are only fetched when needed and kept, so the listing can be iterated again or indexed without new requests.
+	When prefetch is set, up to that many upcoming pages are fetched in the background while the current one is consumed
+	"""
+
+	def __init__(self, api, Resource, url, prefetch=0):
+		self.api = api
+		self.Resource = api._resource_class(Resource)
+		self.url = url
+		self.total_length = None
+		self.prefetch = prefetch
+		self._pages = []  # (resources data, included resources) of each fetched page
+		self._length = 0  # number of resources in fetched pages
+		self._next_url = url
+		self._iterator = None
+		self._prefetched = None
+		self._stop = None
+		self._span = None  # the listing span, started with the first page and ended with the last one
+
+	def __getitem__(self, item):
+		self._require_sync('listing[item]', 'await listing.aget(item)')
+		if isinstance(item, slice):
+			if not self._is_bounded(item):
+				self._fetch_all()
+			else:
+				self._fetch_until(item.stop)
+			return [self._resource(index) for index in range(*item.indices(self._length))]
+		if item < 0:
+			item += len(self)
+		self._fetch_until(item + 1)
+		if not 0 <= item < self._length:
+			raise IndexError("listing index out of range")
+		return self._resource(item)
+
+	def __iter__(self):
+		self._require_sync('for', 'async for')
+		page = 0
+		while page < len(self._pages) or self._fetch_next_page():
+			yield from self._page_resources(page)
+			page += 1
+
+	async def __aiter__(self):
+		page = 0
+		while page < len(self._pages) or await self._afetch_next_page():
+			for resource in self._page_resources(page):
+				yield resource
+			page += 1
+
+	def __next__(self):
+		# a listing used to be its own iterator, keep next(listing) working
+		if self._iterator is None:
+			self._iterator = iter(self)
+		return next(self._iterator)
+
+	def __repr__(self):
+		return "Iterator over %s resource" % self.Resource.__name__
+
+	def __len__(self):
+		self._require_sync('len(listing)', 'await listing.alen()')
+		if not self._pages:
+			self._fetch_next_page()
+		if self.total_length is None:  # the API did not report the total, count resources
+			self._fetch_all()
+			return self._length
+		return self.total_length
+
+	async def alen(self):
+		"""
+		:return: the total number of resources, fetching the first page if needed
+		"""
+		if not self._pages:
+			await self._afetch_next_page()
+		if self.total_length is None:
+			while await self._afetch_next_page():
+				pass
+			return self._length
+		return self.total_length
+
+	async def aget(self, item):
+		"""
+		asynchronous counterpart of listing[item], only fetches the pages needed
+		"""
+		if isinstance(item, slice):
+			stop = item.stop if self._is_bounded(item) else None
+			while (stop is None or self._length < stop) and await self._afetch_next_page():
+				pass
+			return [self._resource(index) for index in range(*item.indices(self._length))]
+		if item < 0:
+			item += await self.alen()
+		while self._length <= item and await self._afetch_next_page():
+			pass
+		if not 0 <= item < self._length:
+			raise IndexError("listing index out of range")
+		return self._resource(item)
+
+	def pages(self):
+		"""
+		:return: an iterator over the raw JSON data of each page, as (resources data, included resources) tuples
+		"""
+		self._require_sync('pages()', 'async for over the listing')
+		page = 0
+		while page < len(self._pages) or self._fetch_next_page():
+			yield self._pages[page]
+			page += 1
+
+	def close(self):
+		"""
+		stop prefetching pages and end the listing span, only needed when iteration is abandoned before the end. The
+		listing can still be iterated again afterwards, prefetching then restarts from the first page not fetched yet
+		"""
+		self._stop_prefetching()
+		if self._span is not None:
+			self._span.end()
+			self._span = None
+
+	def _require_sync(self, operation, alternative):
+		if self.api.asynchronous:
+			raise TypeError("%s is not supported on listings of AsyncApi, use %s instead" % (operation, alternative))
+
+	@staticmethod
+	def _is_bounded(item):
+		return (item.step is None or item.step > 0) and (item.start is None or item.start >= 0) \
+			and item.stop is not None and item.stop >= 0
+
+	def _page_resources(self, page):
+		data, included = self._pages[page]
+		with self.api._span('resources', parent=self._span, resource=self.Resource.__name__, count=len(data)):
+			resources = [self.Resource(resource, self.api, included) for resource in data]
+		yield from resources
+
+	def _resource(self, index):
+		for data, included in self._pages:
+			if index < len(data):
+				return self.Resource(data[index], self.api, included)
+			index -= len(data)
+		raise IndexError("listing index out of range")
+
+	def _fetch_until(self, length):
+		while self._length < length and self._fetch_next_page():
+			pass
 
-		if save_to:
-			file = Path(save_to)
-			file.write_text(response, 'utf-8')
+	def _fetch_all(self):
+		while self._fetch_next_page():
+			pass
 
-		return response
+	def _fetch_next_page(self):
+		"""
+		:return: False if every page was already fetched
+		"""
+		if not self._next_url:
+			return False
+		if self.prefetch:
+			payload = self._get_prefetched_page()  # the prefetching thread traces pages
+		else:
+			with self.api._span('page', parent=self._listing_span(), page=len(self._pages) + 1):
+				payload = self.api._api_call(self._next_url)
+		self._add_page(payload)
+		return True
+
+	async def _afetch_next_page(self):
+		if not self._next_url:
+			return False
+		if self.prefetch:
+			payload = await self._aget_prefetched_page()
+		else:
+			with self.api._span('page', parent=self._listing_span(), page=len(self._pages) + 1):
+				payload = await self.api._api_call(self._next_url)
+		self._add_page(payload)
+		return True
+
+	def _listing_span(self):
+		if self._span is None:
+			self._span = self.api._span('listing', endpoint=self.api._endpoint(self.url), resource=self.Resource.__name__)
+		return self._span
+
+	def _add_page(self, payload):
+		data = payload.get('data', [])
+		self._pages.append((data, self.api._index_included(payload)))
+		self._length += len(data)
+		self._next_url = payload.get('links', {}).get('next', None)
+		self.total_length = payload.get('meta', {}).get('paging', {}).get('total', self.total_length)
+		if self._next_url is None:
+			if self.api.metrics is not None:
+				self.api.metrics.observe_listing(self.api._endpoint(self.url), len(self._pages))
+			if self._span is not None:
+				self._span.set_attribute('pages', len(self._pages))
+				self._span.set_attribute('resources', self._length)
+				self._span.end()
+
+	def _get_prefetched_page(self):
+		if self._prefetched is None:
+			self._prefetched = queue.Queue(self.prefetch)
+			stop = threading.Event()
+			self._stop = stop.set
+			weakref.finalize(self, stop.set)
+			threading.Thread(target=_prefetch_pages, args=(self.api, self._next_url, len(self._pages) + 1, self._prefetched,
+			                                               stop, self._listing_span()), daemon=True).start()
+		return self._raise_or_return(self._prefetched.get())
+
+	async def _aget_prefetched_page(self):
+		if self._prefetched is None:
+			self._prefetched = asyncio.Queue(self.prefetch)
+			task = asyncio.ensure_future(_aprefetch_pages(self.api, self._next_url, len(self._pages) + 1, self._prefetched,
+			                                              self._listing_span()))
+			self._stop = task.cancel
+			weakref.finalize(self, task.cancel)
+		return self._raise_or_return(await self._prefetched.get())
+
+	def _raise_or_return(self, page):
+		if isinstance(page, Exception):
+			# the producer ended on the failing page, the next fetch starts a new one from that page
+			self._stop_prefetching()
+			raise page
+		return page
+
+	def _stop_prefetching(self):
+		if self._stop is not None:
+			self._stop()
+		self._prefetched = None
+		self._stop = None
+
+
+def _prefetch_pages(api, url, page, pages, stop, span):
+	# runs in a background thread and must not hold a reference to the IterResource
+	while url and not stop.is_set():
+		try:
+			with api._span('page', parent=span, page=page, prefetched=True):
+				payload = api._api_call(url)
+		except Exception as e:
+			payload = e
+		page += 1
+		while not stop.is_set():
+			try:
+				pages.put(payload, timeout=0.1)
+				break
+			except queue.Full:
+				pass
+		if isinstance(payload, Exception):
+			return
+		url = payload.get('links', {}).get('next', None)
+
+
+async def _aprefetch_pages(api, url, page, pages, span):
+	while url:
+		try:
+			with api._span('page', parent=span, page=page, prefetched=True):
+				payload = await api._api_call(url)
+		except Exception as e:
+			payload = e
+		page += 1
+		await pages.put(payload)
+		if isinstance(payload, Exception):
+			return
+		url = payload.get('links', {}).get('next', None)
+
+
+def _refresh_token(api_reference):
+	# runs in a timer thread and must not keep the Api alive
+	api = api_reference()
+	if api is not None:
+		with api._token_lock:
+			api._set_token()
@@ -0,0 +1,434 @@
+import asyncio
+import functools
+import time
+from pathlib import Path
+
+try:
+	import httpx
+except ImportError:
+	httpx = None
+
+from .api import Api, APIError, HttpMethod, BASE_API, JSON_CONTENT_TYPES, POOL_CONNECTIONS, POOL_MAXSIZE, POOL_TIMEOUT_MESSAGE
+from .resources import *
+from .backfill import Backfill, sales_and_trends_jobs, finance_jobs
+from . import bulk
+from . import reports
+from . import tables
+from . import tracing
+
+FEED_ROWS = 1000  # rows of a downloaded report given to the table parser at once
+
+
+class AsyncApi(Api):
+	"""
+	asyncio flavour of Api: every method returning a resource is a coroutine and listings support "async for"
+
+	requires httpx, install with: pip install appstoreconnect[async]
+	"""
+	asynchronous = True
+
+	def __init__(self, key_id, key_file, issuer_id, submit_stats=True, timeout=None, proxy=None,
+	             pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, cache=None, report_cache=None, rate_limiter=None,
+	             background_token_refresh=False, token_cache_file=None, compact_resources=False, keep_raw=False,
+	             warehouse=None, singleflight=True, metrics=True, hooks=None, tracer=None, base_url=BASE_API,
+	             transport=None, json_codec=None):
+		if httpx is None:
+			raise ImportError("AsyncApi requires httpx, install it with: pip install appstoreconnect[async]")
+		super().__init__(key_id, key_file, issuer_id, submit_stats=submit_stats, timeout=timeout, proxy=proxy,
+		                 pool_connections=pool_connections, pool_maxsize=pool_maxsize, cache=cache, report_cache=report_cache,
+		                 rate_limiter=rate_limiter, background_token_refresh=background_token_refresh,
+		                 token_cache_file=token_cache_file, compact_resources=compact_resources, keep_raw=keep_raw,
+		                 warehouse=warehouse, singleflight=singleflight, metrics=metrics, hooks=hooks, tracer=tracer,
+		                 base_url=base_url, transport=transport, json_codec=json_codec)
+
+	def __enter__(self):
+		raise TypeError("use 'async with' on AsyncApi")
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, exc_type, exc_value, traceback):
+		await self.close()
+
+	def _create_session(self, pool_connections, pool_maxsize):
+		"""
+		create a keep-alive client reused by every API call
+		:param pool_connections: unused, httpx keeps a single pool
+		:param pool_maxsize: maximum number of connections open to a single host, further concurrent requests wait for
+		one to be free instead of opening more, at most the read timeout (POOL_TIMEOUT seconds without one). A streamed
+		report holds its connection until it is read to the end, so at most pool_maxsize of them can be open at once
+		"""
+		if isinstance(self.transport, httpx.AsyncClient):
+			return self.transport
+		if isinstance(self.timeout, tuple):
+			timeout = httpx.Timeout(None, connect=self.timeout[0], read=self.timeout[1], pool=self._pool_timeout)
+		else:
+			timeout = httpx.Timeout(self.timeout, pool=self._pool_timeout)
+		limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+		return httpx.AsyncClient(timeout=timeout, limits=limits, proxy=self.proxy, http2=self.transport == 'http2')
+
+	async def close(self):
+		"""
+		close all pooled connections, the instance must not be used afterwards
+		"""
+		if self._token_timer is not None:
+			self._token_timer.cancel()
+		if self._session is not None:
+			await self._session.aclose()
+
+	async def _get_resource(self, Resource, resource_id, include=None):
+		url = "%s%s/%s" % (self.base_url, Resource.endpoint, resource_id)
+		url = self._build_query_parameters(url, None, include=include)
+		payload = await self._api_call(url)
+		return self._resource_class(Resource)(payload.get('data', {}), self, self._index_included(payload))
+
+	def _related_from_included(self, related, multiple):
+		# keep relationship getters awaitable, or async iterable, when resolved locally
+		async def resource():
+			return related
+
+		async def related_resources():
+			for resource in related:
+				yield resource
+
+		return related_resources() if multiple else resource()
+
+	async def get_related_resource(self, full_url):
+		payload = await self._api_call(full_url)
+		data = payload.get('data')
+		if data is None:
+			return None
+		elif type(data) == dict:
+			return self._get_resource_from_payload_data(data, self._index_included(payload))
+
+	async def get_related_resources(self, full_url):
+		payload = await self._api_call(full_url)
+		data = payload.get('data', [])
+		included = self._index_included(payload)
+		for resource in data:
+			yield self._get_resource_from_payload_data(resource, included)
+
+	async def _create_resource(self, Resource, args):
+		post_data = self._create_payload(Resource, args)
+		url = "%s%s" % (self.base_url, Resource.endpoint)
+		if self._debug:
+			print(post_data)
+		payload = await self._api_call(url, HttpMethod.POST, post_data)
+
+		return self._resource_class(Resource)(payload.get('data', {}), self)
+
+	async def _modify_resource(self, resource, args):
+		post_data = self._modify_payload(resource, args)
+		url = "%s%s/%s" % (self.base_url, resource.endpoint, resource.id)
+		if self._debug:
+			print(post_data)
+		payload = await self._api_call(url, HttpMethod.PATCH, post_data)
+
+		return type(resource)(payload.get('data', {}), self)
+
+	async def _delete_resource(self, resource: Resource):
+		url = "%s%s/%s" % (self.base_url, resource.endpoint, resource.id)
+		await self._api_call(url, HttpMethod.DELETE)
+
+	def _run_bulk(self, function, items, max_workers):
+		return bulk.arun(function, items, max_workers)
+
+	async def _link_resources(self, url, method, resource_type, resource_ids):
+		await self._api_call(url, method, {'data': [{'id': resource_id, 'type': resource_type} for resource_id in resource_ids]})
+
+	async def _api_call(self, url, method=HttpMethod.GET, post_data=None, stream=False):
+		try:
+			with self._span('api_call', method=method.name, endpoint=self._endpoint(url)):
+				return await self._call(url, method, post_data, stream)
+		except Exception as e:
+			self._dispatch('on_error', method, url, e)
+			raise
+
+	async def _call(self, url, method, post_data, stream):
+		cache_key = self._cache_key(url, method, stream)
+		payload, conditional_headers = self.cache.lookup(cache_key) if cache_key else (None, {})
+		if payload is not None:
+			return payload
+
+		flight_key = self._flight_key(url, method, stream)
+		if flight_key:
+			return await self.singleflight.ado(flight_key, lambda: self._request(url, method, post_data, stream, cache_key, conditional_headers))
+		return await self._request(url, method, post_data, stream, cache_key, conditional_headers)
+
+	async def _request(self, url, method, post_data, stream, cache_key, conditional_headers):
+		headers, data = self._prepare_request(url, method, post_data)
+		headers.update(conditional_headers)
+		r = await self._send(url, method, headers, data, stream)
+
+		if self._debug:
+			print(r.status_code)
+
+		content_type = r.headers.get('content-type')
+
+		if content_type == 'application/a-gzip' and stream:
+			return self._aiter_content(r)
+
+		try:
+			await r.aread()
+		finally:
+			await r.aclose()
+
+		if method != HttpMethod.GET:
+			self._invalidate_cache(url, post_data)
+		elif cache_key and r.status_code == 304:
+			payload = self.cache.revalidated(cache_key, r.headers)
+			# the entry may have been evicted in the meantime
+			return payload if payload is not None else await self._request(url, method, post_data, stream, cache_key, {})
+
+		if content_type in JSON_CONTENT_TYPES:
+			with self._span('decode', bytes=len(r.content)):
+				payload = self._check_payload(self.json_codec.loads(r.content))
+			if cache_key:
+				self.cache.store(cache_key, payload, r.headers, self._url_types(url))
+			return payload
+		elif content_type == 'application/a-gzip':
+			return b''.join(reports.decompress([r.content])).decode("utf-8")
+		else:
+			self._check_status(r.status_code, r.content)
+			return r
+
+	async def _send(self, url, method, headers, data, stream=False):
+		endpoint = self._endpoint(url)
+		attempt = 0
+		while True:
+			await asyncio.sleep(self.rate_limiter.acquire())
+			headers["Authorization"] = "Bearer %s" % await self._atoken()
+			with self._span('http', method=method.name, endpoint=endpoint, attempt=attempt) as span:
+				if self.tracer is not None:
+					self.tracer.inject(headers, span)
+				self._dispatch('before_request', method, url, headers)
+				timings = {}
+				start = time.perf_counter()
+				try:
+					request = self._session.build_request(method.name, url, headers=headers, content=data,
+					                                      extensions={'trace': _connect_trace(timings)} if self.metrics is not None else None)
+					r = await self._session.send(request, stream=True)
+					ttfb = time.perf_counter() - start
+					if not stream:
+						try:
+							await r.aread()
+						finally:
+							await r.aclose()
+				except (httpx.ConnectTimeout, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+					if self._should_retry(method, attempt, connected=not isinstance(e, (httpx.ConnectTimeout, httpx.ConnectError))):
+						span.record_exception(e)
+						self._count_retry(method, endpoint, 'connection')
+						await asyncio.sleep(self.rate_limiter.backoff(attempt))
+						attempt += 1
+						continue
+					if isinstance(e, httpx.ConnectTimeout):
+						raise APIError(f"Connect timeout after {self._connect_timeout} seconds")
+					raise
+				except httpx.PoolTimeout:
+					raise APIError(POOL_TIMEOUT_MESSAGE % self._pool_timeout)
+				except httpx.TimeoutException:
+					raise APIError(f"Read timeout after {self._read_timeout} seconds")
+
+				span.set_attribute('status_code', r.status_code)
+				if self.metrics is not None:
+					self.metrics.observe_response(method.name, endpoint, r.status_code, ttfb, time.perf_counter() - start,
+					                              timings.get('connected'))
+					if not stream:
+						self.metrics.count_bytes(method.name, endpoint, len(r.content))
+				self._dispatch('after_response', method, url, r)
+			self.rate_limiter.update(r.headers)
+			if self._should_retry(method, attempt, r.status_code):
+				self._count_retry(method, endpoint, r.status_code)
+				await r.aclose()
+				await asyncio.sleep(self.rate_limiter.backoff(attempt, r.headers.get('retry-after')))
+				attempt += 1
+				continue
+			return r
+
+	async def _atoken(self):
+		# signing, and waiting for the token_cache_file lock, happen in a thread instead of blocking the event loop
+		if self._token_expired():
+			await _to_thread(self._renew_token)
+		return self._token
+
+	async def _aiter_content(self, response):
+		size = 0
+		try:
+			async for chunk in response.aiter_bytes(reports.CHUNK_SIZE):
+				if chunk:
+					size += len(chunk)
+					yield chunk
+		finally:
+			await response.aclose()
+			if self.metrics is not None:
+				self.metrics.count_bytes(response.request.method, self._endpoint(str(response.url)), size)
+
+	async def _report_chunks(self, url):
+		span = self._span('report', endpoint=self._endpoint(url))
+		try:
+			with span.activate():
+				key = self.report_cache.key(url) if self.report_cache is not None else None
+				path = self.report_cache.get(key) if key else None
+				span.set_attribute('cached', bool(path))
+				if path:
+					chunks = reports.aiter_file_chunks(path)
+				else:
+					chunks = await self._api_call(url, stream=True)
+					chunks = self.report_cache.atee(key, chunks) if key else chunks
+		except Exception as e:
+			span.record_exception(e)
+			span.end()
+			raise
+		return chunks if span is tracing.NULL_SPAN else tracing.aiterate(span, chunks)
+
+	async def _stream_report(self, url, save_to=None):
+		chunks = reports.adecompress(await self._report_chunks(url))
+		if save_to:
+			with open(save_to, 'wb') as file:
+				async for chunk in chunks:
+					file.write(chunk)
+			return self._aiter_file_rows(save_to)
+		return reports.aiter_rows(chunks)
+
+	async def _stream_finance_sections(self, url, save_to=None):
+		sections = reports.asplit_finance_report(reports.adecompress(await self._report_chunks(url)))
+		if save_to:
+			files = [open(path, 'wb') for path in save_to]
+			try:
+				async for section, data in sections:
+					files[section].write(data)
+			finally:
+				for file in files:
+					file.close()
+			return tuple(self._aiter_file_rows(path) for path in save_to)
+		return reports.ademultiplex(reports.aiter_section_rows(sections))
+
+	async def _aparse_report(self, rows, filters):
+		with self._span('parse_report', report_type=filters['reportType']) as span:
+			parser = tables.SalesReportParser(filters['reportType'], filters.get('version'))
+			batch = []
+			async for row in rows:
+				batch.append(row)
+				if len(batch) == FEED_ROWS:
+					parser.feed(batch)
+					batch = []
+			parser.feed(batch)
+			table = parser.table()
+			span.set_attribute('rows', len(table))
+		return self._store_report(table, filters)
+
+	@staticmethod
+	async def _aiter_file_rows(path):
+		for row in reports.iter_file_rows(path):
+			yield row
+
+	# Users and Roles
+	async def invite_user(self, all_apps_visible, email, first_name, last_name, provisioning_allowed, roles, visible_apps=None):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/invite_a_user
+		:return: a UserInvitation resource
+		"""
+		post_data = {'data': {'attributes': {'allAppsVisible': all_apps_visible, 'email': email, 'firstName': first_name, 'lastName': last_name, 'provisioningAllowed': provisioning_allowed, 'roles': roles}, 'type': 'userInvitations'}}
+		if visible_apps is not None:
+			visible_apps_relationship = list(map(lambda a: {'id': a, 'type': 'apps'}, visible_apps))
+			visible_apps_data = {'visibleApps': {'data': visible_apps_relationship}}
+			post_data['data']['relationships'] = visible_apps_data
+		payload = await self._api_call(self.base_url + "/v1/userInvitations", HttpMethod.POST, post_data)
+		return UserInvitation(payload.get('data'), {})
+
+	# Beta Testers and Groups
+	async def add_build_to_beta_group(self, beta_group_id, build_id):
+		post_data = {'data': [{ 'id': build_id, 'type': 'builds'}]}
+		payload = await self._api_call(self.base_url + "/v1/betaGroups/" + beta_group_id + "/relationships/builds", HttpMethod.POST, post_data)
+		return BetaGroup(payload.get('data'), {})
+
+	# Build Resources
+	async def set_uses_non_encryption_exemption_setting(self, build_id, uses_non_encryption_exemption_setting):
+		post_data = {'data': {'attributes': {'usesNonExemptEncryption': uses_non_encryption_exemption_setting}, 'id': build_id, 'type': 'builds'}}
+		payload = await self._api_call(self.base_url + "/v1/builds/" + build_id, HttpMethod.PATCH, post_data)
+		return Build(payload.get('data'), {})
+
+	# Reporting
+	async def download_finance_reports(self, filters=None, split_response=False, save_to=None, stream=False, table=False):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/download_finance_reports
+		:param split_response: separate the detail rows from the summary following the Total_Rows line, save_to then
+		takes two paths
+		:param stream: decompress the report while it is downloaded and return an async iterator over its rows instead of a string
+		:param table: parse the detail rows into a SalesReportTable of typed columns, requires numpy
+		:return: the report content, or an async iterator over rows (lists of strings, header first) when streaming. With
+		split_response, a tuple of two of them
+		"""
+		if table and split_response:
+			raise ValueError("split_response cannot be combined with table")
+
+		url = self._finance_report_url(filters)
+		if table:
+			return await self._aparse_report(reports.aiter_detail_rows(await self._stream_report(url, save_to)), filters)
+		if stream:
+			if split_response:
+				return await self._stream_finance_sections(url, save_to)
+			return await self._stream_report(url, save_to)
+		chunks = reports.adecompress(await self._report_chunks(url))
+		if split_response:
+			sections = [section async for section in reports.asplit_finance_report(chunks)]
+			return self._save_finance_sections(sections, save_to)
+		response = b''.join([chunk async for chunk in chunks]).decode("utf-8")
+
+		return self._save_finance_report(response, save_to)
+
+	async def download_sales_and_trends_reports(self, filters=None, save_to=None, stream=False, table=False):
+		"""
+		:reference: https://developer.apple.com/documentation/appstoreconnectapi/download_sales_and_trends_reports
+		:param stream: decompress the report while it is downloaded and return an async iterator over its rows instead of a string
+		:param table: parse the report into a SalesReportTable of typed columns, requires numpy
+		:return: the report content, or an async iterator over rows (lists of strings, header first) when streaming
+		"""
+		url = self._sales_report_url(filters)
+		if table:
+			return await self._aparse_report(await self._stream_report(url, save_to), filters)
+		if stream:
+			return await self._stream_report(url, save_to)
+		response = b''.join([chunk async for chunk in reports.adecompress(await self._report_chunks(url))]).decode("utf-8")
+
+		if save_to:
+			file = Path(save_to)
+			file.write_text(response, 'utf-8')
+
+		return response
+
+	async def backfill_sales_and_trends_reports(self, vendor_numbers, start_date, end_date, directory, frequencies=('DAILY',), report_types=('SALES',), max_workers=4, retry_missing=False):
+		"""
+		download every sales report between two dates to directory, resuming a previous run if any
+		:param max_workers: number of reports downloaded concurrently
+		:return: a dict mapping each report to its status: done, missing or failed
+		"""
+		jobs = sales_and_trends_jobs(self, vendor_numbers, start_date, end_date, frequencies, report_types)
+		return await Backfill(directory, max_workers, retry_missing).arun(jobs)
+
+	async def backfill_finance_reports(self, vendor_numbers, start_date, end_date, directory, region_codes=('ZZ',), report_types=('FINANCIAL',), max_workers=4, retry_missing=False):
+		"""
+		download every monthly finance report between two dates to directory, resuming a previous run if any
+		:param max_workers: number of reports downloaded concurrently
+		:return: a dict mapping each report to its status: done, missing or failed
+		"""
+		jobs = finance_jobs(self, vendor_numbers, start_date, end_date, region_codes, report_types)
+		return await Backfill(directory, max_workers, retry_missing).arun(jobs)
+
+
+def _to_thread(function, *args):
+	if hasattr(asyncio, 'to_thread'):
+		return asyncio.to_thread(function, *args)
+	return asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args))  # Python < 3.9
+
+
+def _connect_trace(timings):
+	"""
+	:return: an httpcore trace callback storing in timings['connected'] how long opening a new connection took
+	"""
+	async def trace(event_name, info):
+		if event_name == 'connection.connect_tcp.started':
+			timings['started'] = time.perf_counter()
+		elif event_name in ('connection.connect_tcp.complete', 'connection.start_tls.complete') and 'started' in timings:
+			timings['connected'] = time.perf_counter() - timings['started']
+	return trace
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+DONE = 'done'
+MISSING = 'missing'
+FAILED = 'failed'
+
+
+class Backfill:
+	"""
+	download a range of reports with a pool of workers, recording progress in a manifest so an interrupted run can resume
+
+	reports that are not available (404) are recorded as missing instead of failing the run
+	"""
+
+	def __init__(self, directory, max_workers=4, retry_missing=False):
+		"""
+		:param directory: where reports and the manifest.json file are written
+		:param retry_missing: download again reports recorded as missing by a previous run
+		"""
+		self.directory = Path(directory)
+		self.directory.mkdir(parents=True, exist_ok=True)
+		self.max_workers = max_workers
+		self.retry_missing = retry_missing
+		self.manifest_path = self.directory / 'manifest.json'
+		self.manifest = json.loads(self.manifest_path.read_text('utf-8')) if self.manifest_path.exists() else {}
+		self._lock = threading.Lock()
+
+	def run(self, jobs):
+		"""
+		:param jobs: an iterable over (job_id, download, filters, filename) tuples
+		:return: the manifest, a dict mapping job ids to their status
+		"""
+		pending = [job for job in jobs if not self._is_complete(job[0])]
+		with ThreadPoolExecutor(self.max_workers) as executor:
+			for _ in executor.map(self._run_job, pending):
+				pass
+		return self.manifest
+
+	def _is_complete(self, job_id):
+		status = self.manifest.get(job_id, {}).get('status')
+		return status == DONE or (status == MISSING and not self.retry_missing)
+
+	async def arun(self, jobs):
+		"""
+		run jobs whose download function is a coroutine function, e.g. the methods of AsyncApi, at most max_workers at a
+		time
+		:return: the manifest, a dict mapping job ids to their status
+		"""
+		pending = [job for job in jobs if not self._is_complete(job[0])]
+		semaphore = asyncio.Semaphore(self.max_workers)
+
+		async def run_job(job):
+			async with semaphore:
+				await self._arun_job(job)
+
+		await asyncio.gather(*[run_job(job) for job in pending])
+		return self.manifest
+
+	def _run_job(self, job):
+		job_id, download, filters, filename = job
+		try:
+			download(filters=dict(filters), save_to=str(self._temporary_path(filename)), stream=True)
+		except Exception as e:
+			self._finish_job(job_id, filename, e)
+		else:
+			self._finish_job(job_id, filename)
+
+	async def _arun_job(self, job):
+		job_id, download, filters, filename = job
+		try:
+			await download(filters=dict(filters), save_to=str(self._temporary_path(filename)), stream=True)
+		except Exception as e:
+			self._finish_job(job_id, filename, e)
+		else:
+			self._finish_job(job_id, filename)
+
+	def _temporary_path(self, filename):
+		return self.directory / ('%s.part' % filename)
+
+	def _finish_job(self, job_id, filename, error=None):
+		"""
+		move the downloaded report in place, or record why it could not be downloaded
+		"""
+		path = self.directory / filename
+		temporary_path = self._temporary_path(filename)
+		if error is None:
+			try:
+				os.replace(str(temporary_path), str(path))
+			except OSError as e:
+				error = e
+		if error is None:
+			entry = {'status': DONE, 'path': str(path)}
+		else:
+			status = MISSING if getattr(error, 'status_code', None) == 404 else FAILED
+			entry = {'status': status, 'error': str(error)}
+		if temporary_path.exists():
+			temporary_path.unlink()
+		self._record(job_id, entry)
+
+	def _record(self, job_id, entry):
+		with self._lock:
+			self.manifest[job_id] = entry
+			temporary_path = self.manifest_path.with_suffix('.tmp')
+			temporary_path.write_text(json.dumps(self.manifest, indent=1, sort_keys=True), 'utf-8')
+			os.replace(str(temporary_path), str(self.manifest_path))
+
+
+def report_dates(start_date, end_date, frequency):
+	"""
+	:return: the reportDate values of a frequency between two dates, both included
+	"""
+	if frequency == 'DAILY':
+		return [(start_date + timedelta(days)).isoformat() for days in range((end_date - start_date).days + 1)]
+	if frequency == 'WEEKLY':
+		# weekly reports are identified by the Sunday ending the week
+		sunday = start_date + timedelta((6 - start_date.weekday()) % 7)
+		return [(sunday + timedelta(weeks)).isoformat() for weeks in range((end_date - sunday).days // 7 + 1)]
+	if frequency == 'MONTHLY':
+		return _months(start_date, end_date)
+	if frequency == 'YEARLY':
+		return [str(year) for year in range(start_date.year, end_date.year + 1)]
+	raise ValueError("Unknown frequency %s" % frequency)
+
+
+def _months(start_date, end_date):
+	months = []
+	year, month = start_date.year, start_date.month
+	while date(year, month, 1) <= end_date:
+		months.append('%04d-%02d' % (year, month))
+		year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+	return months
+
+
+def sales_and_trends_jobs(api, vendor_numbers, start_date, end_date, frequencies, report_types):
+	for vendor_number in vendor_numbers:
+		for report_type in report_types:
+			for frequency in frequencies:
+				for report_date in report_dates(start_date, end_date, frequency):
+					filters = {'vendorNumber': vendor_number, 'reportType': report_type, 'frequency': frequency, 'reportDate': report_date}
+					name = '%s_%s_%s_%s' % (report_type, frequency, vendor_number, report_date)
+					yield 'sales:%s' % name, api.download_sales_and_trends_reports, filters, '%s.tsv' % name
+
+
+def finance_jobs(api, vendor_numbers, start_date, end_date, region_codes, report_types):
+	for vendor_number in vendor_numbers:
+		for report_type in report_types:
+			for region_code in region_codes:
+				for report_date in _months(start_date, end_date):
+					filters = {'vendorNumber': vendor_number, 'reportType': report_type, 'regionCode': region_code, 'reportDate': report_date}
+					name = '%s_%s_%s_%s' % (report_type, region_code, vendor_number, report_date)
+					yield 'finance:%s' % name, api.download_finance_reports, filters, '%s.tsv' % name
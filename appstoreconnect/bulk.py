@@ -0,0 +1,61 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 8
+RELATIONSHIP_BATCH_SIZE = 100  # resources linked or unlinked by a single request
+
+
+class BulkResult:
+	"""
+	outcome of one operation of a bulk call: the resource returned on success, the exception raised on failure
+	"""
+	__slots__ = ('item', 'resource', 'error')
+
+	def __init__(self, item, resource=None, error=None):
+		self.item = item
+		self.resource = resource
+		self.error = error
+
+	@property
+	def ok(self):
+		return self.error is None
+
+	def __repr__(self):
+		return 'BulkResult %s %s' % (self.item, 'ok' if self.ok else 'failed: %s' % self.error)
+
+
+def run(function, items, max_workers=MAX_WORKERS):
+	"""
+	call function on every item from a pool of threads
+	:return: a list of BulkResult, in the order of items
+	"""
+	def call(item):
+		try:
+			return BulkResult(item, function(item))
+		except Exception as e:
+			return BulkResult(item, error=e)
+
+	with ThreadPoolExecutor(max_workers) as executor:
+		return list(executor.map(call, items))
+
+
+async def arun(function, items, max_workers=MAX_WORKERS):
+	"""
+	await function on every item, at most max_workers at a time
+	:return: a list of BulkResult, in the order of items
+	"""
+	semaphore = asyncio.Semaphore(max_workers)
+
+	async def call(item):
+		async with semaphore:
+			try:
+				return BulkResult(item, await function(item))
+			except Exception as e:
+				return BulkResult(item, error=e)
+
+	return list(await asyncio.gather(*[call(item) for item in items]))
+
+
+def batches(items, size=RELATIONSHIP_BATCH_SIZE):
+	items = list(items)
+	return [items[start:start + size] for start in range(0, len(items), size)]
@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qsl
+
+
+class _Entry:
+	__slots__ = ('payload', 'expires', 'etag', 'last_modified', 'types')
+
+	def __init__(self, payload, expires, etag, last_modified, types):
+		self.payload = payload
+		self.expires = expires
+		self.etag = etag
+		self.last_modified = last_modified
+		self.types = types
+
+
+class ResponseCache:
+	"""
+	in-memory cache of GET responses with a time to live per resource type, LRU eviction and conditional revalidation
+
+	a cache can be shared by several Api instances, entries are scoped by issuer and key id
+	"""
+
+	def __init__(self, max_entries=1024, ttl=60, ttls=None):
+		"""
+		:param max_entries: maximum number of responses kept, the least recently used ones are evicted first
+		:param ttl: default time to live in seconds
+		:param ttls: a dict mapping a resource type to its own time to live, e.g. {'apps': 3600}
+		"""
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.ttls = ttls or {}
+		self.hits = 0
+		self.misses = 0
+		self.revalidations = 0
+		self.evictions = 0
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	@property
+	def stats(self):
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'revalidations': self.revalidations,
+			'evictions': self.evictions,
+			'size': len(self._entries),
+		}
+
+	def lookup(self, key):
+		"""
+		:return: a (payload, headers) tuple, payload is None when the server must be asked and headers
+		holds the conditional headers to send if the stale entry can be revalidated
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None, {}
+			if entry.expires > time.monotonic():
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return entry.payload, {}
+			self.misses += 1
+			headers = {}
+			if entry.etag:
+				headers['If-None-Match'] = entry.etag
+			if entry.last_modified:
+				headers['If-Modified-Since'] = entry.last_modified
+			if not headers:
+				del self._entries[key]
+			return None, headers
+
+	def store(self, key, payload, headers, types=()):
+		"""
+		:param types: resource types the response depends on, in addition to the ones found in the payload
+		"""
+		types = _payload_types(payload) | set(types)
+		entry = _Entry(payload, time.monotonic() + self._ttl(payload), headers.get('etag'), headers.get('last-modified'), types)
+		with self._lock:
+			self._entries[key] = entry
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def revalidated(self, key, headers):
+		"""
+		refresh an entry after a 304 Not Modified response
+		:return: the cached payload, None if the entry is gone
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return None
+			entry.expires = time.monotonic() + self._ttl(entry.payload)
+			entry.etag = headers.get('etag', entry.etag)
+			self._entries.move_to_end(key)
+			self.revalidations += 1
+			return entry.payload
+
+	def invalidate(self, resource_types):
+		"""
+		drop every response containing a resource of one of the given types
+		"""
+		resource_types = set(resource_types)
+		with self._lock:
+			for key in [key for key, entry in self._entries.items() if entry.types & resource_types]:
+				del self._entries[key]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def _ttl(self, payload):
+		data = payload.get('data')
+		if type(data) is list:
+			data = data[0] if data else None
+		if type(data) is dict:
+			return self.ttls.get(data.get('type'), self.ttl)
+		return self.ttl
+
+
+def _payload_types(payload):
+	data = payload.get('data')
+	data = data if type(data) is list else [data]
+	return {resource.get('type') for resource in data + payload.get('included', []) if type(resource) is dict}
+
+
+class _Call:
+	__slots__ = ('event', 'result', 'error')
+
+	def __init__(self):
+		self.event = threading.Event()
+		self.result = None
+		self.error = None
+
+
+class SingleFlight:
+	"""
+	de-duplicate identical concurrent calls: the first caller of a key issues the call, callers arriving while it is in
+	flight wait for it and share its result or exception
+	"""
+
+	def __init__(self):
+		self.issued = 0
+		self.coalesced = 0
+		self._calls = {}
+		self._async_calls = {}
+		self._lock = threading.Lock()
+
+	@property
+	def stats(self):
+		return {'issued': self.issued, 'coalesced': self.coalesced, 'in_flight': len(self._calls) + len(self._async_calls)}
+
+	def do(self, key, function):
+		"""
+		:param function: called without arguments, only by the first caller
+		"""
+		with self._lock:
+			call = self._calls.get(key)
+			if call is not None:
+				self.coalesced += 1
+				leader = False
+			else:
+				call = self._calls[key] = _Call()
+				self.issued += 1
+				leader = True
+		return self._lead(key, call, function) if leader else self._wait(call)
+
+	def _lead(self, key, call, function):
+		try:
+			call.result = function()
+			return call.result
+		except BaseException as e:
+			call.error = e
+			raise
+		finally:
+			with self._lock:
+				del self._calls[key]
+			call.event.set()
+
+	@staticmethod
+	def _wait(call):
+		call.event.wait()
+		if call.error is not None:
+			raise call.error
+		return call.result
+
+	async def ado(self, key, function):
+		"""
+		:param function: a coroutine function, only called by the first caller
+		"""
+		future = self._async_calls.get(key)
+		if future is not None:
+			self.coalesced += 1
+			return await asyncio.shield(future)
+		self.issued += 1
+		future = self._async_calls[key] = asyncio.get_event_loop().create_future()
+		try:
+			result = await function()
+			future.set_result(result)
+			return result
+		except asyncio.CancelledError:
+			future.cancel()
+			raise
+		except BaseException as e:
+			future.set_exception(e)
+			future.exception()  # mark as retrieved when nobody was waiting
+			raise
+		finally:
+			del self._async_calls[key]
+
+
+class ReportCache:
+	"""
+	on-disk cache of sales and finance reports, stored gzip compressed and keyed by their normalized filters
+
+	published reports never change, so only requests for an explicit reportDate are cached
+	"""
+
+	def __init__(self, directory, max_size=1024 ** 3):
+		"""
+		:param directory: where reports are stored, created if needed
+		:param max_size: maximum size in bytes of the cache, the least recently used reports are evicted first
+		"""
+		self.directory = Path(directory)
+		self.directory.mkdir(parents=True, exist_ok=True)
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+
+	@property
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses}
+
+	@staticmethod
+	def key(url):
+		"""
+		:return: the cache key of a report url, None if the report may still change
+		"""
+		url = urlsplit(url)
+		query = sorted(parse_qsl(url.query))
+		if 'filter[reportDate]' not in dict(query):
+			return None
+		normalized = '%s?%s' % (url.path, '&'.join('%s=%s' % item for item in query))
+		return hashlib.sha256(normalized.encode()).hexdigest()
+
+	def get(self, key):
+		"""
+		:return: the path of the cached report, None on a miss
+		"""
+		path = self.directory / ('%s.gz' % key)
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return path
+
+	def tee(self, key, chunks):
+		"""
+		pass compressed chunks through while storing them, the report is only kept if fully consumed
+		"""
+		file, path = self._open_temporary(key)
+		try:
+			with file:
+				for chunk in chunks:
+					file.write(chunk)
+					yield chunk
+			self._commit(key, path)
+		finally:
+			self._discard(path)
+
+	async def atee(self, key, chunks):
+		file, path = self._open_temporary(key)
+		try:
+			with file:
+				async for chunk in chunks:
+					file.write(chunk)
+					yield chunk
+			self._commit(key, path)
+		finally:
+			self._discard(path)
+
+	def clear(self):
+		for path in self.directory.glob('*.gz'):
+			path.unlink()
+
+	def _open_temporary(self, key):
+		fd, path = tempfile.mkstemp(prefix=key, suffix='.tmp', dir=str(self.directory))
+		return os.fdopen(fd, 'wb'), path
+
+	def _commit(self, key, path):
+		os.replace(path, str(self.directory / ('%s.gz' % key)))
+		self._evict()
+
+	@staticmethod
+	def _discard(path):
+		try:
+			os.unlink(path)
+		except FileNotFoundError:
+			pass
+
+	def _evict(self):
+		with self._lock:
+			files = []
+			for path in self.directory.glob('*.gz'):
+				try:
+					stat = path.stat()
+				except FileNotFoundError:
+					continue
+				files.append((stat.st_mtime, stat.st_size, path))
+			size = sum(file[1] for file in files)
+			for mtime, file_size, path in sorted(files):
+				if size <= self.max_size:
+					break
+				self._discard(str(path))
+				size -= file_size
@@ -0,0 +1,222 @@
+import threading
+import time
+from bisect import bisect_left
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import Timeout
+from urllib3.exceptions import EmptyPoolError
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+PREFIX = 'appstoreconnect_'
+
+DESCRIPTIONS = {
+	'request_connect_seconds': ('histogram', 'Time to open a new connection'),
+	'request_ttfb_seconds': ('histogram', 'Time from sending a request to receiving the response headers'),
+	'request_seconds': ('histogram', 'Total time of a request, body included unless streamed'),
+	'responses_total': ('counter', 'Responses received by status code'),
+	'response_bytes_total': ('counter', 'Bytes of response bodies'),
+	'retries_total': ('counter', 'Requests retried, by reason'),
+	'listing_pages': ('histogram', 'Pages fetched per fully iterated listing'),
+	'token_refreshes_total': ('counter', 'Tokens signed or read from the token cache file'),
+	'token_signing_seconds': ('histogram', 'Time to sign a token'),
+}
+
+
+class _Histogram:
+	__slots__ = ('buckets', 'counts', 'sum', 'count')
+
+	def __init__(self, buckets):
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value):
+		self.counts[bisect_left(self.buckets, value)] += 1
+		self.sum += value
+		self.count += 1
+
+
+class Metrics:
+	"""
+	registry of counters and histograms about the requests of one or several Api instances, labelled by method and
+	normalized endpoint, e.g. GET /v1/apps/{id}/builds
+
+	export with as_dict() or to_prometheus() in the Prometheus text format
+	"""
+
+	def __init__(self):
+		self._counters = {}
+		self._histograms = {}
+		self._lock = threading.Lock()
+
+	def inc(self, name, labels=(), value=1):
+		"""
+		:param labels: a tuple of (label, value) tuples
+		"""
+		key = (name, labels)
+		with self._lock:
+			self._counters[key] = self._counters.get(key, 0) + value
+
+	def observe(self, name, labels=(), value=0.0, buckets=LATENCY_BUCKETS):
+		key = (name, labels)
+		with self._lock:
+			histogram = self._histograms.get(key)
+			if histogram is None:
+				histogram = self._histograms[key] = _Histogram(buckets)
+			histogram.observe(value)
+
+	def observe_response(self, method, endpoint, status_code, ttfb, total, connect=None):
+		labels = (('method', method), ('endpoint', endpoint))
+		if connect is not None:
+			self.observe('request_connect_seconds', labels, connect)
+		self.observe('request_ttfb_seconds', labels, ttfb)
+		self.observe('request_seconds', labels, total)
+		self.inc('responses_total', labels + (('status', str(status_code)),))
+
+	def count_bytes(self, method, endpoint, size):
+		self.inc('response_bytes_total', (('method', method), ('endpoint', endpoint)), size)
+
+	def count_retry(self, method, endpoint, reason):
+		self.inc('retries_total', (('method', method), ('endpoint', endpoint), ('reason', str(reason))))
+
+	def observe_listing(self, endpoint, pages):
+		self.observe('listing_pages', (('endpoint', endpoint),), pages, PAGE_BUCKETS)
+
+	def count_token_refresh(self):
+		self.inc('token_refreshes_total')
+
+	def observe_token_signing(self, signing_time):
+		self.observe('token_signing_seconds', (), signing_time)
+
+	def reset(self):
+		with self._lock:
+			self._counters.clear()
+			self._histograms.clear()
+
+	def as_dict(self):
+		"""
+		:return: a dict mapping metric names to lists of {'labels': ..., 'value': ...} for counters and
+		{'labels': ..., 'count': ..., 'sum': ..., 'buckets': {upper bound: cumulative count}} for histograms
+		"""
+		result = {}
+		with self._lock:
+			for (name, labels), value in sorted(self._counters.items()):
+				result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+			for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+				cumulative, buckets = 0, {}
+				for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+					cumulative += count
+					buckets[bound] = cumulative
+				result.setdefault(name, []).append({
+					'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum, 'buckets': buckets})
+		return result
+
+	def to_prometheus(self):
+		"""
+		:return: the metrics in the Prometheus text exposition format
+		"""
+		lines = []
+		for name, samples in sorted(self.as_dict().items()):
+			kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+			lines.append('# HELP %s%s %s' % (PREFIX, name, description))
+			lines.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+			for sample in samples:
+				if 'value' in sample:
+					lines.append('%s%s%s %s' % (PREFIX, name, _labels(sample['labels']), _number(sample['value'])))
+					continue
+				for bound, count in sample['buckets'].items():
+					labels = dict(sample['labels'], le='+Inf' if bound == float('inf') else _number(bound))
+					lines.append('%s%s_bucket%s %d' % (PREFIX, name, _labels(labels), count))
+				lines.append('%s%s_sum%s %s' % (PREFIX, name, _labels(sample['labels']), _number(sample['sum'])))
+				lines.append('%s%s_count%s %d' % (PREFIX, name, _labels(sample['labels']), sample['count']))
+		return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+	if not labels:
+		return ''
+	escaped = ('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+	           for name, value in labels.items())
+	return '{%s}' % ','.join(escaped)
+
+
+def _number(value):
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# connection times are recorded per thread, by the connections the TimedHTTPAdapter creates
+_timings = threading.local()
+
+
+def pop_connect_time():
+	"""
+	:return: how long the current thread spent opening a connection since the last call, None if it reused one
+	"""
+	connect_time = getattr(_timings, 'connect', None)
+	_timings.connect = None
+	return connect_time
+
+
+def set_connect_time(connect_time):
+	_timings.connect = connect_time
+
+
+class _TimedConnection:
+	def connect(self):
+		start = time.perf_counter()
+		try:
+			super().connect()
+		finally:
+			set_connect_time(time.perf_counter() - start)
+
+
+class _PoolTimeoutMixin:
+	pool_timeout = None
+
+	def urlopen(self, *args, **kwargs):
+		# requests never passes a pool timeout, a blocking pool would otherwise wait forever
+		if kwargs.get('pool_timeout') is None:
+			kwargs['pool_timeout'] = self.pool_timeout
+		return super().urlopen(*args, **kwargs)
+
+
+class _TimedHTTPConnectionPool(_PoolTimeoutMixin, HTTPConnectionPool):
+	ConnectionCls = type('TimedHTTPConnection', (_TimedConnection, HTTPConnectionPool.ConnectionCls), {})
+
+
+class _TimedHTTPSConnectionPool(_PoolTimeoutMixin, HTTPSConnectionPool):
+	ConnectionCls = type('TimedHTTPSConnection', (_TimedConnection, HTTPSConnectionPool.ConnectionCls), {})
+
+
+class PoolTimeout(Timeout):
+	"""
+	every connection of the pool stayed in use, e.g. by streamed responses not read to the end, for pool_timeout seconds
+	"""
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+	"""
+	HTTPAdapter recording how long opening each new connection takes
+
+	with pool_block, requests wait at most pool_timeout seconds for a free connection and then raise PoolTimeout
+	"""
+
+	def __init__(self, pool_timeout=None, **kwargs):
+		self.pool_timeout = pool_timeout
+		super().__init__(**kwargs)
+
+	def init_poolmanager(self, *args, **kwargs):
+		super().init_poolmanager(*args, **kwargs)
+		self.poolmanager.pool_classes_by_scheme = {
+			scheme: type(pool_class.__name__, (pool_class,), {'pool_timeout': self.pool_timeout})
+			for scheme, pool_class in (('http', _TimedHTTPConnectionPool), ('https', _TimedHTTPSConnectionPool))
+		}
+
+	def send(self, request, *args, **kwargs):
+		try:
+			return super().send(request, *args, **kwargs)
+		except EmptyPoolError as e:
+			raise PoolTimeout(e, request=request)
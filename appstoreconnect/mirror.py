@@ -0,0 +1,209 @@
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from .api import MAX_LIMIT
+
+# resource type: (list method, sort, attribute used as checkpoint, relationships to include)
+# types with a checkpoint are listed newest first and the listing stops at the last checkpoint, others are fully
+# listed with the largest page size and resources which disappeared are deleted
+SYNCS = {
+	'apps': ('list_apps', None, None, None),
+	'builds': ('list_builds', '-uploadedDate', 'uploadedDate', ['app', 'preReleaseVersion']),
+	'betaGroups': ('list_beta_groups', None, None, ['app']),
+	'betaTesters': ('list_beta_testers', None, None, ['betaGroups']),
+	'devices': ('list_devices', None, None, None),
+	'profiles': ('list_profiles', None, None, ['bundleId']),
+}
+
+# attributes with an index, to look resources up without a scan
+INDEXED_ATTRIBUTES = {
+	'apps': ('bundleId', 'sku'),
+	'builds': ('version', 'uploadedDate'),
+	'betaTesters': ('email',),
+	'devices': ('udid', 'name'),
+	'profiles': ('name', 'uuid'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (type TEXT, id TEXT, attributes TEXT, synced REAL, relationships TEXT, PRIMARY KEY (type, id));
+CREATE TABLE IF NOT EXISTS relationships (type TEXT, id TEXT, name TEXT, related_type TEXT, related_id TEXT,
+	PRIMARY KEY (type, id, name, related_id));
+CREATE INDEX IF NOT EXISTS relationships_related ON relationships (related_type, related_id, name);
+CREATE TABLE IF NOT EXISTS checkpoints (type TEXT PRIMARY KEY, value TEXT, synced REAL);
+"""
+
+
+class Mirror:
+	"""
+	local SQLite copy of account resources, kept up to date by incremental syncs and queried without any request
+
+	builds are listed newest first and only those uploaded since the last sync, minus a lookback period, are fetched
+	again; the other resource types cannot be listed by date and are fully listed with the largest page size
+
+	resources are returned with the relationships the API returned, so their relationship getters work as usual and
+	request the API, use related() to read related resources from the mirror instead
+	"""
+
+	def __init__(self, api, path, lookback=timedelta(days=2)):
+		"""
+		:param api: the Api used to sync
+		:param path: the SQLite database file, created if needed
+		:param lookback: how far before the checkpoint resources are fetched again, to catch recent changes such as the
+		processing state of builds
+		"""
+		self.api = api
+		self.lookback = lookback
+		self._connection = sqlite3.connect(path)
+		self._connection.executescript(SCHEMA)
+		if 'relationships' not in [column[1] for column in self._connection.execute('PRAGMA table_info(resources)')]:
+			# created by a version which did not keep the relationships, they are stored by the next sync
+			self._connection.execute('ALTER TABLE resources ADD COLUMN relationships TEXT')
+		for resource_type, attributes in INDEXED_ATTRIBUTES.items():
+			for attribute in attributes:
+				self._connection.execute(
+					"CREATE INDEX IF NOT EXISTS %s_%s ON resources (type, json_extract(attributes, '$.%s'))"
+					% (resource_type, attribute, attribute))
+		self._connection.commit()
+
+	def close(self):
+		self._connection.close()
+
+	def sync(self, resource_types=None, full=False):
+		"""
+		:param resource_types: the resource types to sync, all types of SYNCS by default
+		:param full: list every resource again, also deleting the ones which disappeared
+		:return: a dict mapping each resource type to its counts of fetched, inserted, updated and deleted resources
+		"""
+		return {resource_type: self._sync(resource_type, full) for resource_type in (resource_types or SYNCS)}
+
+	def get(self, resource_type, resource_id):
+		"""
+		:return: the resource, None if it is not in the mirror
+		"""
+		row = self._connection.execute(
+			'SELECT id, attributes, relationships FROM resources WHERE type = ? AND id = ?', (resource_type, resource_id)).fetchone()
+		return self._resource(resource_type, *row) if row else None
+
+	def find(self, resource_type, relationships=None, **attributes):
+		"""
+		:param relationships: a dict mapping relationship names to the id of a related resource, e.g. {'app': '1234'}
+		:param attributes: attribute values to match, e.g. email='jane@example.com'
+		:return: the list of matching resources
+		"""
+		query = 'SELECT id, attributes, relationships FROM resources WHERE type = ?'
+		parameters = [resource_type]
+		for attribute, value in attributes.items():
+			query += " AND json_extract(attributes, '$.%s') = ?" % attribute.replace("'", "")
+			parameters.append(value)
+		for name, related_id in (relationships or {}).items():
+			query += ' AND id IN (SELECT id FROM relationships WHERE type = ? AND name = ? AND related_id = ?)'
+			parameters += [resource_type, name, related_id]
+		return [self._resource(resource_type, *row) for row in self._connection.execute(query, parameters)]
+
+	def related(self, resource_type, resource_id, relationship):
+		"""
+		:return: the list of resources of a relationship which are in the mirror
+		"""
+		rows = self._connection.execute(
+			'SELECT r.type, r.id, r.attributes, r.relationships FROM relationships l JOIN resources r ON r.type = l.related_type AND r.id = l.related_id '
+			'WHERE l.type = ? AND l.id = ? AND l.name = ?', (resource_type, resource_id, relationship))
+		return [self._resource(*row) for row in rows]
+
+	@property
+	def checkpoints(self):
+		return {row[0]: {'value': row[1], 'synced': row[2]} for row in self._connection.execute('SELECT * FROM checkpoints')}
+
+	def _sync(self, resource_type, full):
+		method, sort, checkpoint_attribute, include = SYNCS[resource_type]
+		checkpoint = None if full or checkpoint_attribute is None else self._checkpoint(resource_type)
+		listing = getattr(self.api, method)(sort=sort, limit=MAX_LIMIT, include=include)
+		started = time.time()
+		counts = {'fetched': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+		newest = checkpoint
+		with self._connection:
+			for data, included in listing.pages():
+				for resource in data:
+					counts['fetched'] += 1
+					change = self._store(resource, started)
+					if change:
+						counts[change] += 1
+					if checkpoint_attribute:
+						value = resource.get('attributes', {}).get(checkpoint_attribute)
+						if value and (newest is None or (_parse_date(value) or datetime.min) > (_parse_date(newest) or datetime.min)):
+							newest = value
+				for resource in included.values():
+					self._store(resource, started)
+				if checkpoint and self._reached(data, checkpoint_attribute, checkpoint):
+					break
+			else:
+				if checkpoint is None:
+					# the whole listing was seen, what was not is gone
+					counts['deleted'] = self._connection.execute(
+						'DELETE FROM resources WHERE type = ? AND synced < ?', (resource_type, started)).rowcount
+					self._connection.execute(
+						'DELETE FROM relationships WHERE type = ? AND id NOT IN (SELECT id FROM resources WHERE type = ?)',
+						(resource_type, resource_type))
+			self._connection.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)', (resource_type, newest, started))
+		return counts
+
+	def _reached(self, data, attribute, checkpoint):
+		"""
+		:return: True if the page goes back beyond the checkpoint minus the lookback period
+		"""
+		dates = [_parse_date(resource.get('attributes', {}).get(attribute)) for resource in data]
+		dates = [date for date in dates if date is not None]
+		return bool(dates) and _parse_date(checkpoint) is not None and min(dates) < _parse_date(checkpoint) - self.lookback
+
+	def _checkpoint(self, resource_type):
+		row = self._connection.execute('SELECT value FROM checkpoints WHERE type = ?', (resource_type,)).fetchone()
+		return row[0] if row else None
+
+	def _store(self, resource, synced):
+		"""
+		:return: 'inserted', 'updated' or None if the resource did not change
+		"""
+		resource_type, resource_id = resource.get('type'), resource.get('id')
+		attributes = json.dumps(resource.get('attributes', {}), sort_keys=True)
+		existing = self._connection.execute(
+			'SELECT attributes, relationships FROM resources WHERE type = ? AND id = ?', (resource_type, resource_id)).fetchone()
+		# included resources may come without some relationships, keep the ones stored before
+		relationships = json.loads(existing[1]) if existing and existing[1] else {}
+		relationships.update(resource.get('relationships', {}))
+		self._connection.execute('INSERT OR REPLACE INTO resources (type, id, attributes, synced, relationships) VALUES (?, ?, ?, ?, ?)',
+		                         (resource_type, resource_id, attributes, synced, json.dumps(relationships, sort_keys=True)))
+		for name, relationship in resource.get('relationships', {}).items():
+			if 'data' not in relationship:
+				continue  # linkage not returned, keep what is known
+			linkage = relationship['data']
+			linkage = linkage if type(linkage) is list else [linkage] if linkage else []
+			self._connection.execute('DELETE FROM relationships WHERE type = ? AND id = ? AND name = ?', (resource_type, resource_id, name))
+			self._connection.executemany('INSERT OR REPLACE INTO relationships VALUES (?, ?, ?, ?, ?)', [
+				(resource_type, resource_id, name, related.get('type'), related.get('id')) for related in linkage])
+		if existing is None:
+			return 'inserted'
+		return 'updated' if existing[0] != attributes else None
+
+	def _resource(self, resource_type, resource_id, attributes, relationships):
+		data = {'type': resource_type, 'id': resource_id, 'attributes': json.loads(attributes),
+		        'relationships': json.loads(relationships) if relationships else {}}
+		return self.api._get_resource_from_payload_data(data)
+
+
+def _parse_date(value):
+	"""
+	:return: a naive UTC datetime from an ISO 8601 date as returned by the API, e.g. 2019-06-09T10:11:12-07:00, None if
+	the date cannot be parsed
+	"""
+	match = re.match(r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?$', value or '')
+	if not match:
+		return None
+	date = datetime.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S')
+	offset = match.group(2)
+	if offset and offset != 'Z':
+		digits = offset[1:].replace(':', '')
+		delta = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+		date = date - delta if offset[0] == '+' else date + delta
+	return date
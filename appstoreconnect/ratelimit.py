@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+WINDOW = 3600  # App Store Connect quotas are per hour
+
+
+class RateLimiter:
+	"""
+	paces requests with a token bucket sized from the X-Rate-Limit response header, and computes retry delays
+
+	the bucket holds the remaining hourly quota reported by the server and refills at limit / hour, requests are
+	sent as fast as possible while quota remains and spread evenly once it is exhausted
+	"""
+
+	def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=60, reserve=0):
+		"""
+		:param max_retries: how many times a request is retried on 429, 5xx or connection errors
+		:param backoff_factor: base delay in seconds of the exponential backoff
+		:param max_backoff: maximum delay in seconds between two attempts
+		:param reserve: number of requests of the quota kept unused, e.g. for other clients sharing the key
+		"""
+		self.max_retries = max_retries
+		self.backoff_factor = backoff_factor
+		self.max_backoff = max_backoff
+		self.reserve = reserve
+		self.limit = None
+		self.remaining = None
+		self.wait = 0.0
+		self.retries = 0
+		self._tokens = None
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	@property
+	def state(self):
+		return {
+			'limit': self.limit,
+			'remaining': self.remaining,
+			'tokens': self._tokens,
+			'wait': self.wait,
+			'retries': self.retries,
+		}
+
+	def acquire(self):
+		"""
+		take a token from the bucket
+		:return: how long to wait in seconds before sending the request
+		"""
+		with self._lock:
+			if self._tokens is None:
+				self.wait = 0.0
+				return self.wait
+			self._refill()
+			self._tokens -= 1
+			self.wait = max(0.0, (self.reserve - self._tokens) * WINDOW / self.limit)
+			return self.wait
+
+	def update(self, headers):
+		"""
+		resize the bucket from the X-Rate-Limit header, e.g. "user-hour-lim:3600;user-hour-rem:3599;"
+		"""
+		values = {}
+		for item in (headers.get('x-rate-limit') or '').split(';'):
+			name, _, value = item.partition(':')
+			if value.strip().isdigit():
+				values[name.strip()] = int(value)
+		if 'user-hour-lim' not in values or 'user-hour-rem' not in values:
+			return
+		with self._lock:
+			self.limit = max(values['user-hour-lim'], 1)
+			self.remaining = values['user-hour-rem']
+			self._tokens = self.remaining
+			self._updated = time.monotonic()
+
+	def backoff(self, attempt, retry_after=None):
+		"""
+		:param attempt: the number of the failed attempt, starting at 0
+		:param retry_after: the Retry-After header of the response, if any
+		:return: how long to wait in seconds before retrying
+		"""
+		with self._lock:
+			self.retries += 1
+		delay = _parse_retry_after(retry_after)
+		if delay is None:
+			delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+		self.wait = delay
+		return delay
+
+	def _refill(self):
+		now = time.monotonic()
+		self._tokens = min(self.limit, self._tokens + (now - self._updated) * self.limit / WINDOW)
+		self._updated = now
+
+
+def _parse_retry_after(value):
+	if not value:
+		return None
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+	except (TypeError, ValueError):
+		return None
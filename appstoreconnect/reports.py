@@ -0,0 +1,344 @@
+import asyncio
+import codecs
+import zlib
+from collections import deque
+
+CHUNK_SIZE = 64 * 1024
+DECOMPRESSED_SIZE = 256 * 1024  # most decompressed bytes produced at once, reports compress about 10 to 20 times
+TOTAL_ROWS = b'Total_Rows'
+DETAIL, SUMMARY = 0, 1
+
+# versions and subtypes of sales and trends reports requested when the filters do not give them
+SALES_REPORT_VERSIONS = {
+	'SALES': '1_0',
+	'SUBSCRIPTION': '1_2',
+	'SUBSCRIPTION_EVENT': '1_2',
+	'SUBSCRIBER': '1_2',
+	'NEWSSTAND': '1_0',
+	'PRE_ORDER': '1_0',
+}
+SALES_REPORT_SUBTYPES = {
+	'SALES': 'SUMMARY',
+	'SUBSCRIPTION': 'SUMMARY',
+	'SUBSCRIPTION_EVENT': 'SUMMARY',
+	'SUBSCRIBER': 'DETAILED',
+	'NEWSSTAND': 'DETAILED',
+	'PRE_ORDER': 'SUMMARY',
+}
+
+
+class GzipDecoder:
+	"""
+	incremental decoder for gzip streams, handles reports made of several gzip members
+	"""
+
+	def __init__(self, max_length=DECOMPRESSED_SIZE):
+		"""
+		:param max_length: most bytes returned at once, so that memory does not grow with the compression ratio
+		"""
+		self.max_length = max_length
+		self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+	def feed(self, chunk):
+		"""
+		:return: an iterator over the decompressed bytes, in pieces of at most max_length bytes
+		"""
+		while chunk:
+			data = self._decompressor.decompress(chunk, self.max_length)
+			if data:
+				yield data
+			if self._decompressor.eof:
+				chunk = self._decompressor.unused_data
+				if chunk:  # a new gzip member starts
+					self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+			else:
+				chunk = self._decompressor.unconsumed_tail
+
+	def flush(self):
+		return self._decompressor.flush()
+
+
+class LineDecoder:
+	"""
+	incremental decoder turning bytes into text lines, without line terminators
+	"""
+
+	def __init__(self, encoding='utf-8'):
+		self._decoder = codecs.getincrementaldecoder(encoding)()
+		self._pending = ''
+
+	def feed(self, chunk):
+		lines = (self._pending + self._decoder.decode(chunk)).split('\n')
+		self._pending = lines.pop()
+		return [line.rstrip('\r') for line in lines]
+
+	def flush(self):
+		pending = self._pending + self._decoder.decode(b'', final=True)
+		self._pending = ''
+		return [pending.rstrip('\r')] if pending else []
+
+
+class FinanceReportSplitter:
+	"""
+	incremental splitter of finance reports into their detail section, before the Total_Rows line, and the summary
+	section following it
+	"""
+
+	def __init__(self):
+		self._section = DETAIL
+		self._pending = b''
+		self._skipping = False  # inside the Total_Rows line
+
+	def feed(self, chunk):
+		"""
+		:return: a list of (section, bytes) tuples, section being DETAIL or SUMMARY
+		"""
+		if self._section == SUMMARY:
+			return [(SUMMARY, chunk)] if chunk else []
+		data = self._pending + chunk
+		if self._skipping:
+			return self._skip_line(data)
+		index = data.find(TOTAL_ROWS)
+		if index < 0:
+			# keep the end of the chunk in case the marker is split over two chunks
+			keep = len(TOTAL_ROWS) - 1
+			self._pending = data[-keep:]
+			data = data[:-keep]
+			return [(DETAIL, data)] if data else []
+		self._pending = b''
+		self._skipping = True
+		sections = [(DETAIL, data[:index])] if index else []
+		return sections + self._skip_line(data[index:])
+
+	def flush(self):
+		pending, self._pending = self._pending, b''
+		return [(DETAIL, pending)] if pending and not self._skipping else []
+
+	def _skip_line(self, data):
+		index = data.find(b'\n')
+		if index < 0:
+			return []
+		self._skipping = False
+		self._section = SUMMARY
+		data = data[index + 1:]
+		return [(SUMMARY, data)] if data else []
+
+
+def split_finance_report(chunks):
+	"""
+	:param chunks: an iterable over the decompressed bytes of a finance report
+	:return: an iterator over (section, bytes) tuples, section being DETAIL or SUMMARY
+	"""
+	splitter = FinanceReportSplitter()
+	for chunk in chunks:
+		yield from splitter.feed(chunk)
+	yield from splitter.flush()
+
+
+async def asplit_finance_report(chunks):
+	splitter = FinanceReportSplitter()
+	async for chunk in chunks:
+		for section in splitter.feed(chunk):
+			yield section
+	for section in splitter.flush():
+		yield section
+
+
+def iter_section_rows(sections, encoding='utf-8'):
+	"""
+	:param sections: an iterable over (section, bytes) tuples
+	:return: an iterator over (section, row) tuples
+	"""
+	decoders = (LineDecoder(encoding), LineDecoder(encoding))
+	for section, data in sections:
+		for row in iter_rows(decoders[section].feed(data)):
+			yield section, row
+	for section, decoder in enumerate(decoders):
+		for row in iter_rows(decoder.flush()):
+			yield section, row
+
+
+async def aiter_section_rows(sections, encoding='utf-8'):
+	decoders = (LineDecoder(encoding), LineDecoder(encoding))
+	async for section, data in sections:
+		for row in iter_rows(decoders[section].feed(data)):
+			yield section, row
+	for section, decoder in enumerate(decoders):
+		for row in iter_rows(decoder.flush()):
+			yield section, row
+
+
+def iter_detail_rows(rows):
+	"""
+	:param rows: an iterable over the rows of a finance report
+	:return: an iterator over the rows before the Total_Rows line, the remaining rows are read but dropped
+	"""
+	rows = iter(rows)
+	for row in rows:
+		if row[0] == 'Total_Rows':
+			break
+		yield row
+	for _ in rows:
+		pass
+
+
+async def aiter_detail_rows(rows):
+	async for row in rows:
+		if row[0] == 'Total_Rows':
+			break
+		yield row
+	async for _ in rows:
+		pass
+
+
+def demultiplex(items, count=2):
+	"""
+	:param items: an iterable over (index, item) tuples
+	:return: count iterators, one over the items of each index. Items read ahead while advancing an iterator are kept
+	until the iterator they belong to is consumed
+	"""
+	items = iter(items)
+	buffers = [deque() for _ in range(count)]
+
+	def iterate(index):
+		buffer = buffers[index]
+		while True:
+			while buffer:
+				yield buffer.popleft()
+			try:
+				target, item = next(items)
+			except StopIteration:
+				return
+			buffers[target].append(item)
+
+	return tuple(iterate(index) for index in range(count))
+
+
+def ademultiplex(items, count=2):
+	buffers = [deque() for _ in range(count)]
+	lock = asyncio.Lock()
+	exhausted = []
+
+	async def iterate(index):
+		buffer = buffers[index]
+		while True:
+			while buffer:
+				yield buffer.popleft()
+			async with lock:  # another iterator may be reading ahead
+				if buffer:
+					continue
+				if exhausted:
+					return
+				try:
+					target, item = await items.__anext__()
+				except StopAsyncIteration:
+					exhausted.append(True)
+					return
+				buffers[target].append(item)
+
+	return tuple(iterate(index) for index in range(count))
+
+
+def write_sections(sections, paths):
+	"""
+	write each section to its own path as the data arrives
+	"""
+	files = [open(path, 'wb') for path in paths]
+	try:
+		for section, data in sections:
+			files[section].write(data)
+	finally:
+		for file in files:
+			file.close()
+
+
+def decompress(chunks):
+	"""
+	:param chunks: an iterable over gzip compressed bytes
+	:return: an iterator over decompressed bytes
+	"""
+	decoder = GzipDecoder()
+	for chunk in chunks:
+		yield from decoder.feed(chunk)
+	data = decoder.flush()
+	if data:
+		yield data
+
+
+async def adecompress(chunks):
+	"""
+	:param chunks: an async iterable over gzip compressed bytes
+	:return: an async iterator over decompressed bytes
+	"""
+	decoder = GzipDecoder()
+	async for chunk in chunks:
+		for data in decoder.feed(chunk):
+			yield data
+	data = decoder.flush()
+	if data:
+		yield data
+
+
+def iter_lines(chunks, encoding='utf-8'):
+	"""
+	:param chunks: an iterable over decompressed bytes
+	:return: an iterator over text lines, without line terminators
+	"""
+	decoder = LineDecoder(encoding)
+	for chunk in chunks:
+		yield from decoder.feed(chunk)
+	yield from decoder.flush()
+
+
+async def aiter_rows(chunks, encoding='utf-8'):
+	"""
+	:param chunks: an async iterable over decompressed bytes
+	:return: an async iterator over rows as lists of strings, the first row being the header
+	"""
+	decoder = LineDecoder(encoding)
+	async for chunk in chunks:
+		for row in iter_rows(decoder.feed(chunk)):
+			yield row
+	for row in iter_rows(decoder.flush()):
+		yield row
+
+
+def iter_rows(lines):
+	"""
+	:param lines: an iterable over lines of a tab separated report
+	:return: an iterator over rows as lists of strings, the first row being the header
+	"""
+	for line in lines:
+		if line:
+			yield line.split('\t')
+
+
+def iter_file_rows(path, encoding='utf-8'):
+	"""
+	lazily read back rows of a report saved on disk
+	"""
+	with open(path, 'r', encoding=encoding, newline='') as file:
+		yield from iter_rows(line.rstrip('\r\n') for line in file)
+
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+	"""
+	:return: an iterator over the bytes of a file, read chunk by chunk
+	"""
+	with open(path, 'rb') as file:
+		for chunk in iter(lambda: file.read(chunk_size), b''):
+			yield chunk
+
+
+async def aiter_file_chunks(path, chunk_size=CHUNK_SIZE):
+	for chunk in iter_file_chunks(path, chunk_size):
+		yield chunk
+
+
+def write_chunks(chunks, path):
+	"""
+	write decompressed bytes to path as they arrive
+	"""
+	with open(path, 'wb') as file:
+		for chunk in chunks:
+			file.write(chunk)
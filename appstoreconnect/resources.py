@@ -3,12 +3,21 @@ from abc import ABC, abstractmethod
 import sys
 
 
+NOT_INCLUDED = object()
+
+
 class Resource(ABC):
 	relationships = {}
 
-	def __init__(self, data, api):
+	def __init__(self, data, api, included=None):
+		"""
+		:param data: the resource object from the API payload
+		:param api: the Api instance used to fetch related resources
+		:param included: the resources included in the same payload, indexed by (type, id)
+		"""
 		self._data = data
 		self._api = api
+		self._included = included
 
 	def __getattr__(self, item):
 		if item == 'id':
@@ -16,20 +25,53 @@ class Resource(ABC):
 		if item in self._data.get('attributes', {}):
 			return self._data.get('attributes', {})[item]
 		if item in self.relationships:
-			def getter():
-				# Try to fetch relationship
-				nonlocal item
-				url = self._data.get('relationships', {})[item]['links']['related']
-				if self.relationships[item]['multiple']:
-					return self._api.get_related_resources(full_url=url)
-				else:
-					return self._api.get_related_resource(full_url=url)
-			return getter
+			return self._relationship_getter(item)
 
 		raise AttributeError('%s has no attributes %s' % (self.type_name, item))
 
+	def _relationship_getter(self, item):
+		def getter():
+			included = self._get_included(item)
+			if included is not NOT_INCLUDED:
+				return self._api._related_from_included(included, self.relationships[item]['multiple'])
+			# Try to fetch relationship
+			url = self._get_relationship(item)['links']['related']
+			if self.relationships[item]['multiple']:
+				return self._api.get_related_resources(full_url=url)
+			else:
+				return self._api.get_related_resource(full_url=url)
+		return getter
+
+	def _get_relationship(self, item):
+		return self._data.get('relationships', {}).get(item, {})
+
+	def _get_included(self, item):
+		"""
+		resolve a relationship from the included resources
+		:return: the related resource(s), or NOT_INCLUDED if they have to be fetched
+		"""
+		if self._included is None:
+			return NOT_INCLUDED
+		relationship = self._get_relationship(item)
+		if 'data' not in relationship:
+			return NOT_INCLUDED
+		linkage = relationship['data']
+		if linkage is None:
+			return None
+		multiple = type(linkage) is list
+		if multiple and relationship.get('meta', {}).get('paging', {}).get('total', 0) > len(linkage):
+			return NOT_INCLUDED  # only a part of the related resources were included
+
+		related = []
+		for identifier in (linkage if multiple else [linkage]):
+			data = self._included.get((identifier.get('type'), identifier.get('id')))
+			if data is None or identifier.get('type') not in resources:
+				return NOT_INCLUDED
+			related.append(self._api._resource_class(resources[identifier.get('type')])(data, self._api, self._included))
+		return related if multiple else related[0]
+
 	def __repr__(self):
-		return '%s id %s' % (self.type_name, self._data.get('id'))
+		return '%s id %s' % (self.type_name, self.id)
 
 	def __dir__(self):
 		return ['id'] + list(self._data.get('attributes', {}).keys()) + list(self._data.get('relationships', {}).keys())
@@ -38,6 +80,13 @@ class Resource(ABC):
 	def type_name(self):
 		return type(self).__name__
 
+	@property
+	def raw(self):
+		"""
+		:return: the resource object as returned by the API, None for compact resources created without keep_raw
+		"""
+		return self._data
+
 	@property
 	@abstractmethod
 	def endpoint(self):
@@ -187,11 +236,13 @@ class UserInvitation(Resource):
 # Provisioning
 class BundleId(Resource):
 	endpoint = '/v1/bundleIds'
+	type = 'bundleIds'
 	documentation = 'https://developer.apple.com/documentation/appstoreconnectapi/bundleid/attributes'
 
 
 class Certificate(Resource):
 	endpoint = '/v1/certificates'
+	type = 'certificates'
 	documentation = 'https://developer.apple.com/documentation/appstoreconnectapi/certificate/attributes'
 
 
@@ -204,6 +255,7 @@ class Device(Resource):
 
 class Profile(Resource):
 	endpoint = '/v1/profiles'
+	type = 'profiles'
 	documentation = 'https://developer.apple.com/documentation/appstoreconnectapi/profile/attributes'
 
 
@@ -224,3 +276,96 @@ resources = {}
 for name, obj in inspect.getmembers(sys.modules[__name__]):
 	if inspect.isclass(obj) and issubclass(obj, Resource) and hasattr(obj, 'type') and obj != Resource:
 		resources[getattr(obj, 'type')] = obj
+
+
+class CompactResource:
+	"""
+	mixin of the compact resource classes returned by compact()
+
+	declared attributes are stored in slots, other attributes in a dict, and only the related links and linkage data of
+	relationships are kept
+	"""
+	__slots__ = ()
+	_slot_attributes = ()
+	_keep_raw = False
+
+	def __init__(self, data, api, included=None):
+		self._data = data if self._keep_raw else None
+		self._api = api
+		self._included = included
+		self.id = data.get('id')
+		extra = None
+		for name, value in (data.get('attributes') or {}).items():
+			if name in self._slot_attributes:
+				setattr(self, name, value)
+			else:
+				if extra is None:
+					extra = {}
+				extra[name] = value
+		self._extra = extra
+		links = {}
+		linkage = None
+		for name, relationship in (data.get('relationships') or {}).items():
+			links[name] = relationship.get('links', {}).get('related')
+			if 'data' in relationship:
+				if linkage is None:
+					linkage = {}
+				linkage[name] = {key: value for key, value in relationship.items() if key != 'links'}
+		self._links = links
+		self._linkage = linkage
+
+	def __getattr__(self, item):
+		# only called for attributes missing from the slots
+		if item in self.relationships:
+			return self._relationship_getter(item)
+		if self._extra is not None and item in self._extra:
+			return self._extra[item]
+		raise AttributeError('%s has no attributes %s' % (self.type_name, item))
+
+	def __dir__(self):
+		attributes = [name for name in self._slot_attributes if hasattr(self, name)] + list(self._extra or {})
+		return ['id'] + attributes + list(self._links)
+
+	def _get_relationship(self, item):
+		if item not in self._links:
+			return {}
+		relationship = dict((self._linkage or {}).get(item, {}))
+		relationship['links'] = {'related': self._links[item]}
+		return relationship
+
+
+_compact_classes = {}
+_NOT_COPIED = {'__dict__', '__weakref__', '__slots__', '__abstractmethods__', '_abc_impl', '_abc_registry', '_abc_cache',
+               '_abc_negative_cache', '_abc_negative_cache_version'}
+
+
+def compact(Resource, keep_raw=False):
+	"""
+	:return: a class storing the attributes of Resource in __slots__, derived from its attributes declaration, and
+	registered as a virtual subclass of Resource
+
+	it does not inherit from Resource, whose instances have a __dict__, but gets a copy of the class attributes and
+	methods of Resource and its bases
+	"""
+	key = (Resource, keep_raw)
+	if key not in _compact_classes:
+		slot_attributes = tuple(
+			name for name in getattr(Resource, 'attributes', [])
+			if name.isidentifier() and not hasattr(Resource, name)  # do not shadow class attributes like type
+		)
+		namespace = {}
+		for base in reversed(Resource.__mro__):
+			if base not in (object, ABC):
+				namespace.update((name, value) for name, value in vars(base).items()
+				                 if name not in _NOT_COPIED and name not in vars(CompactResource))
+		namespace.update({
+			'__slots__': ('_data', '_api', '_included', 'id', '_extra', '_links', '_linkage') + slot_attributes,
+			'__module__': Resource.__module__,
+			'__qualname__': Resource.__qualname__,
+			'_slot_attributes': frozenset(slot_attributes),
+			'_keep_raw': keep_raw,
+		})
+		compact_class = type(Resource)(Resource.__name__, (CompactResource,), namespace)
+		Resource.register(compact_class)
+		_compact_classes[key] = compact_class
+	return _compact_classes[key]
@@ -0,0 +1,86 @@
+import atexit
+import json
+import queue
+import threading
+
+import requests
+
+try:
+	from queue import SimpleQueue
+except ImportError:  # Python 3.6, whose Queue.put() is not reentrant
+	from queue import Queue as SimpleQueue
+
+STATS_URL = 'https://stats.ponytech.net/new-event'
+
+
+class StatsSender:
+	"""
+	submits anonymous usage statistics from a background thread shared by every Api instance of the process
+
+	events are queued without ever blocking the caller, dropped when the queue is full, and sent in batches over a
+	single keep-alive connection with a strict timeout
+	"""
+
+	def __init__(self, url=STATS_URL, max_queue_size=100, batch_size=20, timeout=2, exit_deadline=1):
+		"""
+		:param timeout: timeout in seconds of each submission
+		:param exit_deadline: how long in seconds pending events may delay the interpreter exit
+		"""
+		self.url = url
+		self.max_queue_size = max_queue_size
+		self.batch_size = batch_size
+		self.timeout = timeout
+		self.exit_deadline = exit_deadline
+		self.sent = 0
+		self.dropped = 0
+		# submit() runs from Api.__del__, which the garbage collector may call while the same thread is already inside
+		# submit(): only reentrant primitives are used on that path, SimpleQueue.put() and an RLock
+		self._queue = SimpleQueue()
+		self._thread = None
+		self._lock = threading.RLock()
+		atexit.register(self.flush)
+
+	def submit(self, payload):
+		self._start()
+		if self._queue.qsize() >= self.max_queue_size:
+			self.dropped += 1
+		else:
+			self._queue.put(payload)
+
+	def flush(self, deadline=None):
+		"""
+		wait until queued events are sent, at most deadline seconds (exit_deadline by default)
+		"""
+		if self._thread is None or not self._thread.is_alive():
+			return
+		sent = threading.Event()
+		self._queue.put(sent)  # set by the worker once the events queued before are sent
+		sent.wait(self.exit_deadline if deadline is None else deadline)
+
+	def _start(self):
+		with self._lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._run, name='appstoreconnect-stats', daemon=True)
+				self._thread.start()
+
+	def _run(self):
+		session = requests.Session()
+		while True:
+			batch = [self._queue.get()]
+			while len(batch) < self.batch_size:
+				try:
+					batch.append(self._queue.get_nowait())
+				except queue.Empty:
+					break
+			for payload in batch:
+				if isinstance(payload, threading.Event):
+					payload.set()
+					continue
+				try:
+					session.post(self.url, json.dumps(payload), timeout=self.timeout)
+					self.sent += 1
+				except Exception:
+					pass  # statistics must never disturb the application
+
+
+sender = StatsSender()
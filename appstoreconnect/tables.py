@@ -0,0 +1,262 @@
+from datetime import datetime
+from itertools import islice
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+CATEGORY = 'category'  # repeated strings, stored as integer codes into a sorted array of distinct values
+INTEGER = 'integer'
+DECIMAL = 'decimal'
+DATE = 'date'
+
+DATE_FORMATS = ('%m/%d/%Y', '%Y-%m-%d')
+CHUNK_ROWS = 100000
+
+# typed columns of each report type and version (None for finance reports), every other column is a category
+SCHEMAS = {
+	('SALES', '1_0'): {
+		'Units': INTEGER,
+		'Developer Proceeds': DECIMAL,
+		'Begin Date': DATE,
+		'End Date': DATE,
+		'Customer Price': DECIMAL,
+	},
+	('SUBSCRIPTION', '1_2'): {
+		'Customer Price': DECIMAL,
+		'Developer Proceeds': DECIMAL,
+		'Active Standard Price Subscriptions': INTEGER,
+		'Active Free Trial Introductory Offer Subscriptions': INTEGER,
+		'Active Pay Up Front Introductory Offer Subscriptions': INTEGER,
+		'Active Pay As You Go Introductory Offer Subscriptions': INTEGER,
+		'Free Trial Promotional Offer Subscriptions': INTEGER,
+		'Pay Up Front Promotional Offer Subscriptions': INTEGER,
+		'Pay As You Go Promotional Offer Subscriptions': INTEGER,
+		'Free Trial Offer Code Subscriptions': INTEGER,
+		'Pay Up Front Offer Code Subscriptions': INTEGER,
+		'Pay As You Go Offer Code Subscriptions': INTEGER,
+		'Marketing Opt-Ins': INTEGER,
+		'Billing Retry': INTEGER,
+		'Grace Period': INTEGER,
+		'Subscribers': INTEGER,
+	},
+	('SUBSCRIPTION_EVENT', '1_2'): {
+		'Event Date': DATE,
+		'Original Start Date': DATE,
+		'Consecutive Paid Periods': INTEGER,
+		'Days Before Canceling': INTEGER,
+		'Days Canceled': INTEGER,
+		'Quantity': INTEGER,
+	},
+	('FINANCIAL', None): {
+		'Start Date': DATE,
+		'End Date': DATE,
+		'Quantity': INTEGER,
+		'Partner Share': DECIMAL,
+		'Extended Partner Share': DECIMAL,
+		'Customer Price': DECIMAL,
+	},
+	('FINANCE_DETAIL', None): {
+		'Transaction Date': DATE,
+		'Settlement Date': DATE,
+		'Quantity': INTEGER,
+		'Partner Share': DECIMAL,
+		'Extended Partner Share': DECIMAL,
+		'Customer Price': DECIMAL,
+	},
+	('SUBSCRIBER', '1_2'): {
+		'Event Date': DATE,
+		'Customer Price': DECIMAL,
+		'Developer Proceeds': DECIMAL,
+		'Purchase Date': DATE,
+		'Units': INTEGER,
+	},
+}
+
+
+class SalesReportTable:
+	"""
+	a sales report, or the detail rows of a finance report, parsed into one NumPy array per column
+
+	numbers are int64 or float64 arrays, dates datetime64[D] arrays and other columns categories: integer codes into
+	the sorted array of their distinct values, so a country code or SKU is stored once however many rows use it
+	"""
+
+	def __init__(self, report_type, version, columns, categories):
+		self.report_type = report_type
+		self.version = version
+		self.columns = columns
+		self.categories = categories
+
+	@property
+	def names(self):
+		return list(self.columns)
+
+	def __len__(self):
+		return len(next(iter(self.columns.values()))) if self.columns else 0
+
+	def __getitem__(self, name):
+		"""
+		:return: the values of a column, categories are decoded
+		"""
+		if name in self.categories:
+			return self.categories[name][self.columns[name]]
+		return self.columns[name]
+
+	def __repr__(self):
+		return 'SalesReportTable %s %s: %d rows, %d columns' % (self.report_type, self.version, len(self), len(self.columns))
+
+	def codes(self, name):
+		"""
+		:return: the codes of a category column, indexes into categories[name]
+		"""
+		return self.columns[name]
+
+	def select(self, mask):
+		"""
+		:param mask: a boolean array, e.g. table['Country Code'] == 'FR'
+		:return: a new table with the selected rows
+		"""
+		columns = {name: values[mask] for name, values in self.columns.items()}
+		return SalesReportTable(self.report_type, self.version, columns, self.categories)
+
+	def group_sum(self, by, column):
+		"""
+		:return: a dict mapping each value of the by column to the sum of column over its rows
+		"""
+		if by in self.categories:
+			keys, inverse = self.categories[by], self.columns[by]
+		else:
+			keys, inverse = np.unique(self.columns[by], return_inverse=True)
+		sums = np.bincount(inverse, weights=self.columns[column], minlength=len(keys))
+		present = np.bincount(inverse, minlength=len(keys)) > 0
+		return dict(zip(keys[present].tolist(), sums[present].tolist()))
+
+	@classmethod
+	def concatenate(cls, tables):
+		"""
+		merge tables of the same report type and version, e.g. the daily reports of a month
+		"""
+		tables = list(tables)
+		if not tables:
+			raise ValueError("No table to concatenate")
+		for table in tables[1:]:
+			if (table.report_type, table.version, table.names) != (tables[0].report_type, tables[0].version, tables[0].names):
+				raise ValueError("Cannot concatenate %s %s and %s %s tables, their columns differ" % (
+					tables[0].report_type, tables[0].version, table.report_type, table.version))
+		columns, categories = {}, {}
+		for name in tables[0].columns:
+			if name in tables[0].categories:
+				columns[name], categories[name] = _merge_categories([(table.columns[name], table.categories[name]) for table in tables])
+			else:
+				columns[name] = np.concatenate([table.columns[name] for table in tables])
+		return cls(tables[0].report_type, tables[0].version, columns, categories)
+
+
+class SalesReportParser:
+	"""
+	parses a report fed a few rows at a time, e.g. while it is downloaded, so that only the parsed columns are kept
+	"""
+
+	def __init__(self, report_type='SALES', version='1_0'):
+		if np is None:
+			raise ImportError("Parsing reports requires numpy, install it with: pip install appstoreconnect[reports]")
+		self.report_type = report_type
+		self.version = version
+		self.header = None
+		self._types = None
+		# a flat list of strings rather than a list of rows, which would keep the garbage collector busy
+		self._values = []
+		self._chunks = []
+
+	def feed(self, rows):
+		"""
+		:param rows: an iterable over rows as lists of strings, the header first in the first call
+		"""
+		rows = iter(rows)
+		if self.header is None:
+			self.header = next(rows, None)
+			if self.header is None:
+				return
+			schema = SCHEMAS.get((self.report_type, self.version), {})
+			self._types = [schema.get(name, CATEGORY) for name in self.header]
+		width = len(self.header)
+		while True:
+			values = self._values
+			for row in islice(rows, CHUNK_ROWS - len(values) // width):
+				if len(row) != width:
+					row = (row + [''] * width)[:width]
+				values.extend(row)
+			if len(values) < CHUNK_ROWS * width:
+				break
+			self._parse_values()
+
+	def table(self):
+		"""
+		:return: a SalesReportTable of the rows fed so far
+		"""
+		if self.header is None:
+			return SalesReportTable(self.report_type, self.version, {}, {})
+		if self._values:
+			self._parse_values()
+		columns, categories = {}, {}
+		for index, (name, column_type) in enumerate(zip(self.header, self._types)):
+			parsed = [chunk[index] for chunk in self._chunks]
+			if column_type == CATEGORY:
+				columns[name], categories[name] = _merge_categories(parsed) if parsed else (np.zeros(0, np.int32), np.zeros(0, str))
+			else:
+				columns[name] = np.concatenate(parsed) if parsed else np.zeros(0, _DTYPES[column_type])
+		return SalesReportTable(self.report_type, self.version, columns, categories)
+
+	def _parse_values(self):
+		width = len(self.header)
+		values, self._values = self._values, []
+		self._chunks.append([_parse_column(values[index::width], column_type) for index, column_type in enumerate(self._types)])
+
+
+def parse_sales_report(rows, report_type='SALES', version='1_0'):
+	"""
+	:param rows: an iterable over rows as lists of strings, header first, or the report content as a string
+	:return: a SalesReportTable
+	"""
+	parser = SalesReportParser(report_type, version)
+	if isinstance(rows, str):
+		rows = (line.split('\t') for line in rows.splitlines() if line)
+	parser.feed(rows)
+	return parser.table()
+
+
+_DTYPES = {INTEGER: 'int64', DECIMAL: 'float64', DATE: 'datetime64[D]'}
+
+
+def _parse_column(values, column_type):
+	values = np.array(values)
+	if column_type == CATEGORY:
+		categories, codes = np.unique(values, return_inverse=True)
+		return codes.astype(np.int32), categories
+	if column_type == DATE:
+		# reports cover few distinct dates: parse each once and broadcast
+		distinct, inverse = np.unique(values, return_inverse=True)
+		return np.array([_parse_date(value) for value in distinct], dtype='datetime64[D]')[inverse]
+	numbers = np.where(values == '', '0' if column_type == INTEGER else 'nan', values).astype(np.float64)
+	return numbers.astype(np.int64) if column_type == INTEGER else numbers
+
+
+def _parse_date(value):
+	for date_format in DATE_FORMATS:
+		try:
+			return datetime.strptime(value, date_format).date()
+		except ValueError:
+			pass
+	return None  # NaT
+
+
+def _merge_categories(parts):
+	"""
+	:param parts: a list of (codes, categories) tuples
+	:return: the concatenated codes and their categories
+	"""
+	categories = np.unique(np.concatenate([part[1] for part in parts]))
+	codes = [np.searchsorted(categories, part_categories)[part_codes] for part_codes, part_categories in parts]
+	return np.concatenate(codes).astype(np.int32), categories
@@ -0,0 +1,292 @@
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+try:
+	from contextvars import ContextVar
+except ImportError:  # Python 3.6, spans are tracked per thread
+	ContextVar = None
+
+try:
+	from opentelemetry import context as otel_context, propagate as otel_propagate, trace as otel_trace
+except ImportError:
+	otel_trace = None
+
+HOOK_EVENTS = ('before_request', 'after_response', 'on_error')
+
+
+class _ThreadLocalVar(threading.local):
+	value = None
+
+	def get(self):
+		return self.value
+
+	def set(self, value):
+		previous, self.value = self.value, value
+		return previous
+
+	def reset(self, previous):
+		self.value = previous
+
+
+_current_span = ContextVar('appstoreconnect_span', default=None) if ContextVar is not None else _ThreadLocalVar()
+
+
+def current_span():
+	"""
+	:return: the span of the innermost active with block, None outside any span
+	"""
+	return _current_span.get()
+
+
+class Span:
+	"""
+	a timed operation, ended by end() or when leaving a with block, which also makes it the parent of the spans started
+	inside
+	"""
+
+	def set_attribute(self, key, value):
+		pass
+
+	def record_exception(self, exception):
+		pass
+
+	def end(self):
+		pass
+
+	@contextmanager
+	def activate(self):
+		"""
+		make the span the parent of the spans started inside the with block, without ending it
+		"""
+		token = self._attach()
+		try:
+			yield self
+		finally:
+			self._detach(token)
+
+	def __enter__(self):
+		self._token = self._attach()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self._detach(self._token)
+		if exc_value is not None:
+			self.record_exception(exc_value)
+		self.end()
+
+	def _attach(self):
+		return _current_span.set(self)
+
+	def _detach(self, token):
+		_current_span.reset(token)
+
+
+class _NullSpan(Span):
+	# used when no tracer is set, does not even track the current span
+
+	def activate(self):
+		return self
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+	"""
+	base class of tracers given to Api(tracer=...)
+
+	spans are named appstoreconnect.<operation>: api_call, http (one per attempt), decode, token, listing, page,
+	resources, report and parse_report
+	"""
+
+	def __init__(self, propagate=False):
+		"""
+		:param propagate: send the context of the current span with each request, in a W3C traceparent header
+		"""
+		self.propagate = propagate
+
+	def start_span(self, name, attributes=None, parent=None):
+		"""
+		:param parent: the parent span, the current span by default
+		:return: a started Span
+		"""
+		raise NotImplementedError
+
+	def inject(self, headers, span):
+		"""
+		add the context of span to the headers of a request when propagate is set
+		"""
+
+
+class RecordedSpan(Span):
+
+	def __init__(self, tracer, name, attributes, parent):
+		self.tracer = tracer
+		self.name = name
+		self.attributes = dict(attributes or {})
+		self.parent = parent
+		self.trace_id = parent.trace_id if parent is not None else '%032x' % random.getrandbits(128)
+		self.span_id = '%016x' % random.getrandbits(64)
+		self.error = None
+		self.start = time.perf_counter()
+		self.end_time = None
+
+	@property
+	def duration(self):
+		return (self.end_time if self.end_time is not None else time.perf_counter()) - self.start
+
+	def set_attribute(self, key, value):
+		self.attributes[key] = value
+
+	def record_exception(self, exception):
+		self.error = '%s: %s' % (type(exception).__name__, exception)
+
+	def end(self):
+		if self.end_time is None:
+			self.end_time = time.perf_counter()
+			self.tracer._finish(self)
+
+	def __repr__(self):
+		return 'Span %s %.6fs %s' % (self.name, self.duration, self.attributes)
+
+
+class RecordingTracer(Tracer):
+	"""
+	keeps the last finished spans in memory, to see where the time of a job goes without any tracing backend
+	"""
+
+	def __init__(self, propagate=False, max_spans=100000):
+		"""
+		:param max_spans: number of finished spans kept, the oldest ones are dropped first
+		"""
+		super().__init__(propagate)
+		self.spans = deque(maxlen=max_spans)
+		self._lock = threading.Lock()
+
+	def start_span(self, name, attributes=None, parent=None):
+		return RecordedSpan(self, name, attributes, parent if parent is not None else _current_recorded_span())
+
+	def inject(self, headers, span):
+		if self.propagate and isinstance(span, RecordedSpan):
+			headers['traceparent'] = '00-%s-%s-01' % (span.trace_id, span.span_id)
+
+	def summary(self):
+		"""
+		:return: a dict mapping span names to their count, total duration and self duration, the time not spent in
+		child spans
+		"""
+		with self._lock:
+			spans = list(self.spans)
+		children = defaultdict(float)
+		for span in spans:
+			if span.parent is not None:
+				children[span.parent.span_id] += span.duration
+		summary = {}
+		for span in spans:
+			entry = summary.setdefault(span.name, {'count': 0, 'total': 0.0, 'self': 0.0})
+			entry['count'] += 1
+			entry['total'] += span.duration
+			entry['self'] += max(span.duration - children[span.span_id], 0.0)
+		return summary
+
+	def clear(self):
+		with self._lock:
+			self.spans.clear()
+
+	def _finish(self, span):
+		with self._lock:
+			self.spans.append(span)
+
+
+def _current_recorded_span():
+	span = _current_span.get()
+	return span if isinstance(span, RecordedSpan) else None
+
+
+class _OpenTelemetrySpan(Span):
+
+	def __init__(self, span):
+		self.span = span
+
+	def set_attribute(self, key, value):
+		self.span.set_attribute(key, value)
+
+	def record_exception(self, exception):
+		self.span.record_exception(exception)
+		self.span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, str(exception)))
+
+	def end(self):
+		self.span.end()
+
+	def _attach(self):
+		return _current_span.set(self), otel_context.attach(otel_trace.set_span_in_context(self.span))
+
+	def _detach(self, token):
+		otel_context.detach(token[1])
+		_current_span.reset(token[0])
+
+
+class OpenTelemetryTracer(Tracer):
+	"""
+	sends spans to OpenTelemetry, nested in the application's current span
+
+	requires opentelemetry-api, install with: pip install appstoreconnect[tracing]
+	"""
+
+	def __init__(self, tracer=None, propagate=False):
+		"""
+		:param tracer: an opentelemetry Tracer, the one of the global tracer provider by default
+		:param propagate: inject the current context in each request with the globally configured propagator
+		"""
+		if otel_trace is None:
+			raise ImportError("OpenTelemetryTracer requires opentelemetry-api, install it with: pip install appstoreconnect[tracing]")
+		super().__init__(propagate)
+		self.tracer = tracer if tracer is not None else otel_trace.get_tracer('appstoreconnect')
+
+	def start_span(self, name, attributes=None, parent=None):
+		context = otel_trace.set_span_in_context(parent.span) if isinstance(parent, _OpenTelemetrySpan) else None
+		return _OpenTelemetrySpan(self.tracer.start_span(name, context=context, attributes=attributes))
+
+	def inject(self, headers, span):
+		if self.propagate and isinstance(span, _OpenTelemetrySpan):
+			otel_propagate.inject(headers, context=otel_trace.set_span_in_context(span.span))
+
+
+def iterate(span, chunks):
+	"""
+	:return: an iterator over chunks of bytes ending span once exhausted or closed
+	"""
+	size = 0
+	try:
+		for chunk in chunks:
+			size += len(chunk)
+			yield chunk
+	except Exception as e:
+		span.record_exception(e)
+		raise
+	finally:
+		span.set_attribute('bytes', size)
+		span.end()
+
+
+async def aiterate(span, chunks):
+	size = 0
+	try:
+		async for chunk in chunks:
+			size += len(chunk)
+			yield chunk
+	except Exception as e:
+		span.record_exception(e)
+		raise
+	finally:
+		span.set_attribute('bytes', size)
+		span.end()
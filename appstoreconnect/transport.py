@@ -0,0 +1,150 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import requests
+
+from .metrics import PoolTimeout, set_connect_time
+
+try:
+	import httpx
+except ImportError:
+	httpx = None
+
+try:
+	import h2
+except ImportError:
+	h2 = None
+
+
+class HTTP2Transport:
+	"""
+	sends the requests of Api over HTTP/2 with httpx: concurrent requests, e.g. from bulk methods or several threads,
+	are multiplexed over a single connection instead of each needing its own
+
+	it has the subset of the requests.Session interface Api uses, so any object with request() and close() methods can
+	be given as transport. httpx errors are raised as their requests counterparts, so timeouts and connection errors
+	are retried and reported the same way
+
+	requires httpx and h2, install with: pip install appstoreconnect[http2]
+	"""
+
+	def __init__(self, proxy=None, pool_maxsize=10, http1=True, pool_timeout=None):
+		"""
+		:param pool_maxsize: maximum number of connections open to a single host
+		:param pool_timeout: seconds waited for a free connection, forever by default
+		:param http1: also allow HTTP/1.1 when the server does not negotiate HTTP/2, False to use HTTP/2 without
+		negotiation, e.g. with a local server over http
+		"""
+		if httpx is None or h2 is None:
+			raise ImportError("HTTP2Transport requires httpx and h2, install them with: pip install appstoreconnect[http2]")
+		limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+		self.client = httpx.Client(http1=http1, http2=True, limits=limits, proxy=proxy)
+		self.pool_timeout = pool_timeout
+
+	def request(self, method, url, headers=None, data=None, timeout=None, stream=False):
+		"""
+		:param timeout: seconds, or a (connect, read) tuple
+		:return: an HTTP2Response
+		"""
+		if isinstance(timeout, tuple):
+			timeout = httpx.Timeout(None, connect=timeout[0], read=timeout[1], pool=self.pool_timeout)
+		else:
+			timeout = httpx.Timeout(timeout, pool=self.pool_timeout)
+		request = self.client.build_request(method, url, headers=headers, content=data, timeout=timeout,
+		                                    extensions={'trace': _connect_trace()})
+		start = time.perf_counter()
+		with _requests_errors():
+			response = self.client.send(request, stream=True)
+		elapsed = timedelta(seconds=time.perf_counter() - start)
+		if not stream:
+			try:
+				with _requests_errors():
+					response.read()
+			finally:
+				response.close()
+		return HTTP2Response(response, elapsed)
+
+	def close(self):
+		self.client.close()
+
+
+class HTTP2Response:
+	"""
+	an httpx response with the attributes of a requests.Response that Api uses
+	"""
+
+	def __init__(self, response, elapsed):
+		self.response = response
+		self.elapsed = elapsed  # until the headers were received, like requests
+
+	@property
+	def status_code(self):
+		return self.response.status_code
+
+	@property
+	def headers(self):
+		return self.response.headers
+
+	@property
+	def content(self):
+		with _requests_errors():
+			return self.response.read()
+
+	@property
+	def url(self):
+		return str(self.response.url)
+
+	@property
+	def request(self):
+		return self.response.request
+
+	@property
+	def http_version(self):
+		return self.response.http_version
+
+	def json(self):
+		return json.loads(self.content)
+
+	def iter_content(self, chunk_size=None):
+		with _requests_errors():
+			yield from self.response.iter_bytes(chunk_size)
+
+	def close(self):
+		self.response.close()
+
+
+@contextmanager
+def _requests_errors():
+	"""
+	raise httpx errors as the requests exceptions Api handles
+	"""
+	try:
+		yield
+	except httpx.ConnectTimeout as e:
+		raise requests.exceptions.ConnectTimeout(str(e)) from e
+	except httpx.PoolTimeout as e:
+		raise PoolTimeout(str(e)) from e
+	except httpx.TimeoutException as e:
+		raise requests.exceptions.ReadTimeout(str(e)) from e
+	except httpx.ProxyError as e:
+		raise requests.exceptions.ProxyError(str(e)) from e
+	except (httpx.NetworkError, httpx.RemoteProtocolError) as e:
+		raise requests.exceptions.ConnectionError(str(e)) from e
+	except httpx.HTTPError as e:
+		raise requests.exceptions.RequestException(str(e)) from e
+
+
+def _connect_trace():
+	"""
+	:return: an httpcore trace callback recording how long opening a new connection took, for Metrics
+	"""
+	started = []
+
+	def trace(event_name, info):
+		if event_name == 'connection.connect_tcp.started':
+			started.append(time.perf_counter())
+		elif event_name in ('connection.connect_tcp.complete', 'connection.start_tls.complete') and started:
+			set_connect_time(time.perf_counter() - started[0])
+	return trace
@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+from . import reports
+from . import tables
+from .backfill import report_dates
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# index entries identifying a report, a report stored again with the same values replaces the previous copy
+REPORT_KEYS = ('reportType', 'reportSubType', 'version', 'vendorNumber', 'frequency', 'reportDate')
+
+# columns identifying the product of a row, indexed per segment
+SKU_COLUMNS = ('SKU', 'Vendor Identifier')
+APPLE_ID_COLUMNS = ('Apple Identifier', 'App Apple ID', 'Subscription Apple ID')
+
+
+class ReportWarehouse:
+	"""
+	local store of parsed sales and finance reports, queried without parsing them again
+
+	each report is a segment: a directory holding one .npy file per column, memory-mapped when read. An index of the
+	segments by vendor number, report type, subtype and version, frequency or region, period and SKU / Apple ID lets
+	queries only open the segments, and the columns, they need
+	"""
+
+	def __init__(self, directory):
+		"""
+		:param directory: where segments and the index.json file are stored, created if needed
+		"""
+		if np is None:
+			raise ImportError("ReportWarehouse requires numpy, install it with: pip install appstoreconnect[reports]")
+		self.directory = Path(directory)
+		self.segments_directory = self.directory / 'segments'
+		self.segments_directory.mkdir(parents=True, exist_ok=True)
+		self.index_path = self.directory / 'index.json'
+		self.index = json.loads(self.index_path.read_text('utf-8')) if self.index_path.exists() else {}
+		self._lock = threading.Lock()
+
+	def add(self, table, filters):
+		"""
+		store a parsed report, replacing a previous copy of the same report
+		:param table: a SalesReportTable
+		:param filters: the filters the report was downloaded with, a sales report downloaded without reportDate is
+		stored under the date of its Begin Date and End Date columns
+		:return: the segment id
+		"""
+		report_date = self.report_date(table, filters)
+		if report_date is None:
+			raise ValueError("Cannot store a report without reportDate, nor Begin Date and End Date columns")
+		entry = _segment_entry(table, dict(filters, reportDate=report_date))
+		segment_id = re.sub(r'[^\w.-]', '_', '_'.join(str(entry[key]) for key in REPORT_KEYS if entry[key] is not None))
+		temporary_path = Path(tempfile.mkdtemp(prefix='.%s' % segment_id, dir=str(self.segments_directory)))
+		try:
+			for position, name in enumerate(table.names):
+				np.save(str(temporary_path / ('%d.npy' % position)), table.columns[name])
+				if name in table.categories:
+					np.save(str(temporary_path / ('%d.categories.npy' % position)), table.categories[name])
+			path = self.segments_directory / segment_id
+			with self._lock:
+				if path.exists():
+					shutil.rmtree(str(path))
+				os.replace(str(temporary_path), str(path))
+				# a copy stored by a version of the index without reportSubType had another id
+				replaced = [other_id for other_id, other in self.index.items()
+				            if other_id != segment_id and _same_report(other, entry)]
+				for other_id in replaced:
+					del self.index[other_id]
+				self.index[segment_id] = entry
+				self._save_index()
+				for other_id in replaced:
+					shutil.rmtree(str(self.segments_directory / other_id), ignore_errors=True)
+		finally:
+			if temporary_path.exists():
+				shutil.rmtree(str(temporary_path))
+		return segment_id
+
+	def add_file(self, path, filters, version=None):
+		"""
+		store a report previously saved with save_to
+		:param filters: the filters the report was downloaded with, missing reportSubType and version of sales reports
+		default to the ones download_sales_and_trends_reports() requests
+		"""
+		filters = dict(filters)
+		report_type = filters.get('reportType', 'SALES')
+		filters.setdefault('version', version or reports.SALES_REPORT_VERSIONS.get(report_type, '1_0'))
+		filters.setdefault('reportSubType', reports.SALES_REPORT_SUBTYPES.get(report_type, 'SUMMARY'))
+		rows = reports.iter_detail_rows(reports.iter_file_rows(path))
+		table = tables.parse_sales_report(rows, filters.get('reportType', 'SALES'), filters['version'])
+		return self.add(table, filters)
+
+	@staticmethod
+	def report_date(table, filters):
+		"""
+		:return: the reportDate of a report, from its filters or else from its Begin Date and End Date columns, None
+		when unknown, e.g. for a finance report downloaded without reportDate
+		"""
+		if filters.get('reportDate'):
+			return filters['reportDate']
+		frequency = filters.get('frequency')
+		if frequency not in _PERIODS or not len(table) or 'Begin Date' not in table.columns or 'End Date' not in table.columns:
+			return None
+		if frequency in ('DAILY', 'WEEKLY'):  # weekly reports are identified by the Sunday ending the week
+			return str(table['End Date'].max())
+		begin = str(table['Begin Date'].min())
+		return begin[:7] if frequency == 'MONTHLY' else begin[:4]
+
+	def segments(self, vendor_number=None, report_type=None, frequency=None, start_date=None, end_date=None, sku=None, apple_id=None,
+	             report_sub_type=None, version=None):
+		"""
+		select segments from the index only
+		:param frequency: the frequency of sales reports or the region code of finance reports
+		:param start_date: a datetime.date, segments covering a period ending before are skipped
+		:param end_date: a datetime.date, segments covering a period starting after are skipped
+		:param report_sub_type: the reportSubType of sales reports, e.g. 'SUMMARY' or 'DETAILED'
+		:param version: the version of sales reports, e.g. '1_0'
+		:return: the list of matching segment ids, sorted by period
+		"""
+		selected = []
+		for segment_id, entry in self.index.items():
+			if vendor_number is not None and entry['vendorNumber'] != str(vendor_number):
+				continue
+			if report_type is not None and entry['reportType'] != report_type:
+				continue
+			if report_sub_type is not None and entry.get('reportSubType') != report_sub_type:
+				continue
+			if version is not None and entry['version'] != version:
+				continue
+			if frequency is not None and entry['frequency'] != frequency:
+				continue
+			if start_date is not None and entry['end'] < start_date.isoformat():
+				continue
+			if end_date is not None and entry['start'] > end_date.isoformat():
+				continue
+			if sku is not None and sku not in entry['skus']:
+				continue
+			if apple_id is not None and str(apple_id) not in entry['appleIds']:
+				continue
+			selected.append(segment_id)
+		return sorted(selected, key=lambda segment_id: (self.index[segment_id]['start'], segment_id))
+
+	def load(self, segment_id, columns=None):
+		"""
+		:param columns: the names of the columns to read, all by default, columns the report does not have are skipped
+		:return: a SalesReportTable whose arrays are memory-mapped
+		"""
+		entry = self.index[segment_id]
+		path = self.segments_directory / segment_id
+		names = entry['columns'] if columns is None else columns
+		loaded, categories = {}, {}
+		for name in names:
+			if name not in entry['columns']:
+				continue
+			position = entry['columns'].index(name)
+			loaded[name] = np.load(str(path / ('%d.npy' % position)), mmap_mode='r')
+			categories_path = path / ('%d.categories.npy' % position)
+			if categories_path.exists():
+				categories[name] = np.load(str(categories_path), mmap_mode='r')
+		return tables.SalesReportTable(entry['reportType'], entry['version'], loaded, categories)
+
+	def query(self, columns=None, **selection):
+		"""
+		:param selection: segment selection, see segments(), the segments must have the same columns so a report_type
+		is needed when several report types are stored
+		:return: a SalesReportTable of the matching rows, None if no segment matches
+		"""
+		loaded = [self._select_rows(self.load(segment_id, self._columns(columns, selection)), selection)
+		          for segment_id in self.segments(**selection)]
+		return tables.SalesReportTable.concatenate(loaded) if loaded else None
+
+	def group_sum(self, by, column, **selection):
+		"""
+		sum column by the values of another one over the matching segments, one segment at a time
+		:param selection: segment selection, see segments()
+		:return: a dict mapping each value of by to its sum
+		"""
+		sums = defaultdict(float)
+		for segment_id in self.segments(**selection):
+			table = self._select_rows(self.load(segment_id, self._columns([by, column], selection)), selection)
+			for key, value in table.group_sum(by, column).items():
+				sums[key] += value
+		return dict(sums)
+
+	def coverage(self, vendor_number, report_type, frequency, start_date, end_date, report_sub_type=None, version=None):
+		"""
+		:param frequency: the frequency of sales reports, or the region code of finance reports which are monthly
+		:param report_sub_type: only count reports of this reportSubType, any by default
+		:param version: only count reports of this version, any by default
+		:return: a dict mapping each expected report date to True if stored, False if missing
+		"""
+		selected = self.segments(vendor_number=vendor_number, report_type=report_type, frequency=frequency,
+		                         report_sub_type=report_sub_type, version=version)
+		stored = {self.index[segment_id]['reportDate'] for segment_id in selected}
+		dates = report_dates(start_date, end_date, frequency if frequency in _PERIODS else 'MONTHLY')
+		return {report_date: report_date in stored for report_date in dates}
+
+	def missing(self, vendor_number, report_type, frequency, start_date, end_date, report_sub_type=None, version=None):
+		"""
+		:return: the list of report dates missing between two dates, see coverage()
+		"""
+		coverage = self.coverage(vendor_number, report_type, frequency, start_date, end_date, report_sub_type, version)
+		return [report_date for report_date, stored in coverage.items() if not stored]
+
+	def remove(self, segment_id):
+		with self._lock:
+			self.index.pop(segment_id)
+			self._save_index()
+			shutil.rmtree(str(self.segments_directory / segment_id), ignore_errors=True)
+
+	@staticmethod
+	def _columns(columns, selection):
+		if columns is None:
+			return None
+		columns = list(columns)
+		for key, candidates in (('sku', SKU_COLUMNS), ('apple_id', APPLE_ID_COLUMNS)):
+			if selection.get(key) is not None:
+				columns += [name for name in candidates if name not in columns]
+		return columns
+
+	def _select_rows(self, table, selection):
+		for key, candidates in (('sku', SKU_COLUMNS), ('apple_id', APPLE_ID_COLUMNS)):
+			value = selection.get(key)
+			if value is None:
+				continue
+			masks = [table[name] == str(value) for name in candidates if name in table.columns]
+			if masks:
+				table = table.select(np.logical_or.reduce(masks))
+		return table
+
+	def _save_index(self):
+		temporary_path = self.index_path.with_suffix('.tmp')
+		temporary_path.write_text(json.dumps(self.index, indent=1, sort_keys=True), 'utf-8')
+		os.replace(str(temporary_path), str(self.index_path))
+
+
+_PERIODS = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+
+def _segment_entry(table, filters):
+	frequency = filters.get('frequency') or filters.get('regionCode', 'MONTHLY')
+	start, end = _period(filters['reportDate'], frequency if frequency in _PERIODS else 'MONTHLY')
+	return {
+		'vendorNumber': str(filters['vendorNumber']),
+		'reportType': table.report_type,
+		'reportSubType': filters.get('reportSubType'),
+		'version': table.version,
+		'frequency': frequency,
+		'reportDate': filters['reportDate'],
+		'start': start.isoformat(),
+		'end': end.isoformat(),
+		'rows': len(table),
+		'columns': table.names,
+		'skus': _distinct(table, SKU_COLUMNS),
+		'appleIds': _distinct(table, APPLE_ID_COLUMNS),
+	}
+
+
+def _same_report(stored, entry):
+	# entries stored before reportSubType was indexed match any subtype
+	return all(stored.get(key, entry[key]) == entry[key] for key in REPORT_KEYS)
+
+
+def _period(report_date, frequency):
+	"""
+	:return: the first and last days covered by a report
+	"""
+	if frequency == 'YEARLY':
+		year = int(report_date)
+		return date(year, 1, 1), date(year, 12, 31)
+	if frequency == 'MONTHLY':
+		year, month = map(int, report_date.split('-')[:2])
+		next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+		return date(year, month, 1), next_month - timedelta(1)
+	day = date(*map(int, report_date.split('-')))
+	if frequency == 'WEEKLY':
+		return day - timedelta(6), day
+	return day, day
+
+
+def _distinct(table, candidates):
+	values = set()
+	for name in candidates:
+		if name in table.categories:
+			values.update(table.categories[name].tolist())
+	values.discard('')
+	return sorted(values)
@@ -0,0 +1,67 @@
+"""
+decoding time of listing pages of the sizes the API returns, and encoding time of request bodies, for each JSON codec
+available, plus decoding through an intermediate string as Response.json() does
+
+usage: python benchmarks/bench_json.py [repeat]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appstoreconnect.codec import JSONCodec, OrjsonCodec  # noqa: E402
+from benchmarks.server import StandInServer  # noqa: E402
+
+PAGES = [('%s?limit=%d' % (path, limit)) for path in ('/v1/builds', '/v1/devices', '/v1/betaTesters') for limit in (10, 50, 200)]
+
+
+class TextCodec(JSONCodec):
+	# decodes the body to a string first, as requests' Response.json() did before codecs
+	name = 'json text'
+
+	def loads(self, data):
+		return json.loads(data.decode('utf-8'))
+
+
+def codecs():
+	available = [TextCodec(), JSONCodec()]
+	try:
+		available.append(OrjsonCodec())
+	except ImportError:
+		print('orjson is not installed, install it with: pip install appstoreconnect[fast-json]')
+	return available
+
+
+def request_bodies(server):
+	builds = server.collections['builds'][:200]
+	return [
+		('linkage 200', {'data': [{'type': 'builds', 'id': build['id']} for build in builds]}),
+		('create tester', {'data': {'type': 'betaTesters', 'attributes': {'email': 'tester@example.com', 'firstName': 'Tester', 'lastName': 'One'},
+		                            'relationships': {'betaGroups': {'data': [{'type': 'betaGroups', 'id': 'GROUP'}]}}}}),
+	]
+
+
+def best(function, repeat):
+	number = max(1, int(0.05 / max(min(timeit.repeat(function, number=1, repeat=3)), 1e-9)))
+	return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main(repeat=5):
+	server = StandInServer()
+	available = codecs()
+	print('%-26s %10s' % ('decode', 'KiB') + ''.join('%14s' % ('%s ms' % codec.name) for codec in available))
+	for path in PAGES:
+		body = server.respond(path)[3]
+		timings = [best(lambda: codec.loads(body), repeat) for codec in available]
+		print('%-26s %10.1f' % (path, len(body) / 1024) + ''.join('%14.3f' % (timing * 1000) for timing in timings))
+
+	print('\n%-37s' % 'encode' + ''.join('%14s' % ('%s ms' % codec.name) for codec in available[1:]))
+	for name, document in request_bodies(server):
+		timings = [best(lambda: codec.dumps(document), repeat) for codec in available[1:]]
+		print('%-37s' % name + ''.join('%14.3f' % (timing * 1000) for timing in timings))
+
+
+if __name__ == '__main__':
+	main(*map(int, sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""
+peak memory of streamed report downloads as reports grow, which should stay flat, against a local stand-in server
+
+usage: python benchmarks/bench_report_memory.py [rows ...]
+
+exits with status 1 when the peak of the largest report is more than twice the one of the smallest
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appstoreconnect import Api  # noqa: E402
+from benchmarks.run import FINANCE_FILTERS, SALES_FILTERS, signing_key  # noqa: E402
+from benchmarks.server import StandInServer  # noqa: E402
+
+
+def sales_report_stream(api):
+	return sum(1 for row in api.download_sales_and_trends_reports(dict(SALES_FILTERS), stream=True))
+
+
+def finance_report_split(api):
+	details, summary = api.download_finance_reports(dict(FINANCE_FILTERS), split_response=True, stream=True)
+	return sum(1 for row in details) + sum(1 for row in summary)
+
+
+def peak_memory(function, api):
+	function(api)  # warm up, the server renders the report once
+	tracemalloc.start()
+	function(api)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+
+def main(sizes=(50000, 200000, 800000)):
+	key = signing_key()
+	functions = (sales_report_stream, finance_report_split)
+	peaks = {function.__name__: [] for function in functions}
+	print('%-10s' % 'rows' + ''.join('%26s' % ('%s MiB' % function.__name__) for function in functions))
+	for rows in sizes:
+		with StandInServer(report_rows=rows) as server:
+			with Api('BENCHMARK', key, 'BENCHMARK-ISSUER', submit_stats=False, base_url=server.url) as api:
+				for function in functions:
+					peaks[function.__name__].append(peak_memory(function, api))
+		print('%-10d' % rows + ''.join('%26.1f' % (peaks[function.__name__][-1] / 2 ** 20) for function in functions))
+
+	growing = [name for name, values in peaks.items() if values[-1] > 2 * values[0]]
+	for name in growing:
+		print('GROWING %s: peak memory depends on the report size' % name)
+	return 1 if growing else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(tuple(map(int, sys.argv[1:])) or (50000, 200000, 800000)))
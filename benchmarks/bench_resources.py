@@ -0,0 +1,51 @@
+"""
+memory per object and attribute access speed of plain and compact resources
+
+usage: python benchmarks/bench_resources.py [count]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appstoreconnect.resources import Device, compact  # noqa: E402
+
+
+def device_data(index):
+	return {
+		'type': 'devices',
+		'id': 'DEVICE%08d' % index,
+		'attributes': {
+			'name': 'iPhone %d' % index,
+			'platform': 'IOS',
+			'udid': '%040x' % index,
+			'status': 'ENABLED',
+		},
+		'links': {'self': 'https://api.appstoreconnect.apple.com/v1/devices/DEVICE%08d' % index},
+	}
+
+
+def measure(Resource, count):
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	payloads = [device_data(index) for index in range(count)]
+	objects = [Resource(data, None) for data in payloads]
+	del payloads  # as after a listing page is processed, what remains is kept alive by the objects
+	size = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+	obj = objects[0]
+	access = min(timeit.repeat(lambda: (obj.name, obj.udid, obj.status), number=100000, repeat=5)) / 100000 / 3
+	return size / len(objects), access
+
+
+def main(count=100000):
+	print('%-10s %16s %16s' % ('resource', 'bytes/object', 'ns/attribute'))
+	for label, Resource in (('plain', Device), ('compact', compact(Device))):
+		size, access = measure(Resource, count)
+		print('%-10s %16.0f %16.1f' % (label, size, access * 1e9))
+
+
+if __name__ == '__main__':
+	main(*map(int, sys.argv[1:]))
@@ -0,0 +1,65 @@
+"""
+HTTP/1.1 (requests) against HTTP/2 (HTTP2Transport) on the local stand-in server: concurrent resource reads as bulk
+methods do, concurrent report downloads and a sequential listing, with the connections each one opened
+
+usage: python benchmarks/bench_transports.py [latency in seconds] [threads]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appstoreconnect import Api  # noqa: E402
+from appstoreconnect.transport import HTTP2Transport  # noqa: E402
+from benchmarks.run import SALES_FILTERS, signing_key  # noqa: E402
+from benchmarks.server import HTTP2StandInServer, StandInServer  # noqa: E402
+
+
+def concurrent_reads(api, server, threads):
+	tester_ids = [tester['id'] for tester in server.collections['betaTesters'][:1000]]
+	with ThreadPoolExecutor(threads) as executor:
+		return len(list(executor.map(api.read_beta_tester_information, tester_ids)))
+
+
+def concurrent_reports(api, server, threads):
+	def download(day):
+		filters = dict(SALES_FILTERS, reportDate='2020-01-%02d' % day)
+		return sum(1 for row in api.download_sales_and_trends_reports(filters, stream=True))
+	with ThreadPoolExecutor(threads) as executor:
+		return sum(executor.map(download, range(1, 29)))
+
+
+def sequential_listing(api, server, threads):
+	return sum(1 for device in api.list_devices())
+
+
+SCENARIOS = (
+	('concurrent reads', 'requests', concurrent_reads),
+	('concurrent reports', 'rows', concurrent_reports),
+	('sequential listing', 'resources', sequential_listing),
+)
+
+
+def main(latency=0.02, threads=50):
+	key = signing_key()
+	print('latency %.0f ms, %d threads' % (latency * 1000, threads))
+	print('%-20s %-9s %10s %14s %12s' % ('scenario', 'protocol', 'seconds', 'units/s', 'connections'))
+	for label, Server, transport in (('HTTP/1.1', StandInServer, None), ('HTTP/2', HTTP2StandInServer, 'http2')):
+		with Server(report_rows=20000) as server:
+			for name, unit, function in SCENARIOS:
+				server.reset(latency)
+				# prior knowledge, the local server has no TLS to negotiate HTTP/2 with
+				api_transport = HTTP2Transport(pool_maxsize=10, http1=False) if transport else None
+				# up to a connection per thread over HTTP/1.1
+				with Api('BENCHMARK', key, 'BENCHMARK-ISSUER', submit_stats=False, base_url=server.url, pool_maxsize=threads,
+				         transport=api_transport) as api:
+					start = time.perf_counter()
+					count = function(api, server, threads)
+					duration = time.perf_counter() - start
+				print('%-20s %-9s %10.2f %14.0f %12d' % (name, label, duration, count / duration, server.connections))
+
+
+if __name__ == '__main__':
+	main(*[float(argument) if index == 0 else int(argument) for index, argument in enumerate(sys.argv[1:])])
@@ -0,0 +1,216 @@
+"""
+throughput and peak memory of listings, relationships, report downloads and token signing, against a local stand-in
+server, compared with a baseline to catch regressions
+
+usage:
+  python benchmarks/run.py                  # run every benchmark and compare with benchmarks/baseline.json
+  python benchmarks/run.py list_devices     # only some benchmarks
+  python benchmarks/run.py --save           # record the baseline, on the machine used for later comparisons
+
+exits with status 1 when a benchmark is slower, or uses more memory, than the baseline beyond the tolerance
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appstoreconnect import Api, RateLimiter  # noqa: E402
+from benchmarks.server import StandInServer  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SALES_FILTERS = {'vendorNumber': '80000000', 'frequency': 'DAILY', 'reportDate': '2020-01-01'}
+FINANCE_FILTERS = {'vendorNumber': '80000000', 'regionCode': 'ZZ', 'reportDate': '2020-01'}
+
+BENCHMARKS = []
+
+
+def benchmark(unit, latency=0.0, error_every=0, requires=None):
+	"""
+	register a function(api) returning how many units it processed
+	:param latency: seconds the server waits before each response
+	:param error_every: the server answers every nth request with a 503
+	:param requires: a module the benchmark needs, it is skipped when missing
+	"""
+	def register(function):
+		BENCHMARKS.append({'name': function.__name__, 'function': function, 'unit': unit, 'latency': latency,
+		                   'error_every': error_every, 'requires': requires})
+		return function
+	return register
+
+
+@benchmark('resources')
+def list_devices(api):
+	return sum(1 for device in api.list_devices(limit=200) if device.udid)
+
+
+@benchmark('resources')
+def list_builds(api):
+	# default page size, more requests for as many resources
+	return sum(1 for build in api.list_builds() if build.version)
+
+
+@benchmark('resources', latency=0.002)
+def list_builds_prefetch(api):
+	return sum(1 for build in api.list_builds(limit=200, prefetch=2) if build.version)
+
+
+@benchmark('resources', error_every=10)
+def list_devices_errors(api):
+	return sum(1 for device in api.list_devices(limit=200) if device.udid)
+
+
+@benchmark('resources')
+def relationships(api):
+	count = 0
+	for app in api.list_apps():
+		count += sum(1 for build in app.builds())
+		count += sum(1 for group in app.betaGroups())
+	return count
+
+
+@benchmark('requests')
+def read_app(api):
+	for _ in range(25):
+		for index in range(20):
+			api.read_app_information(str(1400000000 + index))
+	return 500
+
+
+@benchmark('rows')
+def sales_report(api):
+	return api.download_sales_and_trends_reports(dict(SALES_FILTERS)).count('\n')
+
+
+@benchmark('rows')
+def sales_report_stream(api):
+	return sum(1 for row in api.download_sales_and_trends_reports(dict(SALES_FILTERS), stream=True))
+
+
+@benchmark('rows', requires='numpy')
+def sales_report_table(api):
+	return len(api.download_sales_and_trends_reports(dict(SALES_FILTERS), table=True))
+
+
+@benchmark('rows')
+def finance_report(api):
+	return api.download_finance_reports(dict(FINANCE_FILTERS)).count('\n')
+
+
+@benchmark('rows')
+def finance_report_split(api):
+	details, summary = api.download_finance_reports(dict(FINANCE_FILTERS), split_response=True, stream=True)
+	return sum(1 for row in details) + sum(1 for row in summary)
+
+
+@benchmark('tokens')
+def token(api):
+	for _ in range(2000):
+		api._generate_token()
+	return 2000
+
+
+def signing_key():
+	key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+	return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode('ascii')
+
+
+def measure(entry, server, key, repeat):
+	"""
+	:return: the median throughput in units per second, the peak memory in bytes of a run and the units processed
+	"""
+	server.reset(entry['latency'], entry['error_every'])
+
+	def run():
+		with Api('BENCHMARK', key, 'BENCHMARK-ISSUER', submit_stats=False, base_url=server.url,
+		         rate_limiter=RateLimiter(max_retries=5, backoff_factor=0.001)) as api:
+			start = time.perf_counter()
+			count = entry['function'](api)
+			return count, time.perf_counter() - start
+
+	run()  # warm up, the server renders each response once
+	runs = [run() for _ in range(repeat)]
+	tracemalloc.start()
+	run()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return statistics.median(count / duration for count, duration in runs), peak, runs[0][0]
+
+
+def compare(results, baseline, tolerance):
+	"""
+	:return: the list of regressions, as messages
+	"""
+	regressions = []
+	for name, result in results.items():
+		reference = baseline.get(name)
+		if reference is None:
+			continue
+		if result['throughput'] < reference['throughput'] * (1 - tolerance):
+			regressions.append('%s: %.0f %s/s, baseline %.0f' % (name, result['throughput'], result['unit'], reference['throughput']))
+		if result['peak_memory'] > reference['peak_memory'] * (1 + tolerance):
+			regressions.append('%s: peak memory %.1f MiB, baseline %.1f' % (name, result['peak_memory'] / 2 ** 20, reference['peak_memory'] / 2 ** 20))
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+	parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark, the median is kept')
+	parser.add_argument('--baseline', default=BASELINE, help='baseline file')
+	parser.add_argument('--save', action='store_true', help='write the results to the baseline file')
+	parser.add_argument('--tolerance', type=float, default=0.25, help='accepted slowdown or memory increase, 0.25 for 25%%')
+	parser.add_argument('--report-rows', type=int, default=50000, help='rows of generated reports')
+	args = parser.parse_args()
+
+	unknown = set(args.names) - {entry['name'] for entry in BENCHMARKS}
+	if unknown:
+		parser.error('unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+
+	key = signing_key()
+	results = {}
+	print('%-22s %12s %14s %12s' % ('benchmark', 'units', 'units/s', 'peak MiB'))
+	with StandInServer(report_rows=args.report_rows) as server:
+		for entry in BENCHMARKS:
+			if args.names and entry['name'] not in args.names:
+				continue
+			if entry['requires']:
+				try:
+					__import__(entry['requires'])
+				except ImportError:
+					print('%-22s skipped, requires %s' % (entry['name'], entry['requires']))
+					continue
+			throughput, peak, count = measure(entry, server, key, args.repeat)
+			results[entry['name']] = {'unit': entry['unit'], 'throughput': throughput, 'peak_memory': peak}
+			print('%-22s %12s %14.0f %12.1f' % (entry['name'], '%d %s' % (count, entry['unit']), throughput, peak / 2 ** 20))
+
+	if args.save:
+		baseline = {'_machine': {'python': platform.python_version(), 'platform': platform.platform(), 'date': date.today().isoformat()}}
+		baseline.update(results)
+		with open(args.baseline, 'w') as file:
+			json.dump(baseline, file, indent=1, sort_keys=True)
+		print('baseline saved to %s' % args.baseline)
+		return 0
+
+	if not os.path.exists(args.baseline):
+		print('no baseline, record one with --save')
+		return 0
+	with open(args.baseline) as file:
+		regressions = compare(results, json.load(file), args.tolerance)
+	for regression in regressions:
+		print('REGRESSION %s' % regression)
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
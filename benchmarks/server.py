@@ -0,0 +1,422 @@
+"""
+a local stand-in for the App Store Connect API, serving generated resources and reports
+
+JSON:API listings are paginated with links.next and meta.paging, resources carry relationship links like the real API,
+reports are gzip compressed TSV files and every response has an X-Rate-Limit header. Latency and 503 errors can be
+injected to measure retries. HTTP2StandInServer serves the same over HTTP/2 without TLS, requires h2.
+
+usage: python benchmarks/server.py [port] [--http2], then Api(..., base_url='http://127.0.0.1:<port>')
+"""
+import asyncio
+import gzip
+import json
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+	import h2.config
+	import h2.connection
+	import h2.events
+except ImportError:
+	h2 = None
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+SALES_HEADER = [
+	'Provider', 'Provider Country', 'SKU', 'Developer', 'Title', 'Version', 'Product Type Identifier', 'Units',
+	'Developer Proceeds', 'Begin Date', 'End Date', 'Customer Currency', 'Country Code', 'Currency of Proceeds',
+	'Apple Identifier', 'Customer Price', 'Promo Code', 'Parent Identifier', 'Subscription', 'Period', 'Category', 'CMB',
+	'Device', 'Supported Platforms', 'Proceeds Reason', 'Preserved Pricing', 'Client', 'Order Type',
+]
+FINANCE_HEADER = [
+	'Start Date', 'End Date', 'UPC', 'ISRC/ISBN', 'Vendor Identifier', 'Quantity', 'Partner Share', 'Extended Partner Share',
+	'Partner Share Currency', 'Sales or Return', 'Apple Identifier', 'Artist/Show/Developer/Author', 'Title',
+	'Label/Studio/Network/Developer/Publisher', 'Grid', 'Product Type Identifier', 'ISAN/Other Identifier',
+	'Country Of Sale', 'Pre-order Flag', 'Promo Code', 'Customer Price', 'Customer Currency',
+]
+COUNTRIES = ['US', 'FR', 'DE', 'GB', 'JP', 'CN', 'BR', 'IN', 'CA', 'AU', 'IT', 'ES', 'KR', 'MX', 'NL']
+DEVICES = ['iPhone', 'iPad', 'Desktop', 'Apple TV', 'iPod touch']
+
+
+class StandInServer:
+	"""
+	serves apps, builds, beta groups, beta testers and devices, plus sales and finance reports
+
+	:param latency: seconds slept before each response
+	:param error_every: answer every nth request with a 503 and Retry-After: 0, 0 to never fail
+	:param quota: hourly request quota reported in the X-Rate-Limit header
+	"""
+
+	def __init__(self, apps=20, builds=2000, beta_testers=2000, devices=5000, report_rows=50000, latency=0.0, error_every=0,
+	             quota=1000000, port=0):
+		self.latency = latency
+		self.error_every = error_every
+		self.quota = quota
+		self.report_rows = report_rows
+		self.port = port
+		self.requests = 0
+		self.connections = 0
+		self.remaining = quota
+		self._lock = threading.Lock()
+		self._bodies = {}  # encoded responses, so that serving costs as little as possible
+		self.collections = {
+			'apps': [_app(index) for index in range(apps)],
+			'builds': [_build(index, apps) for index in range(builds)],
+			'betaGroups': [_beta_group(index, apps) for index in range(apps * 3)],
+			'betaTesters': [_beta_tester(index) for index in range(beta_testers)],
+			'devices': [_device(index) for index in range(devices)],
+		}
+		self.index = {(resource['type'], resource['id']): resource for resources in self.collections.values() for resource in resources}
+		self._server = None
+
+	@property
+	def url(self):
+		return 'http://127.0.0.1:%d' % self.port
+
+	def start(self):
+		self._server = ThreadingHTTPServer(('127.0.0.1', self.port), _handler(self))
+		self._server.daemon_threads = True
+		self.port = self._server.server_address[1]
+		threading.Thread(target=self._server.serve_forever, daemon=True).start()
+		return self.url
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+
+	def reset(self, latency=0.0, error_every=0):
+		with self._lock:
+			self.latency = latency
+			self.error_every = error_every
+			self.requests = 0
+			self.connections = 0
+			self.remaining = self.quota
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+
+	def respond(self, path):
+		"""
+		:return: the status code, headers, content type and body answering a GET request, to send after sleeping
+		latency seconds
+		"""
+		with self._lock:
+			self.requests += 1
+			self.remaining = max(self.remaining - 1, 0)
+			failing = self.error_every and self.requests % self.error_every == 0
+			headers = {'X-Rate-Limit': 'user-hour-lim:%d;user-hour-rem:%d;' % (self.quota, self.remaining)}
+		if failing:
+			headers['Retry-After'] = '0'
+			return 503, headers, 'application/json', _errors('503', 'The service is temporarily unavailable')
+		body = self._bodies.get(path)
+		if body is None:
+			body = self._bodies[path] = self._render(path)
+		status, content_type, content = body
+		return status, headers, content_type, content
+
+	def _render(self, path):
+		split = urlsplit(path)
+		query = {name: values[0] for name, values in parse_qs(split.query).items()}
+		segments = split.path.strip('/').split('/')
+		if segments == ['v1', 'salesReports']:
+			return 200, 'application/a-gzip', gzip.compress(sales_report(self.report_rows, query.get('filter[reportDate]')), 6)
+		if segments == ['v1', 'financeReports']:
+			return 200, 'application/a-gzip', gzip.compress(finance_report(self.report_rows), 6)
+		if len(segments) == 2 and segments[1] in self.collections:
+			return self._page(split.path, self.collections[segments[1]], query)
+		resource = self.index.get(tuple(segments[1:3])) if len(segments) in (3, 4) else None
+		if resource is not None and len(segments) == 3:
+			return 200, 'application/json', self._json({'data': resource, 'links': {'self': self._url(split.path)}})
+		if resource is not None and segments[3] in resource['relationships']:
+			linkage = resource['relationships'][segments[3]].get('data')
+			if linkage is not None:  # to-one
+				return 200, 'application/json', self._json({'data': self.index[linkage['type'], linkage['id']]})
+			related = [item for item in self.collections.get(segments[3], []) if _belongs(item, resource)]
+			return self._page(split.path, related, query)
+		return 404, 'application/json', _errors('404', 'The resource could not be found')
+
+	def _page(self, path, resources, query):
+		limit = min(int(query.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+		cursor = int(query.get('cursor', 0))
+		document = {
+			'data': resources[cursor:cursor + limit],
+			'links': {'self': self._url(path, cursor, limit)},
+			'meta': {'paging': {'total': len(resources), 'limit': limit}},
+		}
+		if cursor + limit < len(resources):
+			document['links']['next'] = self._url(path, cursor + limit, limit)
+		return 200, 'application/json', self._json(document)
+
+	def _json(self, document):
+		return _json(document).replace(b'{base}', self.url.encode('ascii'))
+
+	def _url(self, path, cursor=None, limit=None):
+		url = self.url + path
+		if cursor is not None:
+			url += '?limit=%d' % limit + ('&cursor=%d' % cursor if cursor else '')
+		return url
+
+
+def _handler(server):
+	class Handler(BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'
+		disable_nagle_algorithm = True  # headers and body are written separately
+
+		def setup(self):
+			super().setup()
+			with server._lock:
+				server.connections += 1
+
+		def do_GET(self):
+			status, headers, content_type, body = server.respond(self.path)
+			if server.latency:
+				time.sleep(server.latency)
+			self.send_response(status)
+			self.send_header('Content-Type', content_type)
+			self.send_header('Content-Length', str(len(body)))
+			for name, value in headers.items():
+				self.send_header(name, value)
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, format, *args):
+			pass
+
+	return Handler
+
+
+class HTTP2StandInServer(StandInServer):
+	"""
+	the stand-in server over HTTP/2 with prior knowledge, as clients do not negotiate HTTP/2 on plain http, e.g.
+	HTTP2Transport(http1=False)
+	"""
+
+	def start(self):
+		if h2 is None:
+			raise ImportError("HTTP2StandInServer requires h2")
+		self._loop = asyncio.new_event_loop()
+		started = threading.Event()
+		threading.Thread(target=self._serve, args=(started,), daemon=True).start()
+		started.wait()
+		return self.url
+
+	def stop(self):
+		self._loop.call_soon_threadsafe(self._loop.stop)
+
+	def _serve(self, started):
+		asyncio.set_event_loop(self._loop)
+		self._server = self._loop.run_until_complete(
+			self._loop.create_server(lambda: _HTTP2Protocol(self), '127.0.0.1', self.port))
+		self.port = self._server.sockets[0].getsockname()[1]
+		started.set()
+		self._loop.run_forever()
+		self._server.close()
+
+
+class _HTTP2Protocol(asyncio.Protocol):
+	"""
+	one HTTP/2 connection, each stream is answered by its own task so that slow responses do not block the others
+	"""
+
+	def __init__(self, server):
+		self.server = server
+		self.connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+		self.transport = None
+		self.window_updated = asyncio.Event()
+
+	def connection_made(self, transport):
+		with self.server._lock:
+			self.server.connections += 1
+		self.transport = transport
+		self.connection.initiate_connection()
+		self.transport.write(self.connection.data_to_send())
+
+	def data_received(self, data):
+		for event in self.connection.receive_data(data):
+			if isinstance(event, h2.events.RequestReceived):
+				asyncio.ensure_future(self.respond(event.stream_id, dict(event.headers)[':path']))
+			elif isinstance(event, h2.events.DataReceived):
+				self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+			elif isinstance(event, h2.events.WindowUpdated):
+				self.window_updated.set()
+			elif isinstance(event, h2.events.ConnectionTerminated):
+				self.transport.close()
+		self.transport.write(self.connection.data_to_send())
+
+	def connection_lost(self, exc):
+		self.window_updated.set()
+
+	async def respond(self, stream_id, path):
+		status, headers, content_type, body = self.server.respond(path)
+		if self.server.latency:
+			await asyncio.sleep(self.server.latency)
+		response_headers = [(':status', str(status)), ('content-type', content_type), ('content-length', str(len(body)))]
+		response_headers += [(name.lower(), value) for name, value in headers.items()]
+		self.connection.send_headers(stream_id, response_headers)
+		while body:
+			window = min(self.connection.local_flow_control_window(stream_id), self.connection.max_outbound_frame_size)
+			if window <= 0:
+				self.window_updated.clear()
+				await self.window_updated.wait()
+				if self.transport.is_closing():
+					return
+				continue
+			self.connection.send_data(stream_id, body[:window])
+			body = body[window:]
+			self.transport.write(self.connection.data_to_send())
+		self.connection.end_stream(stream_id)
+		self.transport.write(self.connection.data_to_send())
+
+
+def _json(document):
+	return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+
+def _errors(status, detail):
+	return _json({'errors': [{'status': status, 'code': 'ERROR', 'title': detail, 'detail': detail}]})
+
+
+def _belongs(item, resource):
+	relationship = item.get('relationships', {}).get(resource['type'][:-1], {})
+	return (relationship.get('data') or {}).get('id') == resource['id']
+
+
+def _relationships(resource_type, resource_id, names, to_one=None):
+	"""
+	relationship objects with links, as returned by the API when the relationship is not included
+	"""
+	base = '{base}/v1/%s/%s' % (resource_type, resource_id)
+	relationships = {name: {'links': {'self': '%s/relationships/%s' % (base, name), 'related': '%s/%s' % (base, name)}}
+	                 for name in names}
+	for name, linkage in (to_one or {}).items():
+		relationships[name]['data'] = linkage
+	return relationships
+
+
+def _resource(resource_type, resource_id, attributes, relationships):
+	return {
+		'type': resource_type,
+		'id': resource_id,
+		'attributes': attributes,
+		'relationships': relationships,
+		'links': {'self': '{base}/v1/%s/%s' % (resource_type, resource_id)},
+	}
+
+
+def _app(index):
+	app_id = str(1400000000 + index)
+	return _resource('apps', app_id, {
+		'name': 'App %d' % index,
+		'bundleId': 'com.example.app%d' % index,
+		'sku': 'SKU%04d' % index,
+		'primaryLocale': 'en-US',
+		'isOrEverWasMadeForKids': False,
+		'contentRightsDeclaration': 'DOES_NOT_USE_THIRD_PARTY_CONTENT',
+	}, _relationships('apps', app_id, [
+		'betaLicenseAgreement', 'preReleaseVersions', 'betaAppLocalizations', 'betaGroups', 'betaTesters', 'builds',
+		'betaAppReviewDetail']))
+
+
+def _build(index, apps):
+	build_id = '%08x-0000-4000-8000-%012x' % (index, index)
+	uploaded = datetime(2020, 1, 1) + timedelta(hours=index)
+	return _resource('builds', build_id, {
+		'version': str(1000 + index),
+		'uploadedDate': uploaded.strftime('%Y-%m-%dT%H:%M:%S-07:00'),
+		'expirationDate': (uploaded + timedelta(days=90)).strftime('%Y-%m-%dT%H:%M:%S-07:00'),
+		'expired': False,
+		'minOsVersion': '13.0',
+		'iconAssetToken': {'templateUrl': 'https://is1-ssl.mzstatic.com/image/thumb/%d/{w}x{h}bb.{f}' % index, 'width': 1024, 'height': 1024},
+		'processingState': 'VALID',
+		'usesNonExemptEncryption': False,
+	}, _relationships('builds', build_id, [
+		'app', 'preReleaseVersion', 'individualTesters', 'betaGroups', 'betaBuildLocalizations', 'appEncryptionDeclaration',
+		'betaAppReviewSubmission', 'buildBetaDetail', 'diagnosticSignatures', 'icons'],
+		{'app': {'type': 'apps', 'id': str(1400000000 + index % apps)}}))
+
+
+def _beta_group(index, apps):
+	group_id = '%08x-1111-4000-8000-%012x' % (index, index)
+	return _resource('betaGroups', group_id, {
+		'name': 'Group %d' % index,
+		'createdDate': '2020-01-01T00:00:00Z',
+		'isInternalGroup': index % 3 == 0,
+		'publicLinkEnabled': False,
+		'publicLinkLimitEnabled': False,
+		'feedbackEnabled': True,
+	}, _relationships('betaGroups', group_id, ['app', 'builds', 'betaTesters'],
+		{'app': {'type': 'apps', 'id': str(1400000000 + index % apps)}}))
+
+
+def _beta_tester(index):
+	tester_id = '%08x-2222-4000-8000-%012x' % (index, index)
+	return _resource('betaTesters', tester_id, {
+		'firstName': 'Tester',
+		'lastName': str(index),
+		'email': 'tester%d@example.com' % index,
+		'inviteType': 'EMAIL',
+	}, _relationships('betaTesters', tester_id, ['apps', 'betaGroups', 'builds']))
+
+
+def _device(index):
+	device_id = 'D%09d' % index
+	return _resource('devices', device_id, {
+		'name': '%s %d' % (DEVICES[index % len(DEVICES)], index),
+		'platform': 'IOS',
+		'udid': '%040x' % (index * 2654435761),
+		'deviceClass': 'IPHONE',
+		'status': 'ENABLED',
+		'model': 'iPhone 12',
+		'addedDate': '2020-01-01T00:00:00.000+0000',
+	}, {})
+
+
+def sales_report(rows, report_date=None):
+	"""
+	:return: the TSV content of a daily SALES report
+	"""
+	day = date(*map(int, report_date.split('-'))) if report_date and report_date.count('-') == 2 else date(2020, 1, 1)
+	day = day.strftime('%m/%d/%Y')
+	lines = ['\t'.join(SALES_HEADER)]
+	for index in range(rows):
+		country = COUNTRIES[index % len(COUNTRIES)]
+		lines.append('\t'.join([
+			'APPLE', 'US', 'SKU%04d' % (index % 20), 'Example Inc.', 'App %d' % (index % 20), '1.%d' % (index % 7), '1F',
+			str(1 + index % 5), '%.2f' % (0.7 * (index % 10)), day, day, 'USD', country, 'USD', str(1400000000 + index % 20),
+			'%.2f' % (index % 10), '', '', '', '', 'Games', '', DEVICES[index % len(DEVICES)], 'iOS', '', '', '', '',
+		]))
+	return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def finance_report(rows):
+	"""
+	:return: the TSV content of a finance report: detail rows, the Total_Rows line and a summary per country
+	"""
+	lines = ['\t'.join(FINANCE_HEADER)]
+	for index in range(rows):
+		country = COUNTRIES[index % len(COUNTRIES)]
+		lines.append('\t'.join([
+			'01/01/2020', '01/31/2020', '', '', 'SKU%04d' % (index % 20), str(1 + index % 5), '%.2f' % (0.7 * (index % 10)),
+			'%.2f' % (0.7 * (index % 10) * (1 + index % 5)), 'USD', 'S', str(1400000000 + index % 20), 'Example Inc.',
+			'App %d' % (index % 20), '', '', '1F', '', country, '', '', '%.2f' % (index % 10), 'USD',
+		]))
+	lines.append('Total_Rows\t%d' % rows)
+	lines.append('\t'.join(['Country Of Sale', 'Partner Share Currency', 'Quantity', 'Extended Partner Share']))
+	lines.extend('%s\tUSD\t%d\t%.2f' % (country, rows // len(COUNTRIES), 100.0 * position) for position, country in enumerate(COUNTRIES))
+	return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+if __name__ == '__main__':
+	arguments = [argument for argument in sys.argv[1:] if argument != '--http2']
+	server = (HTTP2StandInServer if '--http2' in sys.argv else StandInServer)(port=int(arguments[0]) if arguments else 8000)
+	print('serving on %s' % server.start())
+	threading.Event().wait()
@@ -21,6 +21,11 @@ REQUIRED = [
 ]
 
 EXTRAS = {
+    'async': ['httpx>=0.26'],
+    'reports': ['numpy>=1.13'],
+    'tracing': ['opentelemetry-api>=1.0'],
+    'http2': ['httpx>=0.26', 'h2>=3'],
+    'fast-json': ['orjson>=3'],
 }
 
 here = os.path.abspath(os.path.dirname(__file__))
@@ -0,0 +1,15 @@
+import gc
+import sys
+
+import pytest
+
+from appstoreconnect import Api
+
+
+def test_failed_init_is_collected_quietly(signing_key, monkeypatch):
+	unraisable = []
+	monkeypatch.setattr(sys, 'unraisablehook', unraisable.append)
+	with pytest.raises(ValueError):
+		Api('KEY', signing_key, 'ISSUER', hooks={'unknown': print})
+	gc.collect()
+	assert unraisable == []
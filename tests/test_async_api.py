@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+from appstoreconnect import AsyncApi, tables
+from appstoreconnect import async_api
+
+HEADER = ['SKU', 'Units', 'Quantity', 'Begin Date', 'End Date']
+ROWS = [['SKU%d' % (index % 3), str(index), str(index), '06/01/2019', '06/01/2019'] for index in range(25)]
+SALES_FILTERS = {'vendorNumber': '1', 'frequency': 'DAILY', 'reportDate': '2019-06-01'}
+FINANCE_FILTERS = {'vendorNumber': '1', 'regionCode': 'ZZ', 'reportDate': '2019-06'}
+
+
+def run(coroutine):
+	return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+def async_api_instance(signing_key, **kwargs):
+	return AsyncApi('KEY', signing_key, 'ISSUER', submit_stats=False, **kwargs)
+
+
+def test_close_cancels_token_refresh(signing_key):
+	async def main():
+		api = async_api_instance(signing_key, background_token_refresh=True)
+		timer = api._token_timer
+		assert timer.is_alive()
+		await api.close()
+		timer.join(5)
+		assert not timer.is_alive()
+
+	run(main())
+
+
+def test_token_is_signed_outside_the_event_loop(signing_key):
+	threads = []
+
+	async def main():
+		async with async_api_instance(signing_key) as api:
+			generate_token = api._generate_token
+
+			def recording_generate_token():
+				threads.append(threading.current_thread())
+				return generate_token()
+			api._generate_token = recording_generate_token
+			api._token = None  # expired
+			token = await api._atoken()
+			assert token and await api._atoken() == token
+
+	run(main())
+	assert len(threads) == 1 and threads[0] is not threading.current_thread()
+
+
+@pytest.mark.parametrize('finance', [False, True])
+def test_table_is_parsed_while_rows_arrive(signing_key, monkeypatch, finance):
+	pytest.importorskip('numpy')
+	monkeypatch.setattr(async_api, 'FEED_ROWS', 7)
+	fed = []
+	feed = tables.SalesReportParser.feed
+	monkeypatch.setattr(tables.SalesReportParser, 'feed', lambda parser, rows: fed.append(len(rows)) or feed(parser, rows))
+	summary = [['Total_Rows', '25'], ['Country', 'Amount'], ['FR', '10']] if finance else []
+	received = []
+
+	async def rows():
+		for row in [HEADER] + ROWS + summary:
+			received.append(row)
+			yield row
+
+	async def main():
+		async with async_api_instance(signing_key) as api:
+			async def stream_report(url, save_to=None):
+				return rows()
+			api._stream_report = stream_report
+			if finance:
+				return await api.download_finance_reports(dict(FINANCE_FILTERS), table=True)
+			return await api.download_sales_and_trends_reports(dict(SALES_FILTERS), table=True)
+
+	table = run(main())
+	assert fed == [7, 7, 7, 5]
+	assert len(received) == 1 + len(ROWS) + len(summary)
+	assert table['Quantity' if finance else 'Units'].tolist() == list(range(25))
+	assert table['SKU'].tolist() == [row[0] for row in ROWS]
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from appstoreconnect.api import HttpMethod, UserRole
+from appstoreconnect.codec import JSONCodec, OrjsonCodec
+
+PAYLOADS = [
+	{'data': {'type': 'userInvitations', 'attributes': {'email': 'user@example.com', 'roles': [UserRole.ADMIN, UserRole.APP_MANAGER]}}},
+	{'data': [{'type': 'builds', 'id': str(index)} for index in range(3)], 'meta': {'method': HttpMethod.POST, 'tuple': (UserRole.SALES, 1)}},
+	{'text': 'café ☃', 'number': 1.5, 'flag': True, 'nothing': None},
+]
+
+
+@pytest.fixture(params=[JSONCodec, OrjsonCodec])
+def codec(request):
+	try:
+		return request.param()
+	except ImportError:
+		pytest.skip('orjson is not installed')
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_codecs_encode_alike(payload):
+	pytest.importorskip('orjson')
+	assert json.loads(OrjsonCodec().dumps(payload)) == json.loads(JSONCodec().dumps(payload))
+
+
+def test_enum_members_are_encoded_as_names(codec):
+	body = codec.dumps({'roles': [UserRole.ADMIN], 'role': UserRole.FINANCE})
+	assert json.loads(body) == {'roles': ['ADMIN'], 'role': 'FINANCE'}
+
+
+def test_round_trip(codec):
+	assert codec.loads(codec.dumps(PAYLOADS[2])) == PAYLOADS[2]
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+
+import pytest
+
+from appstoreconnect import Api, AsyncApi
+from appstoreconnect.api import APIError, IterResource
+from appstoreconnect.resources import Device
+
+PAGES = 5
+PAGE_SIZE = 3
+URL = 'https://api.test/v1/devices?page=%d'
+EXPECTED = ['%d-%d' % (number, index) for number in range(1, PAGES + 1) for index in range(PAGE_SIZE)]
+
+
+class FakeServer:
+	"""
+	answers listing pages, the first request of each page in fail_pages raises an APIError
+	"""
+
+	def __init__(self, fail_pages=()):
+		self.fail_pages = set(fail_pages)
+		self.calls = []
+
+	def page(self, url):
+		number = int(url.rsplit('=', 1)[1])
+		self.calls.append(number)
+		if number in self.fail_pages:
+			self.fail_pages.discard(number)
+			raise APIError('page %d failed' % number)
+		payload = {
+			'data': [{'type': 'devices', 'id': '%d-%d' % (number, index), 'attributes': {}} for index in range(PAGE_SIZE)],
+			'meta': {'paging': {'total': PAGES * PAGE_SIZE}},
+			'links': {},
+		}
+		if number < PAGES:
+			payload['links']['next'] = URL % (number + 1)
+		return payload
+
+
+def ids(resources):
+	return [resource.id for resource in resources]
+
+
+def within(seconds, function):
+	"""
+	run function in a thread, failing instead of hanging the test run when it blocks
+	"""
+	result = []
+	thread = threading.Thread(target=lambda: result.append(function()), daemon=True)
+	thread.start()
+	thread.join(seconds)
+	assert not thread.is_alive(), 'blocked for more than %d seconds' % seconds
+	return result[0] if result else None
+
+
+@pytest.fixture
+def api(signing_key):
+	with Api('KEY', signing_key, 'ISSUER', submit_stats=False) as api:
+		yield api
+
+
+def listing(api, server, prefetch):
+	api._api_call = lambda url, *args, **kwargs: server.page(url)
+	return IterResource(api, Device, URL % 1, prefetch)
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_iterate_again_after_error(api, prefetch):
+	server = FakeServer(fail_pages=[3])
+	resources = listing(api, server, prefetch)
+	with pytest.raises(APIError):
+		list(resources)
+
+	assert within(5, lambda: ids(resources)) == EXPECTED
+	assert server.calls.count(3) == 2
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_index_again_after_error(api, prefetch):
+	server = FakeServer(fail_pages=[2])
+	resources = listing(api, server, prefetch)
+	with pytest.raises(APIError):
+		resources[5]
+
+	assert within(5, lambda: resources[5].id) == EXPECTED[5]
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_iterate_again_after_close(api, prefetch):
+	resources = listing(api, FakeServer(), prefetch)
+	assert next(iter(resources)).id == EXPECTED[0]
+	resources.close()
+
+	assert within(5, lambda: ids(resources)) == EXPECTED
+	assert len(resources) == len(EXPECTED)
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_async_iterate_again_after_error_and_close(signing_key, prefetch):
+	server = FakeServer(fail_pages=[3])
+
+	async def main():
+		async with AsyncApi('KEY', signing_key, 'ISSUER', submit_stats=False) as api:
+			async def call(url, *args, **kwargs):
+				return server.page(url)
+			api._api_call = call
+
+			resources = IterResource(api, Device, URL % 1, prefetch)
+			with pytest.raises(APIError):
+				[resource async for resource in resources]
+			assert ids([resource async for resource in resources]) == EXPECTED
+
+			resources = IterResource(api, Device, URL % 1, prefetch)
+			async for resource in resources:
+				break
+			resources.close()
+			assert ids([resource async for resource in resources]) == EXPECTED
+
+	asyncio.run(asyncio.wait_for(main(), 10))
+
+
+def test_sync_access_to_async_listing(signing_key):
+	async def main():
+		async with AsyncApi('KEY', signing_key, 'ISSUER', submit_stats=False) as api:
+			async def call(url, *args, **kwargs):
+				return FakeServer().page(url)
+			api._api_call = call
+			resources = IterResource(api, Device, URL % 1)
+			for operation in (len, lambda listing: listing[0], list):
+				with pytest.raises(TypeError):
+					operation(resources)
+			assert await resources.alen() == len(EXPECTED)
+			assert (await resources.aget(0)).id == EXPECTED[0]
+
+	asyncio.run(main())
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from appstoreconnect import Api, Mirror
+from appstoreconnect.resources import App
+
+BASE = 'https://api.test'
+
+
+def build(build_id, app_id):
+	return {
+		'type': 'builds', 'id': build_id, 'attributes': {'version': build_id, 'uploadedDate': '2019-06-0%sT10:00:00Z' % build_id},
+		'relationships': {
+			'app': {'links': {'related': '%s/v1/builds/%s/app' % (BASE, build_id)}, 'data': {'type': 'apps', 'id': app_id}},
+			'preReleaseVersion': {'links': {'related': '%s/v1/builds/%s/preReleaseVersion' % (BASE, build_id)}},
+		},
+	}
+
+
+APP = {'type': 'apps', 'id': 'A1', 'attributes': {'bundleId': 'com.example', 'sku': 'SKU'},
+       'relationships': {'builds': {'links': {'related': '%s/v1/apps/A1/builds' % BASE}}}}
+
+
+class Listing:
+	def __init__(self, data, included=()):
+		self.data = data
+		self.included = {(resource['type'], resource['id']): resource for resource in included}
+
+	def pages(self):
+		yield self.data, self.included
+
+
+@pytest.fixture
+def api(signing_key):
+	with Api('KEY', signing_key, 'ISSUER', submit_stats=False, base_url=BASE) as api:
+		api.requested = []
+
+		def api_call(url, *args, **kwargs):
+			api.requested.append(url)
+			return {'data': APP}
+		api._api_call = api_call
+		api.list_builds = lambda **kwargs: Listing([build('1', 'A1'), build('2', 'A1')], [{'type': 'apps', 'id': 'A1', 'attributes': {}}])
+		api.list_apps = lambda **kwargs: Listing([APP])
+		yield api
+
+
+def test_relationship_getters_of_mirrored_resources(api, tmp_path):
+	mirror = Mirror(api, str(tmp_path / 'mirror.db'))
+	mirror.sync(['apps', 'builds'])
+
+	app = mirror.get('builds', '1').app()
+	assert isinstance(app, App) and app.id == 'A1'
+	assert api.requested == ['%s/v1/builds/1/app' % BASE]
+	# the app included without relationships in the builds listing keeps the ones of the apps listing
+	assert mirror.get('apps', 'A1')._get_relationship('builds') == APP['relationships']['builds']
+	assert [resource.id for resource in mirror.find('builds', relationships={'app': 'A1'})] == ['1', '2']
+	assert [resource.id for resource in mirror.related('builds', '2', 'app')] == ['A1']
+	mirror.close()
+
+
+def test_database_without_relationships_column(api, tmp_path):
+	path = str(tmp_path / 'mirror.db')
+	connection = sqlite3.connect(path)
+	connection.execute('CREATE TABLE resources (type TEXT, id TEXT, attributes TEXT, synced REAL, PRIMARY KEY (type, id))')
+	connection.execute("INSERT INTO resources VALUES ('apps', 'A1', '{}', 0)")
+	connection.commit()
+	connection.close()
+
+	mirror = Mirror(api, path)
+	assert mirror.get('apps', 'A1').id == 'A1'
+	mirror.sync(['builds'])
+	assert mirror.get('builds', '2').app().id == 'A1'
+	mirror.close()
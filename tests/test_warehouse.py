@@ -0,0 +1,59 @@
+import json
+from datetime import date
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from appstoreconnect import ReportWarehouse  # noqa: E402
+from appstoreconnect.tables import parse_sales_report  # noqa: E402
+
+REPORT = 'SKU\tUnits\tBegin Date\tEnd Date\nSKU1\t%d\t06/01/2019\t06/01/2019\n'
+FILTERS = {'vendorNumber': '1', 'reportType': 'SALES', 'frequency': 'DAILY', 'reportDate': '2019-06-01'}
+
+
+def table(units, version='1_0'):
+	return parse_sales_report(REPORT % units, 'SALES', version)
+
+
+def test_subtypes_and_versions_are_stored_apart(tmp_path):
+	warehouse = ReportWarehouse(tmp_path)
+	summary = warehouse.add(table(1), dict(FILTERS, reportSubType='SUMMARY', version='1_0'))
+	detailed = warehouse.add(table(2), dict(FILTERS, reportSubType='DETAILED', version='1_0'))
+	newer = warehouse.add(table(3, '1_1'), dict(FILTERS, reportSubType='SUMMARY', version='1_1'))
+
+	assert len({summary, detailed, newer}) == 3
+	assert warehouse.segments(report_sub_type='DETAILED') == [detailed]
+	assert warehouse.segments(report_sub_type='SUMMARY', version='1_1') == [newer]
+	assert warehouse.load(summary)['Units'].tolist() == [1]
+	assert warehouse.query(report_sub_type='DETAILED', version='1_0')['Units'].tolist() == [2]
+
+	june = (date(2019, 6, 1), date(2019, 6, 2))
+	assert warehouse.missing('1', 'SALES', 'DAILY', *june, report_sub_type='DETAILED') == ['2019-06-02']
+	assert warehouse.missing('1', 'SALES', 'DAILY', *june, report_sub_type='SUMMARY', version='1_2') == ['2019-06-01', '2019-06-02']
+
+
+def test_same_report_replaces_previous_copy(tmp_path):
+	warehouse = ReportWarehouse(tmp_path)
+	filters = dict(FILTERS, reportSubType='SUMMARY', version='1_0')
+	first = warehouse.add(table(1), filters)
+	assert warehouse.add(table(5), filters) == first
+	assert warehouse.segments() == [first]
+	assert warehouse.load(first)['Units'].tolist() == [5]
+
+
+def test_copy_indexed_without_subtype_is_replaced(tmp_path):
+	warehouse = ReportWarehouse(tmp_path)
+	segment_id = warehouse.add(table(1), dict(FILTERS, reportSubType='SUMMARY', version='1_0'))
+	# an index written before reportSubType was part of the segment id
+	legacy_id = 'SALES_1_DAILY_2019-06-01'
+	index = json.loads((tmp_path / 'index.json').read_text('utf-8'))
+	entry = index.pop(segment_id)
+	del entry['reportSubType']
+	(tmp_path / 'segments' / segment_id).rename(tmp_path / 'segments' / legacy_id)
+	(tmp_path / 'index.json').write_text(json.dumps({legacy_id: entry}), 'utf-8')
+
+	warehouse = ReportWarehouse(tmp_path)
+	assert warehouse.add(table(7), dict(FILTERS, reportSubType='SUMMARY', version='1_0')) == segment_id
+	assert warehouse.segments() == [segment_id]
+	assert not (tmp_path / 'segments' / legacy_id).exists()